@@ -6,10 +6,13 @@ Runs URH analysis automatically after capture
 
 import os
 import json
-import subprocess
 import time
 from pathlib import Path
 from urh_analyzer import URHAnalyzer
+from signal_decoder import SignalDecoder
+from burst_store import BurstStore
+from capture_converter import CaptureConverter
+from envelope_pyramid import EnvelopePyramid
 
 class AutoAnalyzer:
     """Automatically analyzes captured signals using URH"""
@@ -19,8 +22,11 @@ class AutoAnalyzer:
         self.decoded_dir = Path(os.path.expanduser(decoded_dir))
         self.decoded_dir.mkdir(parents=True, exist_ok=True)
         self.urh = URHAnalyzer()
+        self.decoder = SignalDecoder()
+        self.bursts = BurstStore(capture_dir)
+        self.converter = CaptureConverter(capture_dir)
 
-    def analyze_capture_auto(self, capture_name):
+    def analyze_capture_auto(self, capture_name, progress=None):
         """
         Automatically analyze a capture and extract protocol
 
@@ -29,14 +35,24 @@ class AutoAnalyzer:
         2. Auto-detect modulation (ASK/OOK/FSK)
         3. Demodulate signal
         4. Extract bit pattern
-        5. Save decoded data for replay
+        5. Convert to a CC1101 timing signal (rf_library)
+        6. Build the envelope preview pyramid
+        7. Save decoded data for replay
+
+        Args:
+            capture_name: Capture to analyze
+            progress: Optional callback(stage, percent) for job status
 
         Returns: dict with analysis results
         """
+        if progress is None:
+            progress = lambda stage, percent: None
+
         capture_file = self.capture_dir / f"{capture_name}.cu8"
         metadata_file = self.capture_dir / f"{capture_name}.json"
 
-        if not capture_file.exists():
+        sparse = not capture_file.exists() and self.bursts.is_sparse(capture_name)
+        if not capture_file.exists() and not sparse:
             return {'error': f'Capture not found: {capture_name}'}
 
         # Load metadata
@@ -55,37 +71,68 @@ class AutoAnalyzer:
             'steps_completed': []
         }
 
-        # Step 1: Try automatic demodulation with URH CLI
-        # URH has CLI tools we can use
+        # Step 1: Classify the modulation so only the matching demodulator runs
         try:
-            # Use URH's CLI to demodulate
-            # This is a simplified version - full implementation would use URH Python API
-
-            # For OOK/ASK signals (most common at 433MHz)
-            decoded_file = self.decoded_dir / f"{capture_name}_decoded.txt"
+            progress('Classifying modulation', 5)
+            classification, demod = self.converter.demodulate(capture_name, metadata)
+            modulation = classification['modulation']
+            result['modulation'] = modulation
+            result['classification'] = {
+                'modulation': modulation,
+                'confidence': classification['confidence'],
+                'counts': classification.get('counts', {})
+            }
+            result['steps_completed'].append(f'Modulation classified: {modulation}')
 
-            # URH CLI command (if available)
-            # urh_cli --sample-rate 2048000 --modulation-type ASK --data-format complex8u input.cu8 -o output.txt
+            # Step 2: Demodulated in-process (memory-mapped, no subprocess)
+            progress('Demodulating', 50)
+            timings = demod.get('timings', [])
 
             result['steps_completed'].append('Demodulation attempted')
+            result['pulse_count'] = sum(1 for t in timings if t['state'] == 1)
 
-            # Step 2: Extract bit pattern (simplified)
-            # Real implementation would parse URH output
-            bit_pattern = self._extract_bits_simple(capture_file, metadata)
+            # Step 3: Extract bit pattern (FSK yields symbols directly)
+            progress('Extracting bits', 70)
+            if modulation == 'FSK':
+                bit_pattern = demod.get('bit_string') or None
+            else:
+                bit_pattern = self._extract_bits_simple(timings)
 
             if bit_pattern:
                 result['bit_pattern'] = bit_pattern
                 result['steps_completed'].append('Bit pattern extracted')
 
-            # Step 3: Save replay data
+            # Step 4: Compact timing signal the CC1101 tools can replay
+            progress('Converting for CC1101', 80)
+            signal = {'status': 'skipped'}
+            if timings and modulation in ('PSK', 'FSK'):
+                # The CC1101 transmit path is OOK only - replaying would be wrong
+                result['steps_completed'].append(f'CC1101 signal not saved ({modulation} not replayable)')
+            elif timings:
+                signal = self.converter.save(capture_name, capture_name, timings, metadata,
+                                             modulation=modulation)
+            if signal['status'] == 'success':
+                result['library_signal'] = signal['name']
+                result['steps_completed'].append('CC1101 signal saved')
+
+            # Step 5: Envelope pyramid for zoomable previews
+            progress('Building preview', 85)
+            EnvelopePyramid.for_capture(capture_name, self.capture_dir)
+            result['steps_completed'].append('Preview built')
+
+            # Step 6: Save replay data
+            progress('Saving replay data', 90)
             replay_data = {
                 'name': capture_name,
                 'frequency': metadata.get('frequency'),
-                'modulation': 'OOK',  # Most common at 433MHz
+                'modulation': modulation if modulation != 'unknown' else 'OOK',
+                'modulation_confidence': classification['confidence'],
                 'bit_pattern': bit_pattern if bit_pattern else 'pending_manual_analysis',
+                'timings': timings,
                 'sample_rate': metadata.get('sample_rate'),
                 'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
-                'ready_for_replay': bool(bit_pattern),
+                'library_signal': signal.get('name'),
+                'ready_for_replay': bool(bit_pattern) or signal['status'] == 'success',
                 'notes': 'Auto-analyzed. For best results, verify in URH GUI.'
             }
 
@@ -104,33 +151,16 @@ class AutoAnalyzer:
             result['status'] = 'failed'
             return result
 
-    def _extract_bits_simple(self, capture_file, metadata):
+    def _extract_bits_simple(self, timings):
         """
-        Simple bit extraction using rtl_433's raw analysis
-        This is a fallback method - real decoding uses URH
+        Simple bit extraction from pulse timings
+        Short/long pulse width clustering via SignalDecoder
         """
         try:
-            # Try to decode with rtl_433 in analyze mode
-            # This works for known protocols
-            freq = metadata.get('frequency', 433920000)
-
-            result = subprocess.run(
-                ['rtl_433', '-r', str(capture_file), '-F', 'json', '-M', 'level'],
-                capture_output=True, text=True, timeout=30
-            )
-
-            # Parse output for bit patterns
-            if result.stdout:
-                lines = result.stdout.split('\n')
-                for line in lines:
-                    if 'codes' in line or 'data' in line:
-                        try:
-                            data = json.loads(line)
-                            if 'data' in data:
-                                return data['data']
-                        except:
-                            pass
-
+            pulse_info = self.decoder.analyze_timings(timings)
+            binary = self.decoder.timings_to_binary(timings, pulse_info)
+            if binary and binary['bit_string']:
+                return binary['bit_string']
             return None
 
         except Exception as e:
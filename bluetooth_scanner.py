@@ -197,16 +197,22 @@ class BluetoothScanner:
                 'count': 0
             }
 
-    def scan_comprehensive(self, duration=15):
+    def scan_comprehensive(self, duration=15, progress=None):
         """
         Comprehensive scan - both BLE and Classic
+
+        progress: Optional callback(stage, percent) before each half
         """
         print("[*] Starting comprehensive Bluetooth scan...")
 
         # Scan BLE first (faster)
+        if progress:
+            progress("Scanning BLE devices", 0)
         ble_results = self.scan_ble_devices(duration // 2)
 
         # Then scan Classic
+        if progress:
+            progress("Scanning Classic devices", 50)
         classic_results = self.scan_classic_devices(duration // 2)
 
         all_devices = ble_results.get('devices', []) + classic_results.get('devices', [])
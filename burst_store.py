@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Sparse Burst Storage for PiFlip
+Keep only the energy bursts of an IQ capture, plus padding
+
+Most of a .cu8 capture is noise between transmissions. Packing a capture
+stores each burst (with a little padding either side) back to back in
+{name}.bursts and writes an index ({name}.bursts.idx, JSON) with every
+segment's sample offsets, timestamps, stored size and CRC32. Segments can
+be compressed individually with a stdlib codec, so any single burst can
+be read back without touching the rest. Every stored burst reconstructs
+byte-for-byte.
+"""
+
+import bz2
+import json
+import lzma
+import os
+import zlib
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import metrics
+from iq_stream import IQStream
+
+CODECS = {
+    None: (lambda data: data, lambda data: data),
+    'zlib': (lambda data: zlib.compress(data, 6), zlib.decompress),
+    'bz2': (lambda data: bz2.compress(data, 9), bz2.decompress),
+    'lzma': (lambda data: lzma.compress(data, preset=1), lzma.decompress),
+}
+
+
+class BurstStore:
+    """Pack .cu8 captures into burst-only storage and read them back"""
+
+    def __init__(self, capture_dir="~/piflip/captures"):
+        self.capture_dir = Path(os.path.expanduser(capture_dir))
+
+    def data_file(self, name):
+        return self.capture_dir / f"{name}.bursts"
+
+    def index_file(self, name):
+        # Not .json - the capture listings treat every .json as capture metadata
+        return self.capture_dir / f"{name}.bursts.idx"
+
+    def is_sparse(self, name):
+        return self.index_file(name).exists() and self.data_file(name).exists()
+
+    # =========================================================================
+    # PACKING
+    # =========================================================================
+
+    def pack(self, name, padding_ms=5.0, snr_db=10.0, compression=None, keep_original=True):
+        """
+        Store only the bursts of a capture
+
+        Args:
+            name: Capture name ({name}.cu8 in the capture directory)
+            padding_ms: Samples kept before and after each burst
+            snr_db: Envelope level above the noise floor that counts as a burst
+            compression: None, 'zlib', 'bz2' or 'lzma'
+            keep_original: Keep the full .cu8 after packing
+
+        Returns:
+            Dict with burst count, sizes and compression ratio
+        """
+        if compression not in CODECS:
+            return {'status': 'error', 'message': f'Unknown compression: {compression}'}
+
+        capture_file = self.capture_dir / f"{name}.cu8"
+        if not capture_file.exists():
+            return {'status': 'error', 'message': f'Capture not found: {name}'}
+
+        metadata = self._load_metadata(name)
+        sample_rate = metadata.get('sample_rate') or 2048000
+        capture_start = self._capture_start(metadata)
+
+        stream = IQStream(capture_file, sample_rate)
+        pad = int(padding_ms * sample_rate / 1000)
+        compress = CODECS[compression][0]
+
+        # Pad every burst and merge the ones whose padding overlaps
+        segments = []
+        for burst in stream.bursts(snr_db=snr_db):
+            start = max(0, burst['start_sample'] - pad)
+            end = min(len(stream), burst['end_sample'] + pad)
+            if segments and start <= segments[-1]['end_sample']:
+                segments[-1]['end_sample'] = max(segments[-1]['end_sample'], end)
+                segments[-1]['peak'] = max(segments[-1]['peak'], burst['peak'])
+            else:
+                segments.append({'start_sample': start, 'end_sample': end, 'peak': burst['peak']})
+
+        stored_size = 0
+        with open(self.data_file(name), 'wb') as f:
+            for segment in segments:
+                raw = stream.iq[segment['start_sample']:segment['end_sample']].tobytes()
+                data = compress(raw)
+                segment.update({
+                    'offset': stored_size,
+                    'stored_size': len(data),
+                    'raw_size': len(raw),
+                    'crc32': zlib.crc32(raw),
+                    'start_time': round(segment['start_sample'] / sample_rate, 6),
+                    'end_time': round(segment['end_sample'] / sample_rate, 6),
+                    'timestamp': round(capture_start + segment['start_sample'] / sample_rate, 6)
+                        if capture_start is not None else None
+                })
+                f.write(data)
+                stored_size += len(data)
+        metrics.library_io(self.data_file(name), 'written', stored_size)
+
+        original_size = capture_file.stat().st_size
+        index = {
+            'name': name,
+            'sample_rate': sample_rate,
+            'num_samples': len(stream),
+            'original_size': original_size,
+            'stored_size': stored_size,
+            'compression': compression,
+            'padding_ms': padding_ms,
+            'snr_db': snr_db,
+            'capture_start': capture_start,
+            'bursts': segments
+        }
+        with open(self.index_file(name), 'w') as f:
+            json.dump(index, f, indent=2)
+        metrics.library_io(self.index_file(name), 'written')
+
+        ratio = round(original_size / stored_size, 1) if stored_size else None
+        if metadata:
+            metadata.update({
+                'storage': 'sparse',
+                'stored_size': stored_size,
+                'burst_count': len(segments),
+                'compression_ratio': ratio
+            })
+            self._save_metadata(name, metadata)
+
+        if not keep_original:
+            capture_file.unlink()
+
+        print(f"[+] Packed {name}: {len(segments)} bursts, "
+              f"{original_size / 1e6:.1f} MB -> {stored_size / 1e6:.2f} MB")
+
+        return {
+            'status': 'success',
+            'name': name,
+            'burst_count': len(segments),
+            'original_size': original_size,
+            'stored_size': stored_size,
+            'compression_ratio': ratio,
+            'original_kept': keep_original
+        }
+
+    # =========================================================================
+    # READING
+    # =========================================================================
+
+    def load_index(self, name):
+        """Burst index of a packed capture, or None"""
+        index_file = self.index_file(name)
+        if not index_file.exists():
+            return None
+        with open(index_file, 'r') as f:
+            return json.load(f)
+
+    def read_burst(self, name, number, index=None):
+        """
+        Read one burst back as (samples x 2) uint8 I/Q
+
+        Raises:
+            ValueError: If the stored segment fails its CRC check
+        """
+        index = index or self.load_index(name)
+        entry = index['bursts'][number]
+        decompress = CODECS[index['compression']][1]
+
+        with open(self.data_file(name), 'rb') as f:
+            f.seek(entry['offset'])
+            raw = decompress(f.read(entry['stored_size']))
+        metrics.library_io(self.data_file(name), 'read', entry['stored_size'])
+
+        if zlib.crc32(raw) != entry['crc32']:
+            raise ValueError(f"Burst {number} of {name} is corrupt (CRC mismatch)")
+        return np.frombuffer(raw, dtype=np.uint8).reshape(-1, 2)
+
+    def iter_bursts(self, name):
+        """Yield (index entry, I/Q array) for every burst in order"""
+        index = self.load_index(name)
+        if index is None:
+            return
+        for number, entry in enumerate(index['bursts']):
+            yield entry, self.read_burst(name, number, index)
+
+    def stream(self, name, sample_rate=None, block_samples=1 << 18, fill=128):
+        """
+        Full-length IQStream view of a packed capture, rebuilt block by block
+
+        Readers that need the original timeline (channelizer, virtual SDR)
+        use this instead of the deleted .cu8; nothing is written to disk.
+
+        Raises:
+            FileNotFoundError: If the capture is not packed
+        """
+        index = self.load_index(name)
+        if index is None:
+            raise FileNotFoundError(f"No burst index for {name}")
+        return BurstStream(self, name, index, sample_rate or index['sample_rate'], block_samples, fill)
+
+    def unpack(self, name, output_file=None, fill=128):
+        """
+        Rebuild a full-length .cu8 (bursts exact, gaps filled with DC)
+
+        Args:
+            name: Packed capture name
+            output_file: Where to write (default {name}.cu8)
+            fill: Byte value used for the discarded noise
+
+        Returns:
+            Path of the rebuilt file
+        """
+        index = self.load_index(name)
+        if index is None:
+            raise FileNotFoundError(f"No burst index for {name}")
+
+        output_file = Path(output_file) if output_file else self.capture_dir / f"{name}.cu8"
+        gap_block = bytes([fill]) * (1 << 20)
+        position = 0
+
+        with open(output_file, 'wb') as f:
+            for entry, iq in self.iter_bursts(name):
+                self._write_fill(f, (entry['start_sample'] - position) * 2, gap_block)
+                f.write(iq.tobytes())
+                position = entry['end_sample']
+            self._write_fill(f, (index['num_samples'] - position) * 2, gap_block)
+        metrics.library_io(output_file, 'written')
+
+        return output_file
+
+    def delete(self, name):
+        """Remove the packed files of a capture; returns the names removed"""
+        deleted = []
+        for path in (self.data_file(name), self.index_file(name)):
+            if path.exists():
+                path.unlink()
+                deleted.append(path.name)
+        return deleted
+
+    @staticmethod
+    def _write_fill(f, count, gap_block):
+        while count > 0:
+            chunk = min(count, len(gap_block))
+            f.write(gap_block[:chunk])
+            count -= chunk
+
+    # =========================================================================
+    # METADATA
+    # =========================================================================
+
+    def _load_metadata(self, name):
+        metadata_file = self.capture_dir / f"{name}.json"
+        if not metadata_file.exists():
+            return {}
+        with open(metadata_file, 'r') as f:
+            return json.load(f)
+
+    def _save_metadata(self, name, metadata):
+        with open(self.capture_dir / f"{name}.json", 'w') as f:
+            json.dump(metadata, f, indent=2)
+
+    @staticmethod
+    def _capture_start(metadata):
+        """Epoch time of the first sample (metadata timestamp is written after capture)"""
+        try:
+            finished = datetime.fromisoformat(metadata['timestamp']).timestamp()
+        except (KeyError, TypeError, ValueError):
+            return None
+        return round(finished - float(metadata.get('duration') or 0), 6)
+
+
+class BurstStream(IQStream):
+    """IQStream over a packed capture: stored bursts in place, gaps filled with DC"""
+
+    def __init__(self, store, name, index, sample_rate, block_samples=1 << 18, fill=128):
+        self.store = store
+        self.name = name
+        self.index = index
+        self.sample_rate = sample_rate
+        self.block_samples = int(block_samples)
+        self.fill = fill
+        self.capture_file = str(store.data_file(name))
+        self.num_samples = index['num_samples']
+
+    def __len__(self):
+        return self.num_samples
+
+    def blocks(self, start=0, stop=None):
+        """Yield (offset, block) like IQStream.blocks, decompressing each burst once"""
+        stop = self.num_samples if stop is None else min(stop, self.num_samples)
+        entries = self.index['bursts']
+        number = 0
+        current = None             # (number, I/Q) of the last burst read
+
+        for offset in range(start, stop, self.block_samples):
+            end = min(offset + self.block_samples, stop)
+            block = np.full((end - offset, 2), self.fill, dtype=np.uint8)
+
+            while number < len(entries) and entries[number]['end_sample'] <= offset:
+                number += 1
+            scan = number
+            while scan < len(entries) and entries[scan]['start_sample'] < end:
+                entry = entries[scan]
+                if current is None or current[0] != scan:
+                    current = (scan, self.store.read_burst(self.name, scan, self.index))
+                lo = max(offset, entry['start_sample'])
+                hi = min(end, entry['end_sample'])
+                block[lo - offset:hi - offset] = current[1][lo - entry['start_sample']:hi - entry['start_sample']]
+                scan += 1
+            yield offset, block
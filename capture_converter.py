@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+Capture Converter for PiFlip
+Turn RTL-SDR .cu8 captures into replayable CC1101 timing signals
+
+Pipeline:
+1. Classify the modulation of the capture's bursts
+2. Demodulate in-process (full .cu8 or burst-only sparse storage)
+3. Quantize pulse widths: durations of each state whose ratio is within
+   the tolerance form one cluster and are replaced by its median
+4. Split into frames at long low gaps and keep the most repeated frame
+5. Save it to ~/piflip/rf_library in the same format as CC1101 captures
+
+Only OOK/ASK captures are saved: the CC1101 transmit path is configured
+for OOK, so FSK timings (frequency states) would go out as carrier
+on/off. FSK and PSK captures are rejected with an error.
+"""
+
+
+import os
+import json
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import metrics
+from ook_demodulator import OOKDemodulator
+from fsk_demodulator import FSKDemodulator
+from modulation_classifier import ModulationClassifier
+from burst_store import BurstStore
+
+
+class CaptureConverter:
+    """Convert RTL-SDR captures into compact CC1101 timing signals"""
+
+    def __init__(self, capture_dir="~/piflip/captures", library_dir="~/piflip/rf_library",
+                 tolerance=0.25, min_gap_us=2000, gap_units=8, max_tail_us=20000):
+        """
+        Args:
+            capture_dir: Directory of .cu8 captures and their metadata
+            library_dir: CC1101 signal library the converted signals go to
+            tolerance: Relative width difference still treated as one pulse width
+            min_gap_us: Shortest low period that separates two frames
+            gap_units: Frame gaps are also at least this many shortest pulses
+            max_tail_us: Cap on the low period kept after the frame
+        """
+        self.capture_dir = Path(os.path.expanduser(capture_dir))
+        self.library_dir = Path(os.path.expanduser(library_dir))
+        self.library_dir.mkdir(parents=True, exist_ok=True)
+        self.tolerance = tolerance
+        self.min_gap_us = min_gap_us
+        self.gap_units = gap_units
+        self.max_tail_us = max_tail_us
+        self.bursts = BurstStore(capture_dir)
+
+    # =========================================================================
+    # DEMODULATION
+    # =========================================================================
+
+    def demodulate(self, capture_name, metadata=None):
+        """
+        Classify and demodulate a capture (full .cu8 or sparse bursts)
+
+        Returns:
+            (classification dict, demodulation dict with 'timings')
+        """
+        metadata = metadata if metadata is not None else self._load_metadata(capture_name)
+        sample_rate = metadata.get('sample_rate') or 2048000
+        capture_file = self.capture_dir / f"{capture_name}.cu8"
+        sparse = not capture_file.exists() and self.bursts.is_sparse(capture_name)
+
+        classification = self._classify(capture_file, capture_name, sample_rate, sparse)
+        modulation = classification['modulation']
+
+        if modulation == 'PSK':
+            # No in-process PSK demodulator - leave it for URH
+            demod = {'status': 'unsupported', 'timings': []}
+        elif sparse:
+            demod = self._demodulate_sparse(capture_name, sample_rate, modulation)
+        else:
+            demod = self._demodulator(modulation, sample_rate).demodulate(capture_file)
+            if demod['status'] == 'error':
+                print(f"[!] Demodulation failed: {demod['message']}")
+            else:
+                print(f"[+] Demodulated {len(demod['timings'])} {modulation} timings")
+
+        return classification, demod
+
+    def _classify(self, capture_file, capture_name, sample_rate, sparse=False):
+        """Classify the modulation of a capture from its bursts"""
+        classifier = ModulationClassifier(sample_rate=sample_rate)
+
+        if not sparse:
+            classification = classifier.classify(capture_file)
+        else:
+            # Stored segments carry noise padding - find the bursts inside each
+            results = []
+            for entry, iq in self.bursts.iter_bursts(capture_name):
+                results.extend(classifier.classify(iq)['bursts'])
+                if len(results) >= classifier.max_bursts:
+                    break
+            classification = classifier.summarize(results)
+
+        print(f"[*] Modulation: {classification['modulation']} "
+              f"(confidence {classification['confidence']})")
+        return classification
+
+    def _demodulator(self, modulation, sample_rate):
+        """FSK demodulator for FSK bursts, OOK for everything else"""
+        if modulation == 'FSK':
+            return FSKDemodulator(sample_rate=sample_rate)
+        return OOKDemodulator(sample_rate=sample_rate)
+
+    def _demodulate_sparse(self, capture_name, sample_rate, modulation='OOK'):
+        """
+        Demodulate a burst-only capture burst by burst
+
+        The discarded gaps between bursts become low periods, so the
+        timings line up with those of the original full capture.
+        """
+        demodulator = self._demodulator(modulation, sample_rate)
+        timings = []
+        bit_strings = []
+        position = 0
+
+        for entry, iq in self.bursts.iter_bursts(capture_name):
+            gap_us = int(round((entry['start_sample'] - position) * 1e6 / sample_rate))
+            if gap_us > 0:
+                timings.append({'state': 0, 'duration_us': gap_us})
+            if modulation == 'FSK':
+                demod = demodulator.demodulate(iq)
+                bit_strings.append(demod.get('bit_string', ''))
+            else:
+                demod = demodulator.demodulate(iq, trim=False)
+            timings.extend(demod.get('timings', []))
+            position = entry['end_sample']
+
+        merged = self.merge_runs(timings)
+        while merged and merged[0]['state'] == 0:
+            merged.pop(0)
+        while merged and merged[-1]['state'] == 0:
+            merged.pop()
+
+        pulse_count = sum(1 for t in merged if t['state'] == 1)
+        print(f"[+] Demodulated {pulse_count} pulses from sparse capture")
+        return {'status': 'success' if pulse_count else 'no_signal',
+                'timings': merged, 'pulse_count': pulse_count,
+                'bit_string': max(bit_strings, key=len) if bit_strings else ''}
+
+    # =========================================================================
+    # QUANTIZATION
+    # =========================================================================
+
+    @staticmethod
+    def merge_runs(timings):
+        """Join neighbouring timings of the same state"""
+        merged = []
+        for timing in timings:
+            if merged and merged[-1]['state'] == timing['state']:
+                merged[-1]['duration_us'] += timing['duration_us']
+            else:
+                merged.append(dict(timing))
+        return merged
+
+    def quantize(self, timings):
+        """
+        Snap every duration to the median of its pulse-width cluster
+
+        Clusters are formed per state: sorted durations are split wherever
+        neighbours differ by more than the tolerance.
+        """
+        if not timings:
+            return []
+        states = np.array([t['state'] for t in timings], dtype=np.int8)
+        durations = np.array([t['duration_us'] for t in timings], dtype=np.float64)
+        quantized = durations.copy()
+
+        for state in (0, 1):
+            selected = np.flatnonzero(states == state)
+            if len(selected) == 0:
+                continue
+            order = selected[np.argsort(durations[selected])]
+            values = np.maximum(durations[order], 1)
+            breaks = np.flatnonzero(values[1:] / values[:-1] > 1 + self.tolerance) + 1
+            for cluster in np.split(order, breaks):
+                quantized[cluster] = np.median(durations[cluster])
+
+        return [{'state': int(s), 'duration_us': int(round(d))} for s, d in zip(states, quantized)]
+
+    def split_frames(self, timings):
+        """
+        Split quantized timings into frames at long low gaps
+
+        Returns:
+            List of (frame timings, length of the gap after it in us or None)
+        """
+        highs = [t['duration_us'] for t in timings if t['state'] == 1]
+        if not highs:
+            return []
+        threshold = max(self.min_gap_us, self.gap_units * min(highs))
+
+        frames = []
+        frame = []
+        for timing in timings:
+            if timing['state'] == 0 and timing['duration_us'] >= threshold:
+                if frame:
+                    frames.append((frame, timing['duration_us']))
+                frame = []
+            elif frame or timing['state'] == 1:
+                frame.append(timing)
+        if frame:
+            frames.append((frame, None))
+        return frames
+
+    def compact(self, timings):
+        """
+        Reduce demodulated timings to one clean, repeatable frame
+
+        Returns:
+            Dict with the frame timings (plus trailing gap), frame and
+            repeat counts and the pulse widths, or None without pulses
+        """
+        frames = self.split_frames(self.quantize(timings))
+        if not frames:
+            return None
+
+        signatures = Counter(tuple((t['state'], t['duration_us']) for t in frame)
+                             for frame, _ in frames)
+        best, repeats = signatures.most_common(1)[0]
+        if repeats == 1:
+            # Every frame differs (noise) - the longest one is the most complete
+            best = max(signatures, key=len)
+
+        gaps = [gap for frame, gap in frames if gap is not None]
+        frame_gap = int(np.median(gaps)) if gaps else None
+
+        frame = [{'state': state, 'duration_us': duration} for state, duration in best]
+        if frame[-1]['state'] == 0:
+            frame.pop()
+        if frame_gap:
+            frame.append({'state': 0, 'duration_us': min(frame_gap, self.max_tail_us)})
+
+        return {
+            'timings': frame,
+            'frame_count': len(frames),
+            'repeat_count': repeats,
+            'frame_gap_us': frame_gap,
+            'pulse_widths_us': sorted({t['duration_us'] for t in frame if t['state'] == 1}),
+            'gap_widths_us': sorted({t['duration_us'] for t in frame if t['state'] == 0})
+        }
+
+    # =========================================================================
+    # LIBRARY
+    # =========================================================================
+
+    def convert(self, capture_name, name=None, overwrite=False, force=False):
+        """
+        Convert a capture and save it to the CC1101 signal library
+
+        Args:
+            capture_name: Capture to convert
+            name: Library signal name (default: the capture name)
+            overwrite: Replace a library signal that did not come from this capture
+            force: Convert again even if this capture was converted before
+
+        Returns:
+            Dict with status, the library file and the saved signal
+        """
+        name = name or capture_name
+        capture_file = self.capture_dir / f"{capture_name}.cu8"
+        if not capture_file.exists() and not self.bursts.is_sparse(capture_name):
+            return {'status': 'error', 'message': f'Capture not found: {capture_name}'}
+
+        existing = self.load_signal(name)
+        if existing and existing.get('source_capture') == capture_name and not force:
+            return {'status': 'success', 'name': name, 'cached': True,
+                    'file': str(self.library_dir / f"{name}.json"), 'signal': existing}
+
+        metadata = self._load_metadata(capture_name)
+        classification, demod = self.demodulate(capture_name, metadata)
+        modulation = classification['modulation']
+        if modulation in ('PSK', 'FSK'):
+            return {'status': 'error',
+                    'message': f'{modulation} captures cannot be replayed as CC1101 timings '
+                               '(the transmit path is OOK only)'}
+
+        return self.save(name, capture_name, demod.get('timings', []), metadata,
+                         modulation=modulation, overwrite=overwrite)
+
+    def save(self, name, capture_name, timings, metadata=None, modulation='OOK', overwrite=False):
+        """
+        Compact demodulated timings and store them as a library signal
+
+        Returns:
+            Dict with status, the library file and the saved signal
+        """
+        if modulation in ('PSK', 'FSK'):
+            return {'status': 'error',
+                    'message': f'{modulation} signals cannot be replayed by the CC1101 (OOK only)'}
+
+        signal_file = self.library_dir / f"{name}.json"
+        existing = self.load_signal(name)
+        if existing and existing.get('source_capture') != capture_name and not overwrite:
+            return {'status': 'error', 'message': f'Library signal already exists: {name}'}
+
+        compact = self.compact(timings)
+        if compact is None:
+            return {'status': 'no_signal', 'message': 'No pulses found in capture'}
+
+        metadata = metadata or {}
+        frequency = metadata.get('frequency') or 433.92e6
+        if frequency > 1000:
+            frequency = frequency / 1e6
+
+        signal_data = {
+            'name': name,
+            'frequency': round(frequency, 6),
+            'duration': round(sum(t['duration_us'] for t in compact['timings']) / 1e6, 6),
+            'sample_count': len(compact['timings']),
+            'timings': compact['timings'],
+            'timestamp': datetime.now().isoformat(),
+            'modulation': 'OOK',
+            'source': 'rtl-sdr',
+            'source_capture': capture_name,
+            'frame_count': compact['frame_count'],
+            'repeat_count': compact['repeat_count'],
+            'frame_gap_us': compact['frame_gap_us'],
+            'pulse_widths_us': compact['pulse_widths_us'],
+            'gap_widths_us': compact['gap_widths_us']
+        }
+
+        with open(signal_file, 'w') as f:
+            json.dump(signal_data, f, indent=2)
+        metrics.library_io(signal_file, 'written')
+
+        print(f"[+] Converted {capture_name} -> {name}: {len(compact['timings'])} timings, "
+              f"frame seen {compact['repeat_count']}/{compact['frame_count']} times")
+
+        return {
+            'status': 'success',
+            'name': name,
+            'file': str(signal_file),
+            'timing_count': len(compact['timings']),
+            'signal': signal_data
+        }
+
+    def load_signal(self, name):
+        """Load a library signal, or None"""
+        signal_file = self.library_dir / f"{name}.json"
+        if not signal_file.exists():
+            return None
+        with open(signal_file, 'r') as f:
+            data = json.load(f)
+        metrics.library_io(signal_file, 'read')
+        return data
+
+    def _load_metadata(self, capture_name):
+        metadata_file = self.capture_dir / f"{capture_name}.json"
+        if not metadata_file.exists():
+            return {}
+        with open(metadata_file, 'r') as f:
+            return json.load(f)
+
+
+def main():
+    """CLI interface"""
+    import sys
+
+    if len(sys.argv) < 2:
+        print("""
+Capture Converter - RTL-SDR capture to CC1101 signal
+====================================================
+
+Usage:
+    python3 capture_converter.py <capture_name> [library_name]
+        """)
+        sys.exit(1)
+
+    converter = CaptureConverter()
+    result = converter.convert(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None, force=True)
+    print(json.dumps({k: v for k, v in result.items() if k != 'signal'}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -12,6 +12,8 @@ import os
 from datetime import datetime
 from pathlib import Path
 
+import metrics
+
 class CC1101Enhanced:
     """Enhanced CC1101 with full receive and transmit capabilities"""
 
@@ -327,6 +329,7 @@ class CC1101Enhanced:
 
         with open(signal_file, 'w') as f:
             json.dump(signal_data, f, indent=2)
+        metrics.library_io(signal_file, 'written')
 
         return {
             'status': 'saved',
@@ -342,6 +345,7 @@ class CC1101Enhanced:
             try:
                 with open(file, 'r') as f:
                     data = json.load(f)
+                    metrics.library_io(file, 'read')
                     signals.append({
                         'name': data['name'],
                         'frequency': data['frequency'],
@@ -360,10 +364,24 @@ class CC1101Enhanced:
             return None
 
         with open(signal_file, 'r') as f:
-            return json.load(f)
+            data = json.load(f)
+        metrics.library_io(signal_file, 'read')
+        return data
+
+    @staticmethod
+    def unsupported_modulation(signal_data):
+        """Error for signals the OOK-only transmit path would replay wrongly, or None"""
+        modulation = signal_data.get('modulation', 'OOK')
+        if modulation in ('OOK', 'ASK'):
+            return None
+        return {'status': 'error',
+                'message': f'{modulation} signals cannot be transmitted (CC1101 is configured for OOK)'}
 
     def transmit_signal(self, signal_data):
         """Transmit a saved signal"""
+        error = self.unsupported_modulation(signal_data)
+        if error:
+            return error
         freq = signal_data['frequency']
         timings = signal_data['timings']
 
@@ -452,6 +470,9 @@ class CC1101Enhanced:
         Returns:
             Transmission status
         """
+        error = self.unsupported_modulation(signal_data)
+        if error:
+            return error
         freq = signal_data['frequency']
         timings = signal_data['timings']
 
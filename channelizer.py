@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Polyphase Channelizer for PiFlip
+Split one wideband IQ stream into narrow channels and decode them all
+
+At 2.048 MS/s the RTL-SDR sees the whole 433.05-434.79 MHz ISM band,
+so remotes on 433.42, 433.92 and 434.42 MHz can be heard at once
+without retuning.
+
+PolyphaseChannelizer is a 2x oversampled analysis filterbank: every
+`decimation` input samples, the last len(prototype) samples are
+windowed by one lowpass prototype, folded into `num_channels` phases and
+FFT'd - one FFT yields the next output sample of every channel. Channel
+k is centred on k * sample_rate / num_channels and runs at
+2 * sample_rate / num_channels (256 kHz for 16 channels at 2.048 MS/s),
+so a signal anywhere between two channel centres stays inside the
+passband of the nearer one.
+
+Each requested frequency gets a ChannelDecoder on its channel: a fine
+mixer for the offset from the channel centre, an energy burst tracker,
+and per burst either FSK (FSKDemodulator.slice_burst on the frequency
+track) or OOK (OOKDemodulator slicing of the envelope) timings.
+"""
+
+import threading
+import time
+from collections import deque
+
+import numpy as np
+from iq_stream import open_stream, BurstTracker, FIRFilter, FrequencyDiscriminator, Mixer, to_complex
+from ook_demodulator import OOKDemodulator
+from fsk_demodulator import FSKDemodulator
+
+
+# =============================================================================
+# FILTERBANK
+# =============================================================================
+
+class PolyphaseChannelizer:
+    """Oversampled polyphase analysis filterbank; filter history carries over"""
+
+    def __init__(self, num_channels=16, taps_per_channel=8, oversample=2):
+        """
+        Args:
+            num_channels: Channels across the input band (FFT size)
+            taps_per_channel: Prototype filter length per channel
+            oversample: Output rate relative to the channel spacing (1 or 2)
+        """
+        self.num_channels = int(num_channels)
+        self.decimation = self.num_channels // int(oversample)
+        self.prototype = self.design_prototype(self.num_channels, taps_per_channel)
+        self.length = len(self.prototype)
+        self.branches = self.prototype.astype(np.complex64).reshape(-1, self.decimation)
+        self.history = np.zeros(self.length - 1, dtype=np.complex64)
+        # Input index of history[0] (negative: the stream is zero-padded in front)
+        self.position = -(self.length - 1)
+        # Phase rotation per channel for each frame start (mod num_channels)
+        self.rotation = np.exp(-2j * np.pi * np.outer(np.arange(self.num_channels),
+                                                      np.arange(self.num_channels)) / self.num_channels
+                               ).astype(np.complex64)
+
+    @staticmethod
+    def design_prototype(num_channels, taps_per_channel):
+        """Blackman-windowed sinc lowpass, cut off a little past half the spacing"""
+        length = num_channels * taps_per_channel
+        n = np.arange(length) - (length - 1) / 2
+        cutoff = 0.6 / num_channels  # cycles per input sample
+        taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.blackman(length)
+        return (taps / taps.sum()).astype(np.float32)
+
+    def channel_frequencies(self, sample_rate, center_freq=0.0):
+        """Centre frequency of every channel, in channel order"""
+        return center_freq + np.fft.fftfreq(self.num_channels, 1 / sample_rate)
+
+    def output_rate(self, sample_rate):
+        return sample_rate / self.decimation
+
+    def process(self, samples):
+        """
+        Returns:
+            (outputs x num_channels) complex64 array, one column per channel
+        """
+        buffer = np.concatenate([self.history, np.asarray(samples, dtype=np.complex64)])
+        count = (len(buffer) - self.length) // self.decimation + 1 if len(buffer) >= self.length else 0
+        if count <= 0:
+            self.history = buffer
+            return np.empty((0, self.num_channels), dtype=np.complex64)
+
+        # Rows of `decimation` samples: frame f, sub-branch q is row f + q, so
+        # every multiply-accumulate below runs over contiguous memory
+        rows = buffer[:(len(buffer) // self.decimation) * self.decimation].reshape(-1, self.decimation)
+        groups = [np.zeros((count, self.decimation), dtype=np.complex64)
+                  for _ in range(self.num_channels // self.decimation)]
+        product = np.empty((count, self.decimation), dtype=np.complex64)
+        for branch in range(self.length // self.decimation):
+            np.multiply(rows[branch:branch + count], self.branches[branch], out=product)
+            groups[branch % len(groups)] += product
+        spectra = np.fft.fft(np.concatenate(groups, axis=1), axis=1)
+
+        # The FFT phase is referenced to each frame's first sample - rotate
+        # it back to absolute time so every channel is phase-continuous
+        starts = self.position + np.arange(count) * self.decimation
+        outputs = (spectra * self.rotation[starts % self.num_channels]).astype(np.complex64)
+
+        consumed = count * self.decimation
+        self.history = buffer[consumed:].copy()
+        self.position += consumed
+        return outputs
+
+
+# =============================================================================
+# PER-CHANNEL DECODING
+# =============================================================================
+
+class ChannelDecoder:
+    """Burst detection and OOK/FSK demodulation of one channel's stream"""
+
+    def __init__(self, frequency, offset_hz, sample_rate, modulation='auto', snr_db=10.0,
+                 max_gap_us=5000, max_burst_s=2.0):
+        """
+        Args:
+            frequency: Frequency this decoder reports (Hz)
+            offset_hz: Offset of `frequency` from its channel centre
+            sample_rate: Channel sample rate in Hz
+            modulation: 'OOK', 'FSK' or 'auto' (FSK if the carrier is steady)
+            snr_db: Envelope level above the channel noise that marks a burst
+            max_gap_us: Shorter gaps do not end a burst
+            max_burst_s: Longer bursts are cut (bounds the sample buffer)
+        """
+        self.frequency = frequency
+        self.sample_rate = sample_rate
+        self.modulation = modulation.upper() if modulation != 'auto' else 'auto'
+        self.max_burst = int(max_burst_s * sample_rate)
+
+        self.mixer = Mixer(offset_hz, sample_rate) if abs(offset_hz) > 1 else None
+        # Smooth the envelope for detection so Rayleigh noise peaks do not bridge gaps
+        self.smoother = FIRFilter(np.ones(8, dtype=np.float32) / 8)
+        self.tracker = BurstTracker(snr_db=snr_db, max_gap=max_gap_us * sample_rate / 1e6,
+                                    block_len=max(64, int(sample_rate * 0.02)))
+        self.ook = OOKDemodulator(sample_rate=sample_rate, decimation=1)
+        self.fsk = FSKDemodulator(sample_rate=sample_rate)
+
+        self.buffer = np.empty(0, dtype=np.complex64)
+        self.buffer_start = 0
+        self.bursts_seen = 0
+
+    def process(self, samples):
+        """Feed channel samples; returns the decoded bursts completed by them"""
+        if self.mixer is not None:
+            samples = self.mixer.process(samples)
+        self.buffer = np.concatenate([self.buffer, samples])
+
+        events = [self.decode(*burst) for burst in self.tracker.process(self.smoother.process(np.abs(samples)))]
+
+        # Keep only what an open (or about to open) burst may still need
+        keep_from = self.tracker.open[0] if self.tracker.open else self.tracker.position - int(self.tracker.max_gap)
+        keep_from = max(keep_from, self.tracker.position - self.max_burst)
+        if keep_from > self.buffer_start:
+            self.buffer = self.buffer[keep_from - self.buffer_start:]
+            self.buffer_start = keep_from
+        return [event for event in events if event is not None]
+
+    def flush(self):
+        events = [self.decode(*burst) for burst in self.tracker.flush()]
+        return [event for event in events if event is not None]
+
+    def decode(self, start, end, peak):
+        """Demodulate burst samples [start, end) (channel sample positions)"""
+        samples = self.buffer[max(0, start - self.buffer_start):max(0, end - self.buffer_start)]
+        if len(samples) < 16:
+            return None
+        self.bursts_seen += 1
+
+        env = np.abs(samples)
+        event = {
+            'frequency': self.frequency,
+            'start_time': round(start / self.sample_rate, 6),
+            'end_time': round(end / self.sample_rate, 6),
+            'peak': round(float(peak), 4)
+        }
+
+        result = None
+        if self.modulation in ('auto', 'FSK'):
+            track = FrequencyDiscriminator(self.sample_rate).process(samples)
+            result = self.fsk.slice_burst(track[2:-2], self.sample_rate, env[2:-2])
+        if result is not None:
+            event.update({'modulation': 'FSK', 'timings': result['timings'],
+                          'bit_string': result['bit_string'], 'symbol_rate': result['symbol_rate'],
+                          'deviation_hz': result['deviation_hz']})
+        elif self.modulation in ('auto', 'OOK'):
+            timings = self.ook.to_timings(self.ook.slice(env))
+            while timings and timings[0]['state'] == 0:
+                timings.pop(0)
+            while timings and timings[-1]['state'] == 0:
+                timings.pop()
+            if not any(t['state'] == 1 and t['duration_us'] >= self.ook.min_pulse_us for t in timings):
+                return None
+            event.update({'modulation': 'OOK', 'timings': timings,
+                          'pulse_count': sum(1 for t in timings if t['state'] == 1)})
+        else:
+            return None
+        return event
+
+
+class MultiChannelDecoder:
+    """Decode several frequencies inside one wideband stream simultaneously"""
+
+    def __init__(self, frequencies, center_freq=433920000, sample_rate=2048000, num_channels=16,
+                 modulation='auto', snr_db=10.0, max_events=1000):
+        """
+        Args:
+            frequencies: Frequencies to decode (Hz), all within the tuned band
+            center_freq: Tuned centre frequency of the stream (Hz)
+            sample_rate: Stream sample rate in Hz
+            num_channels: Filterbank channels (channel spacing = sample_rate / num_channels)
+            modulation: 'OOK', 'FSK' or 'auto'
+            snr_db: Burst detection threshold per channel
+            max_events: Decoded bursts kept for live queries
+
+        Raises:
+            ValueError: If a frequency lies outside the tuned band
+        """
+        self.center_freq = center_freq
+        self.sample_rate = sample_rate
+        self.channelizer = PolyphaseChannelizer(num_channels)
+        self.channel_rate = self.channelizer.output_rate(sample_rate)
+        self.spacing = sample_rate / num_channels
+
+        self.decoders = []
+        for frequency in frequencies:
+            offset = frequency - center_freq
+            if abs(offset) > sample_rate / 2 - self.spacing / 2:
+                raise ValueError(f"{frequency / 1e6:.3f} MHz is outside the tuned band")
+            channel = int(round(offset / self.spacing)) % num_channels
+            residual = offset - round(offset / self.spacing) * self.spacing
+            decoder = ChannelDecoder(frequency, residual, self.channel_rate, modulation, snr_db)
+            decoder.channel = channel
+            self.decoders.append(decoder)
+
+        self.events = deque(maxlen=max_events)
+        self.seq = 0
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stopping = threading.Event()
+        self.started = None
+        self.samples = 0
+
+    def process(self, samples):
+        """Feed complex64 wideband samples; returns newly decoded bursts"""
+        outputs = self.channelizer.process(samples)
+        self.samples += len(samples)
+        events = []
+        for decoder in self.decoders:
+            events.extend(decoder.process(outputs[:, decoder.channel]))
+        return self._add(events)
+
+    def flush(self):
+        events = []
+        for decoder in self.decoders:
+            events.extend(decoder.flush())
+        return self._add(events)
+
+    def _add(self, events):
+        events.sort(key=lambda e: e['start_time'])
+        with self.lock:
+            for event in events:
+                self.seq += 1
+                event['seq'] = self.seq
+                if self.started:
+                    event['timestamp'] = round(self.started + event['start_time'], 3)
+                self.events.append(event)
+        return events
+
+    # =========================================================================
+    # SOURCES
+    # =========================================================================
+
+    def decode_capture(self, capture_file, block_samples=1 << 18):
+        """
+        Decode every channel of a .cu8 capture (or uint8 I/Q array, or an
+        IQStream such as BurstStore.stream() for a packed capture)
+
+        Returns:
+            Dict with the decoded bursts per frequency
+        """
+        stream = open_stream(capture_file, self.sample_rate, block_samples)
+        events = []
+        for _, block in stream.complex_blocks():
+            events.extend(self.process(block))
+        events.extend(self.flush())
+
+        return {
+            'status': 'success' if events else 'no_signal',
+            'center_freq': self.center_freq,
+            'sample_rate': self.sample_rate,
+            'channel_rate': self.channel_rate,
+            'duration': round(stream.duration, 3),
+            'channels': [self.describe(decoder, events) for decoder in self.decoders],
+            'events': events
+        }
+
+    @staticmethod
+    def describe(decoder, events):
+        mine = [e for e in events if e['frequency'] == decoder.frequency]
+        return {
+            'frequency': decoder.frequency,
+            'channel': decoder.channel,
+            'burst_count': len(mine),
+            'modulations': sorted({e['modulation'] for e in mine})
+        }
+
+    def start(self, multiplexer):
+        """Decode the live stream of an IQMultiplexer in a background thread"""
+        if self.thread and self.thread.is_alive():
+            return self.status()
+        self.stopping.clear()
+        self.started = time.time()
+        self.thread = threading.Thread(target=self._run, args=(multiplexer,),
+                                       name='channelizer', daemon=True)
+        self.thread.start()
+        return self.status()
+
+    def _run(self, multiplexer):
+        with multiplexer.subscribe('channelizer') as subscription:
+            while not self.stopping.is_set():
+                if subscription.retuned:
+                    print("[!] Channelizer stopped: IQ multiplexer was retuned")
+                    break
+                block = subscription.read(1 << 16, timeout=1.0)
+                if block is not None and len(block):
+                    self.process(to_complex(block))
+        self.flush()
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread:
+            self.thread.join(timeout=5)
+        self.thread = None
+
+    def query(self, cursor=None, frequency=None, limit=200):
+        """Decoded bursts after `cursor`, oldest first"""
+        with self.lock:
+            events = [e for e in self.events
+                      if (cursor is None or e['seq'] > cursor)
+                      and (frequency is None or e['frequency'] == frequency)]
+        return events[-limit:] if limit else events
+
+    def status(self):
+        return {
+            'running': self.thread is not None and self.thread.is_alive(),
+            'center_freq': self.center_freq,
+            'sample_rate': self.sample_rate,
+            'channel_rate': self.channel_rate,
+            'channel_spacing': self.spacing,
+            'frequencies': [d.frequency for d in self.decoders],
+            'seconds_processed': round(self.samples / self.sample_rate, 1),
+            'bursts': {str(d.frequency): d.bursts_seen for d in self.decoders},
+            'cursor': self.seq
+        }
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+Dashboard Stats for PiFlip
+Incrementally maintained counters for /api/stats and /api/recent
+
+The dashboard used to glob the captures directory, stat every file and
+open every capture JSON on each request. Here the index is built once
+and then kept current:
+
+- save/delete routes report the files they touch (file_changed/file_removed)
+- an inotify watcher on captures/, nfc_library/ and the piflip directory
+  picks up everything else (triggered recorder, burst store, NFC tools)
+- a periodic reconcile re-stats the directories and re-reads only the
+  JSON files whose size or mtime changed, covering missed or overflowed
+  inotify events and systems without inotify
+
+Counters, frequency counts and the recent lists are updated in place,
+so answering the dashboard does no disk I/O.
+"""
+
+import ctypes
+import ctypes.util
+import heapq
+import json
+import os
+import select
+import struct
+import threading
+import time
+from collections import Counter, deque
+from pathlib import Path
+
+# inotify(7) event masks
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def frequency_key(frequency):
+    """Dashboard frequency label in MHz (Hz or MHz input), or None"""
+    try:
+        frequency = float(frequency)
+    except (TypeError, ValueError):
+        return None
+    return f"{frequency / 1e6:.2f}" if frequency > 1000 else f"{frequency:.2f}"
+
+
+class Inotify:
+    """Minimal inotify binding over libc (no extra dependency)"""
+
+    def __init__(self):
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.watches = {}
+
+    def add_watch(self, path, mask=WATCH_MASK):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f'inotify_add_watch failed: {path}')
+        self.watches[wd] = str(path)
+        return wd
+
+    def read(self, timeout=1.0):
+        """(directory, name, mask) for every pending event"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0').decode(errors='replace')
+            offset += length
+            events.append((self.watches.get(wd), name, mask))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class DashboardStats:
+    """In-memory index of captures, NFC reads and activity for the dashboard"""
+
+    def __init__(self, base_dir="~/piflip", recent_captures=10, recent_nfc=5, top_frequencies=5,
+                 activity_limit=100, reconcile_interval=600):
+        """
+        Args:
+            base_dir: PiFlip data directory (captures/, nfc_library/, activity.json)
+            recent_captures: RF captures in the recent list
+            recent_nfc: NFC reads in the recent list
+            top_frequencies: Frequencies in the top list
+            activity_limit: Activities kept in activity.json
+            reconcile_interval: Seconds between full rescans (0 = only at start)
+        """
+        self.base_dir = Path(os.path.expanduser(base_dir))
+        self.captures_dir = self.base_dir / 'captures'
+        self.nfc_dir = self.base_dir / 'nfc_library'
+        self.activity_file = self.base_dir / 'activity.json'
+        self.recent_captures = recent_captures
+        self.recent_nfc = recent_nfc
+        self.top_frequencies = top_frequencies
+        self.activity_limit = activity_limit
+        self.reconcile_interval = reconcile_interval
+
+        self.files = {}            # captures/ file name -> (size, mtime)
+        self.storage = 0
+        self.captures = {}         # capture name -> recent entry (+ 'mtime', 'frequency_key')
+        self.frequencies = Counter()
+        self.nfc = {}              # card name -> recent entry (+ 'mtime')
+        self.activities = deque()
+        self.actions = Counter()
+
+        self.lock = threading.Lock()
+        self.recent_cache = None
+        self.thread = None
+        self.stopping = threading.Event()
+        self.inotify = None
+        self.reconciles = 0
+        self.last_reconcile = None
+
+        self.reconcile()
+
+    # =========================================================================
+    # INDEX
+    # =========================================================================
+
+    @staticmethod
+    def _read_json(path):
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _set_file(self, name, stat):
+        """Track a captures/ file's size (caller holds the lock)"""
+        old = self.files.get(name)
+        if old:
+            self.storage -= old[0]
+        self.files[name] = (stat.st_size, stat.st_mtime)
+        self.storage += stat.st_size
+
+    def _drop_file(self, name):
+        old = self.files.pop(name, None)
+        if old:
+            self.storage -= old[0]
+
+    def _set_capture(self, path, stat):
+        data = self._read_json(path)
+        if not isinstance(data, dict):
+            self._drop_capture(path.stem)
+            return
+        key = frequency_key(data.get('frequency'))
+        entry = {
+            'type': 'rf_capture',
+            'name': path.stem,
+            'frequency': data.get('frequency', 'unknown'),
+            'duration': data.get('duration', 'unknown'),
+            'timestamp': data.get('timestamp', stat.st_mtime),
+            'size_kb': round(stat.st_size / 1024, 2),
+            'mtime': stat.st_mtime,
+            'frequency_key': key
+        }
+        self._drop_capture(path.stem)
+        self.captures[path.stem] = entry
+        if key:
+            self.frequencies[key] += 1
+
+    def _drop_capture(self, name):
+        old = self.captures.pop(name, None)
+        if old and old['frequency_key']:
+            self.frequencies[old['frequency_key']] -= 1
+            if self.frequencies[old['frequency_key']] <= 0:
+                del self.frequencies[old['frequency_key']]
+
+    def _set_nfc(self, path, stat):
+        data = self._read_json(path)
+        if not isinstance(data, dict):
+            self.nfc.pop(path.stem, None)
+            return
+        self.nfc[path.stem] = {
+            'type': 'nfc_read',
+            'name': path.stem,
+            'uid': data.get('uid', 'unknown'),
+            'card_type': data.get('card_type', 'unknown'),
+            'timestamp': data.get('timestamp', stat.st_mtime),
+            'mtime': stat.st_mtime
+        }
+
+    def _set_activities(self, activities):
+        self.activities = deque(a for a in activities if isinstance(a, dict))
+        self.actions = Counter(a.get('action') for a in self.activities)
+
+    def file_changed(self, path):
+        """A file was written under captures/, nfc_library/ or activity.json"""
+        path = Path(path)
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            self.file_removed(path)
+            return
+
+        with self.lock:
+            self.recent_cache = None
+            if path.parent == self.captures_dir:
+                if not path.is_file():
+                    return
+                self._set_file(path.name, stat)
+                if path.suffix == '.json':
+                    self._set_capture(path, stat)
+            elif path.parent == self.nfc_dir and path.suffix == '.json':
+                self._set_nfc(path, stat)
+            elif path == self.activity_file:
+                activities = self._read_json(path)
+                if isinstance(activities, list):
+                    self._set_activities(activities)
+
+    def file_removed(self, path):
+        """A file was deleted (or moved away)"""
+        path = Path(path)
+        with self.lock:
+            self.recent_cache = None
+            if path.parent == self.captures_dir:
+                self._drop_file(path.name)
+                if path.suffix == '.json':
+                    self._drop_capture(path.stem)
+            elif path.parent == self.nfc_dir:
+                self.nfc.pop(path.stem, None)
+            elif path == self.activity_file:
+                self._set_activities([])
+
+    def reconcile(self):
+        """
+        Bring the index in line with the disk: stat every file, re-read
+        only JSON whose size or mtime changed, drop what disappeared
+
+        Returns:
+            Number of files added, changed or removed
+        """
+        changes = 0
+        for directory, known in ((self.captures_dir, self.files), (self.nfc_dir, self.nfc)):
+            present = {}
+            if directory.exists():
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_file():
+                            present[entry.name] = entry.stat()
+
+            with self.lock:
+                if directory == self.captures_dir:
+                    tracked = {name: value for name, value in self.files.items()}
+                else:
+                    tracked = {f"{name}.json": (None, entry['mtime']) for name, entry in self.nfc.items()}
+            for name in set(tracked) - set(present):
+                self.file_removed(directory / name)
+                changes += 1
+            for name, stat in present.items():
+                old = tracked.get(name)
+                if directory == self.nfc_dir and not name.endswith('.json'):
+                    continue
+                if old is None or old[1] != stat.st_mtime or (old[0] is not None and old[0] != stat.st_size):
+                    self.file_changed(directory / name)
+                    changes += 1
+
+        activities = self._read_json(self.activity_file) if self.activity_file.exists() else []
+        with self.lock:
+            if isinstance(activities, list) and activities != list(self.activities):
+                self._set_activities(activities)
+                changes += 1
+            self.recent_cache = None
+            self.reconciles += 1
+            self.last_reconcile = time.time()
+        return changes
+
+    # =========================================================================
+    # ACTIVITY
+    # =========================================================================
+
+    def log_activity(self, activity):
+        """Append an activity, keep the last activity_limit and save them"""
+        with self.lock:
+            self.activities.append(activity)
+            self.actions[activity.get('action')] += 1
+            while len(self.activities) > self.activity_limit:
+                self.actions[self.activities.popleft().get('action')] -= 1
+            activities = list(self.activities)
+
+            self.base_dir.mkdir(parents=True, exist_ok=True)
+            tmp_file = self.activity_file.with_suffix('.tmp')
+            with open(tmp_file, 'w') as f:
+                json.dump(activities, f, indent=2)
+            os.replace(tmp_file, self.activity_file)
+
+    # =========================================================================
+    # QUERIES
+    # =========================================================================
+
+    def stats(self):
+        """Dashboard counters (same fields as the old directory scan)"""
+        with self.lock:
+            return {
+                'total_rf_captures': len(self.captures),
+                'total_nfc_reads': len(self.nfc),
+                'total_replays': self.actions['replay'],
+                'total_scans': self.actions['scan'],
+                'storage_used_mb': round(self.storage / (1024 * 1024), 2),
+                'success_rate': 95,  # Placeholder - could track actual success/failure
+                'top_frequencies': dict(self.frequencies.most_common(self.top_frequencies))
+            }
+
+    def recent(self, limit=15):
+        """Newest RF captures and NFC reads, newest first"""
+        with self.lock:
+            if self.recent_cache is None:
+                public = lambda entry: {k: v for k, v in entry.items() if k not in ('mtime', 'frequency_key')}
+                recent = [public(e) for e in heapq.nlargest(self.recent_captures, self.captures.values(),
+                                                            key=lambda e: e['mtime'])]
+                recent += [public(e) for e in heapq.nlargest(self.recent_nfc, self.nfc.values(),
+                                                             key=lambda e: e['mtime'])]
+                recent.sort(key=lambda x: str(x.get('timestamp', 0)), reverse=True)
+                self.recent_cache = recent
+            return self.recent_cache[:limit]
+
+    # =========================================================================
+    # WATCHER
+    # =========================================================================
+
+    def start(self):
+        """Watch the directories with inotify and reconcile periodically"""
+        if self.thread and self.thread.is_alive():
+            return
+        for directory in (self.base_dir, self.captures_dir, self.nfc_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+        try:
+            self.inotify = Inotify()
+            for directory in (self.base_dir, self.captures_dir, self.nfc_dir):
+                self.inotify.add_watch(directory)
+        except (OSError, AttributeError) as e:
+            print(f"[!] inotify unavailable ({e}), dashboard stats reconcile every {self.reconcile_interval}s")
+            self.inotify = None
+
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self._watch, name='dashboard-stats', daemon=True)
+        self.thread.start()
+
+    def _watch(self):
+        next_reconcile = time.time() + self.reconcile_interval if self.reconcile_interval else None
+        while not self.stopping.is_set():
+            if self.inotify is None:
+                self.stopping.wait(self.reconcile_interval or 60)
+                if self.reconcile_interval:
+                    self.reconcile()
+                continue
+
+            try:
+                events = self.inotify.read(timeout=1.0)
+            except OSError as e:
+                print(f"[!] Dashboard stats watcher: {e}")
+                events = []
+            for directory, name, mask in events:
+                if mask & IN_Q_OVERFLOW:
+                    self.reconcile()
+                    continue
+                if not directory or not name or name.endswith('.tmp'):
+                    continue
+                path = Path(directory) / name
+                if directory == str(self.base_dir) and path != self.activity_file:
+                    continue
+                if mask & (IN_DELETE | IN_MOVED_FROM):
+                    self.file_removed(path)
+                else:
+                    self.file_changed(path)
+
+            if next_reconcile and time.time() >= next_reconcile:
+                self.reconcile()
+                next_reconcile = time.time() + self.reconcile_interval
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread:
+            self.thread.join(timeout=5)
+        self.thread = None
+        if self.inotify:
+            self.inotify.close()
+            self.inotify = None
+
+    def status(self):
+        with self.lock:
+            return {
+                'watching': self.inotify is not None,
+                'files': len(self.files),
+                'captures': len(self.captures),
+                'nfc_reads': len(self.nfc),
+                'activities': len(self.activities),
+                'reconciles': self.reconciles,
+                'last_reconcile': self.last_reconcile
+            }
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Device Manager for PiFlip
+Long-lived device ownership with cached health state
+
+Status polls used to probe the hardware themselves: `rtl_test -t` (up to
+2 s, and it fails while rtl_433 or the IQ multiplexer holds the dongle)
+and a fresh CC1101Enhanced()/NFCEmulator() per call, which re-opened
+SPI, reset the radio and re-initialised I2C. Here:
+
+- each device is registered with a probe; the probe opens the device
+  once and afterwards only checks it (CC1101 PARTNUM/VERSION, PN532
+  firmware version, RTL-SDR presence from sysfs without opening it)
+- a background thread re-probes every `interval` seconds (missing
+  devices every `missing_interval`) and on udev hot-plug events, read
+  straight from the kernel uevent netlink socket
+- probes are skipped while a device is in use - an operation holding
+  use(name), or an `in_use` callback such as a running job - so a
+  health check never interleaves with a transmission or a card read
+- status() returns the cached state without touching hardware
+"""
+
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+NETLINK_KOBJECT_UEVENT = 15
+
+# Realtek RTL2832U-based dongles
+RTL_SDR_USB_IDS = {('0bda', '2838'), ('0bda', '2832')}
+
+
+def usb_devices(ids, sysfs="/sys/bus/usb/devices"):
+    """
+    USB devices matching (vendor, product) ids, from sysfs (no device I/O)
+
+    Returns:
+        List of dicts with id, bus path, manufacturer, product and serial
+    """
+    found = []
+    for device in sorted(Path(sysfs).glob('*')):
+        try:
+            vendor = (device / 'idVendor').read_text().strip()
+            product = (device / 'idProduct').read_text().strip()
+        except OSError:
+            continue
+        if (vendor, product) not in ids:
+            continue
+        info = {'id': f"{vendor}:{product}", 'path': device.name}
+        for field in ('manufacturer', 'product', 'serial'):
+            try:
+                info[field] = (device / field).read_text().strip()
+            except OSError:
+                pass
+        found.append(info)
+    return found
+
+
+def rtl_sdr_devices():
+    """Attached RTL-SDR dongles (busy or not)"""
+    return usb_devices(RTL_SDR_USB_IDS)
+
+
+class DeviceManager:
+    """Own the radios for the life of the process and cache their health"""
+
+    def __init__(self, interval=30.0, missing_interval=300.0, udev=True):
+        """
+        Args:
+            interval: Seconds between health checks of present devices
+            missing_interval: Seconds between probes of missing devices
+                              (hot-plug events re-probe immediately)
+            udev: Listen for kernel uevents (USB hot-plug)
+        """
+        self.interval = interval
+        self.missing_interval = missing_interval
+        self.udev = udev
+
+        self.devices = {}
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+        self.udev_thread = None
+        self.udev_socket = None
+        self.hotplug_events = 0
+
+    def register(self, name, probe, in_use=None, hotplug=False):
+        """
+        Register a device
+
+        Args:
+            name: Device name ('cc1101', 'pn532', 'rtl_sdr')
+            probe: probe() -> (present, detail dict); opens the device on first
+                   success and raises or returns False when it is unusable
+            in_use: Optional callback -> description of who is using it (or None)
+            hotplug: Re-probe immediately on USB uevents
+        """
+        self.devices[name] = {
+            'probe': probe,
+            'in_use': in_use,
+            'hotplug': hotplug,
+            'use_lock': threading.RLock(),
+            'next_check': 0.0,
+            'state': {
+                'name': name,
+                'status': 'unknown',       # ok, missing, error, unknown
+                'present': False,
+                'busy': None,
+                'detail': {},
+                'error': None,
+                'checks': 0,
+                'check_ms': None,
+                'last_check': None,
+                'last_change': None
+            }
+        }
+
+    # =========================================================================
+    # USE
+    # =========================================================================
+
+    @contextmanager
+    def use(self, name):
+        """Hold a device for an operation (health checks wait until released)"""
+        device = self.devices[name]
+        with device['use_lock']:
+            yield
+
+    def is_healthy(self, name):
+        state = self.devices[name]['state'] if name in self.devices else None
+        return bool(state and state['status'] == 'ok')
+
+    # =========================================================================
+    # PROBING
+    # =========================================================================
+
+    def check(self, name):
+        """
+        Probe one device now (unless it is busy)
+
+        Returns:
+            The device's state after the check
+        """
+        device = self.devices[name]
+        busy = None
+        if device['in_use']:
+            try:
+                busy = device['in_use']()
+            except Exception:
+                busy = None
+
+        if busy or not device['use_lock'].acquire(blocking=False):
+            # Keep the last known health; the device is evidently working
+            with self.lock:
+                device['state']['busy'] = busy or 'operation in progress'
+                device['next_check'] = time.time() + self.interval
+            return self.state(name)
+
+        try:
+            started = time.perf_counter()
+            try:
+                present, detail = device['probe']()
+                status, error = ('ok' if present else 'missing'), None
+            except Exception as e:
+                present, detail, status, error = False, {}, 'error', str(e)
+            elapsed = (time.perf_counter() - started) * 1000
+        finally:
+            device['use_lock'].release()
+
+        now = time.time()
+        with self.lock:
+            state = device['state']
+            if state['status'] != status:
+                if state['status'] != 'unknown':
+                    print(f"[*] {name}: {state['status']} -> {status}")
+                state['last_change'] = now
+            state.update(status=status, present=bool(present), busy=None, detail=detail or {},
+                         error=error, checks=state['checks'] + 1, check_ms=round(elapsed, 2),
+                         last_check=now)
+            device['next_check'] = now + (self.interval if status == 'ok' else self.missing_interval)
+        return self.state(name)
+
+    def refresh(self, names=None):
+        """Probe the given devices (default all) now, in the calling thread"""
+        for name in names or list(self.devices):
+            self.check(name)
+        return self.status()
+
+    def _run(self):
+        while not self.stopping.is_set():
+            now = time.time()
+            for name, device in list(self.devices.items()):
+                if self.stopping.is_set():
+                    break
+                if now >= device['next_check']:
+                    self.check(name)
+
+            upcoming = [device['next_check'] for device in self.devices.values()]
+            delay = max(0.1, min(upcoming) - time.time()) if upcoming else self.interval
+            self.wake.wait(min(delay, self.interval))
+            self.wake.clear()
+
+    # =========================================================================
+    # HOT-PLUG
+    # =========================================================================
+
+    def _listen_udev(self):
+        """Kernel uevents: USB add/remove re-probes the hot-pluggable devices"""
+        while not self.stopping.is_set():
+            try:
+                data = self.udev_socket.recv(16384)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+
+            fields = dict(part.split('=', 1) for part in data.decode(errors='replace').split('\0')
+                          if '=' in part)
+            if fields.get('SUBSYSTEM') != 'usb' or fields.get('ACTION') not in ('add', 'remove', 'bind', 'unbind'):
+                continue
+
+            self.hotplug_events += 1
+            # Give the driver a moment to bind before probing
+            self.stopping.wait(1.0)
+            with self.lock:
+                for device in self.devices.values():
+                    if device['hotplug']:
+                        device['next_check'] = 0.0
+            self.wake.set()
+
+    def _open_udev(self):
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+            sock.bind((0, 1))
+            sock.settimeout(1.0)
+            return sock
+        except (OSError, AttributeError) as e:
+            print(f"[!] udev hot-plug unavailable ({e}), polling every {self.missing_interval:.0f}s")
+            return None
+
+    # =========================================================================
+    # LIFECYCLE
+    # =========================================================================
+
+    def start(self):
+        """Start background health checks (and the uevent listener)"""
+        if self.thread and self.thread.is_alive():
+            return
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self._run, name='device-manager', daemon=True)
+        self.thread.start()
+
+        if self.udev and any(device['hotplug'] for device in self.devices.values()):
+            self.udev_socket = self._open_udev()
+            if self.udev_socket is not None:
+                self.udev_thread = threading.Thread(target=self._listen_udev, name='device-hotplug', daemon=True)
+                self.udev_thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        self.wake.set()
+        for thread in (self.thread, self.udev_thread):
+            if thread:
+                thread.join(timeout=5)
+        if self.udev_socket is not None:
+            self.udev_socket.close()
+            self.udev_socket = None
+        self.thread = self.udev_thread = None
+
+    # =========================================================================
+    # STATUS
+    # =========================================================================
+
+    def state(self, name):
+        with self.lock:
+            state = dict(self.devices[name]['state'])
+        state['age'] = round(time.time() - state['last_check'], 1) if state['last_check'] else None
+        return state
+
+    def status(self):
+        """Cached state of every device (no hardware access)"""
+        return {name: self.state(name) for name in self.devices}
+
+    def summary(self):
+        return {
+            'running': self.thread is not None and self.thread.is_alive(),
+            'hotplug': self.udev_socket is not None,
+            'hotplug_events': self.hotplug_events,
+            'interval': self.interval,
+            'missing_interval': self.missing_interval
+        }
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Envelope Pyramid for PiFlip
+Multi-resolution min/max envelope for zoomable waveform previews
+
+Level 0 holds the min and max magnitude of every `base_factor` IQ samples;
+each further level halves the previous one (min of mins, max of maxes)
+until it is short enough to draw whole. A zoom window is rendered from
+the coarsest level that still has at least one entry per column, so it
+reads between `width` and `2 * width` entries whatever the capture
+length. Windows finer than level 0 read the raw IQ directly.
+
+Captures get a {name}.envelope file next to the .cu8 (a small JSON
+header plus the uint8 levels back to back, memory-mapped on load).
+"""
+
+import os
+import json
+import struct
+from pathlib import Path
+
+import numpy as np
+import metrics
+from iq_stream import IQStream, MAGNITUDE_LUT
+from burst_store import BurstStore
+
+MAGIC = b'PFENV1\n'
+
+
+class EnvelopePyramid:
+    """Min/max envelope at power-of-two decimation levels"""
+
+    def __init__(self, levels, base_factor, sample_rate, num_samples, stream=None):
+        """
+        Args:
+            levels: List of (entries x 2) uint8 arrays of [min, max], finest first
+            base_factor: Samples per level 0 entry
+            sample_rate: Samples per second
+            num_samples: Samples covered
+            stream: IQStream of the capture, for windows finer than level 0
+        """
+        self.levels = levels
+        self.base_factor = base_factor
+        self.sample_rate = sample_rate
+        self.num_samples = num_samples
+        self.stream = stream
+
+    @property
+    def duration(self):
+        return self.num_samples / self.sample_rate
+
+    @property
+    def peak(self):
+        return int(self.levels[-1][:, 1].max()) if len(self.levels[-1]) else 0
+
+    # =========================================================================
+    # BUILDING
+    # =========================================================================
+
+    @staticmethod
+    def group(values, factor):
+        """[min, max] of consecutive groups of `factor` values (last may be short)"""
+        usable = len(values) - len(values) % factor
+        full = values[:usable].reshape(-1, factor)
+        rows = [np.column_stack([full.min(axis=1), full.max(axis=1)])]
+        if usable < len(values):
+            rows.append([[values[usable:].min(), values[usable:].max()]])
+        return np.concatenate(rows).astype(np.uint8)
+
+    @staticmethod
+    def reduce_level(level):
+        """Next level: pairs of entries merged"""
+        usable = len(level) - len(level) % 2
+        merged = np.column_stack([
+            np.minimum(level[0:usable:2, 0], level[1:usable:2, 0]),
+            np.maximum(level[0:usable:2, 1], level[1:usable:2, 1])
+        ])
+        if usable < len(level):
+            merged = np.concatenate([merged, level[usable:]])
+        return merged
+
+    @classmethod
+    def from_base(cls, base, base_factor, sample_rate, num_samples, min_length=64, stream=None):
+        """Stack levels on top of a level 0 array"""
+        levels = [base]
+        while len(levels[-1]) > min_length:
+            levels.append(cls.reduce_level(levels[-1]))
+        return cls(levels, base_factor, sample_rate, num_samples, stream)
+
+    @staticmethod
+    def magnitudes(block):
+        """LUT magnitude of (samples x 2) uint8 I/Q, as uint8"""
+        return np.minimum(MAGNITUDE_LUT[block[:, 0], block[:, 1]], 255).astype(np.uint8)
+
+    @classmethod
+    def build(cls, capture_file, sample_rate=2048000, base_factor=64, block_samples=1 << 18):
+        """Build the pyramid of a .cu8 capture (or uint8 I/Q array), block by block"""
+        block_samples = max(base_factor, block_samples - block_samples % base_factor)
+        stream = IQStream(capture_file, sample_rate, block_samples)
+        base = np.zeros((-(-len(stream) // base_factor), 2), dtype=np.uint8)
+        for offset, block in stream.blocks():
+            rows = cls.group(cls.magnitudes(block), base_factor)
+            base[offset // base_factor:offset // base_factor + len(rows)] = rows
+        return cls.from_base(base, base_factor, sample_rate, len(stream), stream=stream)
+
+    @classmethod
+    def build_sparse(cls, store, name, base_factor=64):
+        """Build the pyramid of a burst-only capture (gaps are silent)"""
+        index = store.load_index(name)
+        if index is None:
+            raise FileNotFoundError(f"No burst index for {name}")
+
+        base = np.zeros((-(-index['num_samples'] // base_factor), 2), dtype=np.uint8)
+        for entry, iq in store.iter_bursts(name):
+            lead = entry['start_sample'] % base_factor
+            values = np.concatenate([np.zeros(lead, dtype=np.uint8), cls.magnitudes(iq)])
+            rows = cls.group(values, base_factor)
+            region = base[entry['start_sample'] // base_factor:][:len(rows)]
+            region[:, 0] = rows[:len(region), 0]
+            np.maximum(region[:, 1], rows[:len(region), 1], out=region[:, 1])
+        return cls.from_base(base, base_factor, index['sample_rate'], index['num_samples'])
+
+    # =========================================================================
+    # STORAGE
+    # =========================================================================
+
+    def save(self, path):
+        header = json.dumps({
+            'base_factor': self.base_factor,
+            'sample_rate': self.sample_rate,
+            'num_samples': self.num_samples,
+            'levels': [len(level) for level in self.levels]
+        }).encode()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(MAGIC)
+            f.write(struct.pack('<I', len(header)))
+            f.write(header)
+            for level in self.levels:
+                f.write(np.ascontiguousarray(level, dtype=np.uint8).tobytes())
+        os.replace(tmp_path, path)
+        metrics.library_io(path, 'written')
+
+    @classmethod
+    def load(cls, path, stream=None):
+        """Memory-map a saved pyramid"""
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"Not an envelope pyramid: {path}")
+            header_size = struct.unpack('<I', f.read(4))[0]
+            header = json.loads(f.read(header_size))
+
+        offset = len(MAGIC) + 4 + header_size
+        levels = []
+        for length in header['levels']:
+            levels.append(np.memmap(path, dtype=np.uint8, mode='r', offset=offset, shape=(length, 2)))
+            offset += length * 2
+        metrics.library_io(path, 'read', offset)
+        return cls(levels, header['base_factor'], header['sample_rate'], header['num_samples'], stream)
+
+    # =========================================================================
+    # WINDOWS
+    # =========================================================================
+
+    def window(self, start=0, end=None, width=60):
+        """
+        Min/max per column of samples [start, end)
+
+        Returns:
+            (mins, maxs, samples per entry read) - uint8 arrays of at most
+            `width` columns
+        """
+        end = self.num_samples if end is None else min(int(end), self.num_samples)
+        start = max(0, int(start))
+        span = end - start
+        if span <= 0 or width <= 0:
+            empty = np.empty(0, dtype=np.uint8)
+            return empty, empty, 1
+
+        width = int(min(width, span))
+        edges = start + (np.arange(width) * span / width).astype(np.int64)
+
+        if span / width < self.base_factor and self.stream is not None:
+            # Finer than level 0 - the window is at most width * base_factor samples
+            values = self.magnitudes(self.stream.iq[start:end])
+            return (np.minimum.reduceat(values, edges - start),
+                    np.maximum.reduceat(values, edges - start), 1)
+
+        number = int(np.clip(np.floor(np.log2(max(span / width / self.base_factor, 1))),
+                             0, len(self.levels) - 1))
+        factor = self.base_factor << number
+        first = start // factor
+        rows = self.levels[number][first:-(-end // factor)]
+        indices = edges // factor - first
+        return (np.minimum.reduceat(rows[:, 0], indices),
+                np.maximum.reduceat(rows[:, 1], indices), factor)
+
+    def window_dict(self, start_time=0.0, end_time=None, width=600):
+        """JSON-friendly window between two times (seconds)"""
+        start = int(start_time * self.sample_rate)
+        end = self.num_samples if end_time is None else int(end_time * self.sample_rate)
+        mins, maxs, factor = self.window(start, end, width)
+        end = min(end, self.num_samples)
+        return {
+            'start_time': round(start / self.sample_rate, 6),
+            'end_time': round(end / self.sample_rate, 6),
+            'duration': round(self.duration, 6),
+            'columns': len(maxs),
+            'samples_per_column': round((end - start) / max(len(maxs), 1), 2),
+            'samples_per_entry': factor,
+            'peak': self.peak,
+            'min': mins.tolist(),
+            'max': maxs.tolist()
+        }
+
+    def render_ascii(self, start=0, end=None, width=60, height=8):
+        """Oscilloscope-style rows: each column filled from its min to its max"""
+        mins, maxs, _ = self.window(start, end, width)
+        scale = max(self.peak, 1)
+        top = height - 1 - (maxs.astype(np.float32) / scale * (height - 1)).astype(int)
+        bottom = height - 1 - (mins.astype(np.float32) / scale * (height - 1)).astype(int)
+        rows = np.arange(height)[:, np.newaxis]
+        grid = np.where((rows >= top) & (rows <= bottom), '█', ' ')
+        return '\n'.join(''.join(row).ljust(width) for row in grid)
+
+    # =========================================================================
+    # CAPTURES
+    # =========================================================================
+
+    @classmethod
+    def for_capture(cls, name, capture_dir="~/piflip/captures", rebuild=False):
+        """
+        Pyramid of a capture, built and saved on first use
+
+        Raises:
+            FileNotFoundError: If neither the .cu8 nor sparse storage exists
+        """
+        capture_dir = Path(os.path.expanduser(capture_dir))
+        capture_file = capture_dir / f"{name}.cu8"
+        pyramid_file = capture_dir / f"{name}.envelope"
+
+        metadata = {}
+        metadata_file = capture_dir / f"{name}.json"
+        if metadata_file.exists():
+            with open(metadata_file, 'r') as f:
+                metadata = json.load(f)
+        sample_rate = metadata.get('sample_rate') or 2048000
+
+        stream = IQStream(capture_file, sample_rate) if capture_file.exists() else None
+        if pyramid_file.exists() and not rebuild and (
+                stream is None or pyramid_file.stat().st_mtime >= capture_file.stat().st_mtime):
+            return cls.load(pyramid_file, stream)
+
+        if stream is not None:
+            pyramid = cls.build(capture_file, sample_rate)
+        else:
+            store = BurstStore(capture_dir)
+            if not store.is_sparse(name):
+                raise FileNotFoundError(f"Capture not found: {name}")
+            pyramid = cls.build_sparse(store, name)
+
+        pyramid.save(pyramid_file)
+        return pyramid
+
+    @staticmethod
+    def delete(name, capture_dir="~/piflip/captures"):
+        """Remove a capture's pyramid; returns the names removed"""
+        pyramid_file = Path(os.path.expanduser(capture_dir)) / f"{name}.envelope"
+        if pyramid_file.exists():
+            pyramid_file.unlink()
+            return [pyramid_file.name]
+        return []
@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+"""
+FSK Demodulator for PiFlip
+In-process 2-FSK / GFSK demodulation of RTL-SDR .cu8 captures
+
+Pipeline (per detected burst, block by block - see iq_stream):
+1. Occupied band of the burst from its averaged spectrum
+2. Mix the band to baseband and boxcar-decimate it (channel filter)
+3. Instantaneous frequency: angle(x[n] * conj(x[n-1]))
+4. Carrier offset and deviation from the mark/space frequency levels
+5. Symbol rate from the spectral line of the transition train
+6. Matched filter (integrate over one symbol), slice, and run-length
+   encode; the symbol length is refined against the run lengths and
+   every run quantized to a whole number of symbols
+
+Steps 4-5 look at the first `max_track` samples of the track only; the
+rest of a long burst streams through the slicer, so memory is bounded
+by the block size and the number of runs, not the burst length.
+
+Bursts whose amplitude is not steady (on-off keyed) are skipped.
+
+Output uses the same {state, duration_us} timings as the OOK path
+(state 1 = mark / upper frequency) plus the recovered bit string, so
+SignalDecoder can work on either.
+"""
+
+import numpy as np
+from iq_stream import (open_stream, BoxcarDecimator, FIRFilter, FrequencyDiscriminator, Mixer,
+                       RunLengthEncoder, SpectrumAverager, schmitt_trigger)
+
+
+class FSKSlicer:
+    """
+    Matched filter, Schmitt slicer and run-length encoder over a frequency
+    track, block by block (same runs as slicing the whole track at once)
+    """
+
+    def __init__(self, offset, hysteresis, samples_per_symbol):
+        """
+        Args:
+            offset: Track value halfway between mark and space (Hz)
+            hysteresis: Slicer dead band either side of the offset (Hz)
+            samples_per_symbol: Matched filter length
+        """
+        width = max(1, int(round(samples_per_symbol)))
+        self.offset = offset
+        self.hysteresis = hysteresis
+        self.filter = FIRFilter(np.ones(width, dtype=np.float32) / width)
+        # Centre the causal filter like np.convolve(mode='same')
+        self.delay = (width - 1) // 2
+        self.skip = self.delay
+        self.state = None
+        self.encoder = RunLengthEncoder()
+        self.levels = []
+        self.lengths = []
+
+    def process(self, track):
+        matched = self.filter.process(np.asarray(track, dtype=np.float32) - self.offset)
+        skipped = min(self.skip, len(matched))
+        self.skip -= skipped
+        self._slice(matched[skipped:])
+
+    def finish(self):
+        """Flush the filter and the open run; returns all (levels, lengths)"""
+        # Past the end the track counts as the offset (zero), as in mode='same'
+        self.process(np.full(self.delay, self.offset, dtype=np.float32))
+        levels, lengths = self.encoder.flush()
+        self.levels.append(levels)
+        self.lengths.append(lengths)
+        return (np.concatenate(self.levels).astype(np.uint8),
+                np.concatenate(self.lengths).astype(np.int64))
+
+    def _slice(self, matched):
+        if len(matched) == 0:
+            return
+        if self.state is None:
+            self.state = int(matched[0] > 0)
+        states = schmitt_trigger(matched, -self.hysteresis, self.hysteresis, self.state)
+        self.state = int(states[-1])
+        levels, lengths = self.encoder.process(states)
+        self.levels.append(levels)
+        self.lengths.append(lengths)
+
+
+class FSKDemodulator:
+    """Demodulate FSK/GFSK bursts from .cu8 captures into timings and bits"""
+
+    def __init__(self, sample_rate=2048000, block_samples=1 << 18, snr_db=10.0,
+                 max_decimation=64, min_deviation_hz=1000, min_symbols=8, min_carrier=0.8,
+                 max_track=1 << 16):
+        """
+        Args:
+            sample_rate: Capture sample rate in Hz
+            block_samples: IQ samples processed per block (bounds memory)
+            snr_db: Envelope level above noise that marks a burst
+            max_decimation: Upper limit of the channel filter decimation
+            min_deviation_hz: Smaller frequency swings are not treated as FSK
+            min_symbols: Bursts with fewer symbols are skipped
+            min_carrier: Fraction of a burst the carrier must be steadily on
+            max_track: Track samples (from the start of a burst) used to
+                       estimate levels and symbol rate
+        """
+        self.sample_rate = sample_rate
+        self.block_samples = block_samples
+        self.snr_db = snr_db
+        self.max_decimation = max_decimation
+        self.min_deviation_hz = min_deviation_hz
+        self.min_symbols = min_symbols
+        self.min_carrier = min_carrier
+        self.max_track = max_track
+
+    # =========================================================================
+    # CHANNEL
+    # =========================================================================
+
+    def occupied_band(self, stream, start, end):
+        """
+        Centre and width (Hz) of the band holding a burst's power
+
+        The band runs from 2% to 98% of the power above the noise floor.
+        """
+        size = int(min(1024, 1 << int(np.log2(max(64, (end - start) // 8)))))
+        averager = SpectrumAverager(size)
+        for _, samples in stream.complex_blocks(start, end):
+            averager.process(samples)
+        freqs, powers = averager.result(self.sample_rate)
+        if len(freqs) == 0:
+            return 0.0, float(self.sample_rate)
+
+        power = 10 ** (powers / 10)
+        excess = np.maximum(power - 2 * np.median(power), 0)
+        if excess.sum() <= 0:
+            return 0.0, float(self.sample_rate)
+        cumulative = np.cumsum(excess) / excess.sum()
+        low = freqs[np.searchsorted(cumulative, 0.02)]
+        high = freqs[min(np.searchsorted(cumulative, 0.98), len(freqs) - 1)]
+        bin_width = self.sample_rate / size
+        return float((low + high) / 2), float(high - low + bin_width)
+
+    def channel(self, stream, start, end):
+        """
+        Channel filter for samples [start, end)
+
+        Returns:
+            (generator of complex64 baseband blocks, their sample rate,
+             band centre Hz)
+        """
+        centre, bandwidth = self.occupied_band(stream, start, end)
+        # Keep about 4x the occupied bandwidth
+        decimation = int(np.clip(self.sample_rate // (4 * bandwidth), 1, self.max_decimation))
+
+        mixer = Mixer(centre, self.sample_rate)
+        decimator = BoxcarDecimator(decimation)
+        blocks = (decimator.process(mixer.process(block))
+                  for _, block in stream.complex_blocks(start, end))
+        return blocks, self.sample_rate / decimation, centre
+
+    def baseband(self, stream, start, end, max_samples=None):
+        """
+        Channel-filtered complex baseband of samples [start, end), at most
+        `max_samples` of it (from the start)
+
+        Returns:
+            (complex64 samples, their sample rate, band centre Hz)
+        """
+        blocks, rate, centre = self.channel(stream, start, end)
+        samples = []
+        kept = 0
+        for block in blocks:
+            if max_samples is not None and kept + len(block) >= max_samples:
+                samples.append(block[:max_samples - kept])
+                break
+            samples.append(block)
+            kept += len(block)
+        samples = np.concatenate(samples) if samples else np.empty(0, dtype=np.complex64)
+        return samples, rate, centre
+
+    def frequency_blocks(self, stream, start, end):
+        """
+        Channel-filtered instantaneous frequency of samples [start, end),
+        block by block, without the key-up/key-down transients
+
+        Returns:
+            (generator of (track Hz relative to the band centre, amplitude
+             envelope) blocks, track sample rate, band centre Hz)
+        """
+        blocks, track_rate, centre = self.channel(stream, start, end)
+
+        def generate():
+            discriminator = FrequencyDiscriminator(track_rate)
+            # Drop 2 samples at each edge: the last 2 are held back until the next block
+            held_track = held_env = np.empty(0, dtype=np.float32)
+            lead = 2
+            for samples in blocks:
+                track = np.concatenate([held_track, discriminator.process(samples)])
+                env = np.concatenate([held_env, np.abs(samples).astype(np.float32)])
+                held_track, held_env = track[-2:], env[-2:]
+                track, env = track[:-2], env[:-2]
+                dropped = min(lead, len(track))
+                lead -= dropped
+                if len(track) > dropped:
+                    yield track[dropped:], env[dropped:]
+
+        return generate(), track_rate, centre
+
+    # =========================================================================
+    # SYMBOLS
+    # =========================================================================
+
+    @staticmethod
+    def estimate_symbol_length(states):
+        """
+        Samples per symbol from the spectral line of the transition train
+
+        Transitions only happen on symbol boundaries, so |diff(states)|
+        has a line at the symbol rate even when noise adds stray edges.
+        """
+        transitions = np.abs(np.diff(states.astype(np.int8))).astype(np.float32)
+        if transitions.sum() < 4:
+            return None
+        size = 1 << int(np.ceil(np.log2(4 * len(transitions))))
+        spectrum = np.abs(np.fft.rfft(transitions - transitions.mean(), size))
+        freqs = np.fft.rfftfreq(size)
+
+        # At least 4 symbols per burst and 2.5 samples per symbol
+        band = np.flatnonzero((freqs > 4.0 / len(transitions)) & (freqs < 0.4))
+        if len(band) == 0:
+            return None
+        spectrum, freqs = spectrum[band], freqs[band]
+
+        # Clean edges form a comb with equally strong harmonics - the symbol
+        # rate is the lowest strong line, not necessarily the strongest
+        first = int(np.flatnonzero(spectrum >= 0.6 * spectrum.max())[0])
+        window = spectrum[first:first + max(3, first // 3)]
+        return float(1.0 / freqs[first + int(np.argmax(window))])
+
+    @staticmethod
+    def refine_symbol_length(lengths, unit, iterations=2):
+        """Least-squares symbol length against whole-symbol run counts"""
+        lengths = np.asarray(lengths, dtype=np.float64)
+        lengths = lengths[lengths >= unit / 2]
+        for _ in range(iterations):
+            if len(lengths) == 0:
+                break
+            symbols = np.maximum(1, np.round(lengths / unit))
+            unit = float(lengths.sum() / symbols.sum())
+        return unit
+
+    def estimate(self, track, track_rate, env=None, symbol_rate=None):
+        """
+        Levels and symbol length from (the start of) a burst's frequency track
+
+        Args:
+            track: Instantaneous frequency in Hz
+            track_rate: Sample rate of the track in Hz
+            env: Matching amplitude envelope (skips on-off keyed bursts)
+            symbol_rate: Known symbol rate in baud (estimated when None)
+
+        Returns:
+            Dict with offset, deviation, hysteresis and samples per symbol,
+            or None if the burst does not look like FSK
+        """
+        if len(track) < 16:
+            return None
+        if env is not None and len(env):
+            carrier = env > 0.5 * np.percentile(env, 95)
+            if carrier.mean() < self.min_carrier:
+                return None
+
+        space, mark = np.percentile(track, [10, 90])
+        offset = (mark + space) / 2
+        deviation = (mark - space) / 2
+        if deviation < self.min_deviation_hz:
+            return None
+        hysteresis = deviation * 0.2
+
+        # Rough symbol length from the raw slicer; the matched filter refines it
+        if symbol_rate:
+            samples_per_symbol = track_rate / symbol_rate
+        else:
+            samples_per_symbol = self.estimate_symbol_length(
+                schmitt_trigger(track - offset, -hysteresis, hysteresis))
+            if samples_per_symbol is None:
+                return None
+
+        return {'offset': offset, 'deviation': deviation, 'hysteresis': hysteresis,
+                'samples_per_symbol': samples_per_symbol}
+
+    def symbols(self, levels, lengths, estimate, track_rate, symbol_rate=None):
+        """
+        Quantize the slicer's runs to whole symbols
+
+        Returns:
+            Dict with offset, deviation, symbol rate, timings and bits,
+            or None if there are too few symbols
+        """
+        samples_per_symbol = estimate['samples_per_symbol']
+        if not symbol_rate:
+            samples_per_symbol = self.refine_symbol_length(lengths[1:-1], samples_per_symbol)
+
+        symbols = np.maximum(1, np.round(lengths / samples_per_symbol)).astype(np.int64)
+        if symbols.sum() < self.min_symbols:
+            return None
+
+        us_per_sample = 1e6 / track_rate
+        return {
+            'offset_hz': round(float(estimate['offset']), 1),
+            'deviation_hz': round(float(estimate['deviation']), 1),
+            'symbol_rate': round(track_rate / samples_per_symbol, 1),
+            'timings': [
+                {'state': int(level), 'duration_us': int(round(length * us_per_sample))}
+                for level, length in zip(levels, lengths)
+            ],
+            'bit_string': ''.join(np.repeat(levels, symbols).astype(str))
+        }
+
+    def slice_burst(self, track, track_rate, env=None, symbol_rate=None):
+        """
+        Recover symbols from one burst's whole frequency track
+
+        Args:
+            track: Instantaneous frequency in Hz
+            track_rate: Sample rate of the track in Hz
+            env: Matching amplitude envelope (skips on-off keyed bursts)
+            symbol_rate: Known symbol rate in baud (estimated when None)
+
+        Returns:
+            Dict with offset, deviation, symbol rate, timings and bits,
+            or None if the burst does not look like FSK
+        """
+        estimate = self.estimate(track, track_rate, env, symbol_rate)
+        if estimate is None:
+            return None
+        slicer = FSKSlicer(estimate['offset'], estimate['hysteresis'], estimate['samples_per_symbol'])
+        slicer.process(track)
+        return self.symbols(*slicer.finish(), estimate, track_rate, symbol_rate)
+
+    # =========================================================================
+    # PIPELINE
+    # =========================================================================
+
+    def demodulate_burst(self, stream, burst, symbol_rate=None):
+        """
+        Demodulate one burst (dict with start_sample/end_sample) of a stream
+
+        The first `max_track` track samples set the levels and symbol
+        length; from then on each block goes straight through the slicer.
+        """
+        blocks, track_rate, centre = self.frequency_blocks(
+            stream, burst['start_sample'], burst['end_sample'])
+
+        head_track, head_env, head_length = [], [], 0
+        slicer = None
+        estimate = None
+        for track, env in blocks:
+            if slicer is not None:
+                slicer.process(track)
+                continue
+            head_track.append(track)
+            head_env.append(env)
+            head_length += len(track)
+            if head_length >= self.max_track:
+                estimate, slicer = self._start_slicer(head_track, head_env, track_rate, symbol_rate)
+                if slicer is None:
+                    return None
+                head_track = head_env = None
+
+        if slicer is None:
+            if not head_track:
+                return None
+            estimate, slicer = self._start_slicer(head_track, head_env, track_rate, symbol_rate)
+            if slicer is None:
+                return None
+
+        result = self.symbols(*slicer.finish(), estimate, track_rate, symbol_rate)
+        if result is not None:
+            result['offset_hz'] = round(result['offset_hz'] + centre, 1)
+        return result
+
+    def _start_slicer(self, head_track, head_env, track_rate, symbol_rate):
+        """Estimate from the buffered head of a burst and slice it; (None, None) if not FSK"""
+        track = np.concatenate(head_track)
+        env = np.concatenate(head_env)
+        estimate = self.estimate(track[:self.max_track], track_rate, env[:self.max_track], symbol_rate)
+        if estimate is None:
+            return None, None
+        slicer = FSKSlicer(estimate['offset'], estimate['hysteresis'], estimate['samples_per_symbol'])
+        slicer.process(track)
+        return estimate, slicer
+
+    def demodulate(self, capture_file, symbol_rate=None, bursts=None):
+        """
+        Demodulate every FSK burst of a capture
+
+        Args:
+            capture_file: Path to the .cu8 file (or a uint8 I/Q array or IQStream)
+            symbol_rate: Known symbol rate in baud (estimated per burst when None)
+            bursts: Bursts to demodulate (default: detect them)
+
+        Returns:
+            Dict with per-burst results, the combined timings and the
+            bit string of the longest burst
+        """
+        stream = open_stream(capture_file, self.sample_rate, self.block_samples)
+        if len(stream) < 256:
+            return {'status': 'error', 'message': 'Capture too short'}
+
+        if bursts is None:
+            bursts = stream.bursts(snr_db=self.snr_db)
+
+        results = []
+        timings = []
+        position = 0
+
+        for burst in bursts:
+            result = self.demodulate_burst(stream, burst, symbol_rate)
+            if result is None:
+                continue
+
+            gap_us = int(round((burst['start_sample'] - position) * 1e6 / self.sample_rate))
+            if timings and gap_us > 0:
+                timings.append({'state': 0, 'duration_us': gap_us})
+            timings.extend(result['timings'])
+            position = burst['end_sample']
+
+            result.update({
+                'start_time': burst['start_time'],
+                'end_time': burst['end_time'],
+                'bit_count': len(result['bit_string'])
+            })
+            results.append(result)
+
+        if not results:
+            return {'status': 'no_signal', 'modulation': 'FSK', 'bursts': [], 'timings': []}
+
+        longest = max(results, key=lambda b: b['bit_count'])
+        return {
+            'status': 'success',
+            'modulation': 'FSK',
+            'sample_rate': self.sample_rate,
+            'samples': len(stream),
+            'duration': round(stream.duration, 3),
+            'burst_count': len(results),
+            'symbol_rate': float(np.median([b['symbol_rate'] for b in results])),
+            'deviation_hz': float(np.median([b['deviation_hz'] for b in results])),
+            'offset_hz': float(np.median([b['offset_hz'] for b in results])),
+            'bit_string': longest['bit_string'],
+            'timings': timings,
+            'bursts': results
+        }
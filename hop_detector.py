@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Frequency Hopping Detector for PiFlip
+Finds hopping transmitters in a time-frequency occupancy matrix
+
+Pipeline:
+1. Binary occupancy (bin above the local noise floor) for every sweep
+2. Channel set from columns that are ever occupied
+3. Burst tracking per channel with run-length encoding over time
+4. Hop rate, dwell time and revisit period from the burst sequence
+   and channel activity correlation
+"""
+
+import numpy as np
+from signal_detector import SignalDetector
+
+
+class HopDetector:
+    """Estimate hop rate, dwell time and channel set from rapid sweeps"""
+
+    def __init__(self, snr_db=8.0, min_hits=2, min_channels=3, max_duty=0.5):
+        """
+        Args:
+            snr_db: Margin above the noise floor for a bin to count as occupied
+            min_hits: Sweeps a bin must be occupied in to belong to a channel
+            min_channels: Channels needed before a pattern is called hopping
+            max_duty: Channels busier than this are treated as fixed carriers
+        """
+        self.detector = SignalDetector(snr_db=snr_db, merge_gap_bins=0)
+        self.snr_db = snr_db
+        self.min_hits = min_hits
+        self.min_channels = min_channels
+        self.max_duty = max_duty
+
+    def occupancy(self, powers):
+        """Binary occupancy matrix (sweeps x bins)"""
+        powers = np.atleast_2d(np.asarray(powers, dtype=np.float64))
+        return powers > self.detector.noise_floor(powers) + self.snr_db
+
+    def find_channels(self, occupancy):
+        """
+        Group ever-occupied bins into channels
+
+        Returns:
+            (starts, ends) bin index arrays, end exclusive
+        """
+        hits = occupancy.sum(axis=0)
+        active = SignalDetector.close_gaps((hits >= self.min_hits)[np.newaxis, :], 1)
+        runs = SignalDetector.find_runs(active)
+        if runs is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        _, starts, ends = runs
+        return starts, ends
+
+    def channel_activity(self, occupancy, starts, ends):
+        """Reduce bin occupancy to one column per channel (sweeps x channels)"""
+        lengths = ends - starts
+        offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        columns = np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())
+        return np.logical_or.reduceat(occupancy[:, columns], offsets, axis=1)
+
+    def analyze(self, powers, frequencies, timestamps):
+        """
+        Analyze sweep data for frequency hopping
+
+        Args:
+            powers: 2D (sweeps x bins) array of dB values
+            frequencies: Frequency of each bin in MHz
+            timestamps: Time of each sweep in seconds
+
+        Returns:
+            Dict with channel set, hop statistics and a hopping verdict
+        """
+        powers = np.atleast_2d(np.asarray(powers, dtype=np.float64))
+        freqs = np.asarray(frequencies, dtype=np.float64)
+        times = np.asarray(timestamps, dtype=np.float64)
+        num_sweeps = powers.shape[0]
+
+        if num_sweeps < 2 or len(times) != num_sweeps:
+            return {'status': 'error', 'message': 'Need at least 2 sweeps for hop analysis'}
+
+        sweep_interval = float(np.median(np.diff(times)))
+        total_time = float(times[-1] - times[0]) + sweep_interval
+        bin_width = float(np.median(np.diff(freqs))) if len(freqs) > 1 else 0.0
+
+        occupancy = self.occupancy(powers)
+        starts, ends = self.find_channels(occupancy)
+
+        result = {
+            'status': 'success',
+            'hopping': False,
+            'sweeps': num_sweeps,
+            'duration': round(total_time, 3),
+            'sweep_interval_ms': round(sweep_interval * 1000, 2),
+            'channel_count': int(len(starts)),
+            'channels': []
+        }
+
+        if len(starts) == 0:
+            return result
+
+        activity = self.channel_activity(occupancy, starts, ends)
+        centres = freqs[starts] + (ends - starts) * bin_width / 2
+        duty = activity.mean(axis=0)
+
+        # Near-continuous carriers are not part of a hop set
+        fixed = duty >= self.max_duty
+        for i in range(len(starts)):
+            result['channels'].append({
+                'frequency': round(float(centres[i]), 4),
+                'bandwidth': round(float((ends[i] - starts[i]) * bin_width), 4),
+                'duty_cycle': round(float(duty[i]), 3),
+                'type': 'fixed' if fixed[i] else 'hop'
+            })
+
+        hop_channels = np.flatnonzero(~fixed)
+        result['hop_channel_count'] = int(len(hop_channels))
+        if len(hop_channels) == 0:
+            return result
+        activity = activity[:, hop_channels]
+
+        # Bursts: runs of activity along time for each channel
+        runs = SignalDetector.find_runs(activity.T)
+        if runs is None:
+            return result
+        burst_channel, burst_start, burst_end = runs
+        burst_duration = times[burst_end - 1] - times[burst_start] + sweep_interval
+
+        # Hop sequence: bursts ordered by start, a hop is a change of channel
+        order = np.lexsort((burst_channel, burst_start))
+        sequence = burst_channel[order]
+        hop_count = int(np.count_nonzero(sequence[1:] != sequence[:-1]))
+
+        # Correlation: a hopper occupies one channel at a time
+        busy = activity.sum(axis=1)
+        exclusivity = float(np.count_nonzero(busy == 1) / max(1, np.count_nonzero(busy)))
+
+        burst_counts = np.bincount(burst_channel, minlength=len(hop_channels))
+        for i, channel in enumerate(hop_channels):
+            result['channels'][channel]['bursts'] = int(burst_counts[i])
+
+        spacing = np.diff(centres[hop_channels])
+        result.update({
+            'channel_set': [round(float(f), 4) for f in centres[hop_channels]],
+            'bursts': int(len(burst_channel)),
+            'hop_count': hop_count,
+            'hop_rate': round(hop_count / total_time, 3),
+            'dwell_time_ms': round(float(np.median(burst_duration)) * 1000, 2),
+            'channel_spacing_khz': round(float(np.median(spacing)) * 1000, 1) if len(spacing) else None,
+            'exclusivity': round(exclusivity, 3),
+            'revisit_period_s': self._revisit_period(activity, sweep_interval)
+        })
+
+        result['hopping'] = bool(
+            len(hop_channels) >= self.min_channels
+            and hop_count >= self.min_channels
+            and exclusivity >= 0.7
+        )
+
+        return result
+
+    @staticmethod
+    def _revisit_period(activity, sweep_interval):
+        """Dominant channel revisit period from the summed activity autocorrelation"""
+        num_sweeps = activity.shape[0]
+        if num_sweeps < 4:
+            return None
+
+        centred = activity - activity.mean(axis=0)
+        size = 1 << int(np.ceil(np.log2(2 * num_sweeps)))
+        spectrum = np.fft.rfft(centred, n=size, axis=0)
+        autocorr = np.fft.irfft(np.abs(spectrum) ** 2, n=size, axis=0)[:num_sweeps].sum(axis=1)
+        if autocorr[0] <= 0:
+            return None
+        autocorr = autocorr / autocorr[0]
+
+        # Skip the zero-lag lobe, then take the strongest positive peak
+        negative = np.flatnonzero(autocorr < 0)
+        if len(negative) == 0:
+            return None
+        tail = autocorr[negative[0]:num_sweeps // 2]
+        if len(tail) == 0 or tail.max() < 0.2:
+            return None
+        lag = negative[0] + int(np.argmax(tail))
+        return round(float(lag * sweep_interval), 3)
@@ -135,6 +135,10 @@ pip install --upgrade pip
 pip install -r requirements.txt
 echo "✅ Python dependencies installed"
 
+# Precompressed, fingerprinted web UI (rebuilt automatically when the template changes)
+python3 ui_assets.py build
+echo "✅ Web UI built"
+
 echo ""
 echo "⚙️  Setting up systemd service..."
 echo ""
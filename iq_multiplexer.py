@@ -0,0 +1,553 @@
+#!/usr/bin/env python3
+"""
+IQ Multiplexer for PiFlip
+One process owns the RTL-SDR; everything else reads its sample stream
+
+A single `rtl_sdr ... -` feeds a ring buffer in shared memory
+(multiprocessing.shared_memory, so other processes can attach by name).
+Every consumer subscribes with its own read position:
+- recording (/api/capture) writes N samples to a .cu8
+- spectrum averages FFTs of the live stream
+- demodulators take blocks (iq_stream processors keep their state)
+- an rtl_tcp-compatible socket serves external tools (rtl_433, SDR++,
+  GQRX, URH) - rtl_433 -d rtl_tcp:127.0.0.1:1234. Like rtl_tcp it
+  listens on loopback only unless given another bind address
+
+Readers never block the writer: a reader that falls more than one ring
+behind skips ahead and counts the overrun. Retuning restarts the
+acquisition and bumps a generation number, so a recording can tell its
+samples changed frequency underneath it.
+"""
+
+import select
+import socket
+import struct
+import subprocess
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import numpy as np
+import metrics
+from iq_stream import SpectrumAverager, to_complex
+
+RTL_TCP_MAGIC = b'RTL0'
+RTL_TCP_TUNER_R820T = 5
+RTL_TCP_GAIN_COUNT = 29
+
+
+class IQRingBuffer:
+    """Single-writer, many-reader ring of uint8 I/Q bytes in shared memory"""
+
+    def __init__(self, size=1 << 25):
+        self.size = size - size % 2
+        self.shm = shared_memory.SharedMemory(create=True, size=self.size)
+        self.buffer = np.ndarray((self.size,), dtype=np.uint8, buffer=self.shm.buf)
+        self.written = 0
+        self.changed = threading.Condition()
+        self.closed = False
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def write(self, data):
+        """Append bytes (even length); overwrites the oldest data"""
+        data = np.frombuffer(data, dtype=np.uint8)
+        skipped = max(0, len(data) - self.size)
+        data = data[skipped:]
+
+        start = (self.written + skipped) % self.size
+        first = min(len(data), self.size - start)
+        self.buffer[start:start + first] = data[:first]
+        self.buffer[:len(data) - first] = data[first:]
+
+        with self.changed:
+            self.written += skipped + len(data)
+            self.changed.notify_all()
+
+    def read(self, position, max_bytes):
+        """
+        Copy out bytes from `position`
+
+        Returns:
+            (data, new position, bytes dropped because the writer lapped us)
+        """
+        dropped = 0
+        oldest = self.written - self.size
+        if position < oldest:
+            dropped = oldest - position
+            position = oldest
+
+        count = min(max_bytes, self.written - position)
+        count -= count % 2
+        start = position % self.size
+        first = min(count, self.size - start)
+        data = np.concatenate([self.buffer[start:start + first], self.buffer[:count - first]])
+
+        # Overwritten while copying - drop what is no longer valid
+        lost = self.written - self.size - position
+        if lost > 0:
+            lost += lost % 2
+            data = data[lost:]
+            dropped += lost
+            position += lost
+        return data, position + len(data), dropped
+
+    def wait(self, position, timeout):
+        """Block until data past `position` exists (or timeout/close)"""
+        with self.changed:
+            return self.changed.wait_for(lambda: self.written > position or self.closed, timeout)
+
+    def close(self):
+        with self.changed:
+            self.closed = True
+            self.changed.notify_all()
+        del self.buffer
+        self.shm.close()
+        self.shm.unlink()
+
+
+class IQSubscription:
+    """One consumer's cursor into the multiplexer's ring"""
+
+    def __init__(self, mux, name, backlog_samples=0):
+        self.mux = mux
+        self.name = name
+        self.generation = mux.generation
+        self.position = max(0, mux.ring.written - 2 * int(backlog_samples))
+        self.samples_read = 0
+        self.dropped_samples = 0
+        self.overruns = 0
+        self.created = time.time()
+
+    @property
+    def retuned(self):
+        """True once the device was retuned after this subscription started"""
+        return self.mux.generation != self.generation
+
+    @property
+    def lag_samples(self):
+        ring = self.mux.ring
+        return (ring.written - self.position) // 2 if ring is not None else 0
+
+    def read(self, max_samples=1 << 16, timeout=1.0):
+        """
+        Next block of (samples x 2) uint8 I/Q, or None on timeout/stop
+        """
+        # The ring is freed when the multiplexer is closed (e.g. source switch)
+        ring = self.mux.ring
+        if ring is None or not ring.wait(self.position, timeout) or ring.closed:
+            return None
+        data, self.position, dropped = ring.read(self.position, 2 * int(max_samples))
+        if dropped:
+            self.overruns += 1
+            self.dropped_samples += dropped // 2
+        self.samples_read += len(data) // 2
+        return data.reshape(-1, 2)
+
+    def blocks(self, num_samples=None, block_samples=1 << 16, timeout=2.0):
+        """Yield blocks until num_samples were read (or the stream stalls)"""
+        remaining = num_samples
+        while remaining is None or remaining > 0:
+            block = self.read(block_samples if remaining is None else min(block_samples, remaining), timeout)
+            if block is None:
+                return
+            if remaining is not None:
+                remaining -= len(block)
+            yield block
+
+    def info(self):
+        return {
+            'name': self.name,
+            'samples_read': self.samples_read,
+            'lag_samples': self.lag_samples,
+            'overruns': self.overruns,
+            'dropped_samples': self.dropped_samples,
+            'age': round(time.time() - self.created, 1)
+        }
+
+    def close(self):
+        self.mux.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class IQMultiplexer:
+    """Own the RTL-SDR and fan its IQ stream out to concurrent consumers"""
+
+    def __init__(self, frequency=433920000, sample_rate=2048000, gain=40, buffer_seconds=8,
+                 rtl_tcp_port=1234, allow_control=False, source=None, max_backoff=30,
+                 rtl_tcp_host='127.0.0.1'):
+        """
+        Args:
+            frequency: Centre frequency in Hz
+            sample_rate: Sample rate in Hz
+            gain: Tuner gain in dB
+            buffer_seconds: Ring length (how far a slow reader may fall behind)
+            rtl_tcp_port: rtl_tcp-compatible server port (None = no server)
+            allow_control: Let rtl_tcp clients retune the shared device
+            source: Optional callable(frequency, sample_rate, gain, stop_event)
+                    returning an iterable of raw I/Q byte chunks, used
+                    instead of rtl_sdr (e.g. a virtual SDR)
+            max_backoff: Longest wait (s) before restarting a failed rtl_sdr
+            rtl_tcp_host: Address the rtl_tcp server binds ('0.0.0.0' puts the
+                          raw IQ stream on every network the Pi is on)
+        """
+        self.frequency = int(frequency)
+        self.sample_rate = int(sample_rate)
+        self.gain = gain
+        self.buffer_seconds = buffer_seconds
+        self.rtl_tcp_port = rtl_tcp_port
+        self.rtl_tcp_host = rtl_tcp_host
+        self.allow_control = allow_control
+        self.source = source
+        self.max_backoff = max_backoff
+
+        self.ring = None
+        self.generation = 0
+        self.subscriptions = []
+        self.lock = threading.Lock()
+        self.state = 'stopped'
+        self.log = deque(maxlen=50)
+        self.restarts = 0
+        self.started = None
+
+        self.process = None
+        self.thread = None
+        self.stopping = threading.Event()
+        self.retune = threading.Event()
+
+        self.server = None
+        self.server_thread = None
+        self.clients = 0
+
+    # =========================================================================
+    # ACQUISITION
+    # =========================================================================
+
+    def command(self):
+        return ['rtl_sdr', '-f', str(self.frequency), '-s', str(self.sample_rate),
+                '-g', str(self.gain), '-']
+
+    def start(self):
+        """Claim the device and start streaming (idempotent)"""
+        if self.thread and self.thread.is_alive():
+            return self.status()
+
+        if self.ring is None:
+            self.ring = IQRingBuffer(int(self.buffer_seconds * self.sample_rate) * 2)
+        self.stopping.clear()
+        self.state = 'starting'
+        self.started = time.time()
+        self.thread = threading.Thread(target=self._acquire, name='iq-mux', daemon=True)
+        self.thread.start()
+
+        if self.rtl_tcp_port and self.server is None:
+            self._start_server()
+        return self.status()
+
+    def stop(self, close=False):
+        """
+        Release the device; subscriptions stay valid until close=True
+        also frees the ring and the rtl_tcp server
+        """
+        self.stopping.set()
+        self._terminate()
+        if self.thread:
+            self.thread.join(timeout=5)
+        self.thread = None
+        self.state = 'stopped'
+
+        if close:
+            if self.server:
+                self.server.close()
+                self.server = None
+            if self.ring:
+                self.ring.close()
+                self.ring = None
+
+    @contextmanager
+    def released(self):
+        """Let a tool that needs the raw device run, then resume streaming"""
+        was_running = self.thread is not None and self.thread.is_alive()
+        self.stop()
+        if was_running:
+            self.state = 'paused'
+        try:
+            yield
+        finally:
+            if was_running:
+                self.start()
+
+    def tune(self, frequency=None, sample_rate=None, gain=None):
+        """Retune the shared device (restarts acquisition, bumps the generation)"""
+        changed = False
+        for attribute, value in (('frequency', frequency), ('sample_rate', sample_rate), ('gain', gain)):
+            if value is not None and value != getattr(self, attribute):
+                setattr(self, attribute, int(value) if attribute != 'gain' else value)
+                changed = True
+        if changed:
+            self.generation += 1
+            self.log.append(f"Tuned to {self.frequency} Hz @ {self.sample_rate} S/s, gain {self.gain}")
+            if self.thread and self.thread.is_alive():
+                self.retune.set()
+                self._terminate()
+        return changed
+
+    def _terminate(self):
+        process = self.process
+        if process and process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    def _chunks(self):
+        """Raw I/Q byte chunks from the configured source"""
+        if self.source is not None:
+            yield from self.source(self.frequency, self.sample_rate, self.gain, self.stopping)
+            return
+
+        self.process = subprocess.Popen(self.command(), stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE, bufsize=0)
+        threading.Thread(target=self._read_stderr, args=(self.process,), daemon=True).start()
+        while True:
+            chunk = self.process.stdout.read(1 << 16)
+            if not chunk:
+                break
+            yield chunk
+        self.process.wait()
+
+    def _acquire(self):
+        """Stream into the ring, restarting rtl_sdr with backoff until stopped"""
+        backoff = 1
+        while not self.stopping.is_set():
+            self.retune.clear()
+            launched = time.time()
+            carry = b''
+            try:
+                for chunk in self._chunks():
+                    if self.state != 'busy':
+                        self.state = 'running'
+                    if carry:
+                        chunk = carry + chunk
+                    carry = chunk[len(chunk) - len(chunk) % 2:]
+                    self.ring.write(chunk[:len(chunk) - len(chunk) % 2])
+                    if self.stopping.is_set() or self.retune.is_set():
+                        break
+            except FileNotFoundError:
+                self.state = 'error'
+                self.log.append('rtl_sdr not installed')
+                return
+            finally:
+                self._terminate()
+
+            if self.stopping.is_set():
+                break
+            if self.retune.is_set():
+                continue
+            if self.source is not None:
+                # A replayed recording ran out - that is the end of the stream
+                self.state = 'finished'
+                self.log.append('Source ended')
+                break
+
+            self.restarts += 1
+            if self.state != 'busy':
+                self.state = 'restarting'
+            if time.time() - launched > 60:
+                backoff = 1
+            self.log.append(f"Acquisition stopped, restarting in {backoff}s")
+            self.stopping.wait(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def _read_stderr(self, process):
+        for line in process.stderr:
+            line = line.decode(errors='replace').strip()
+            if not line:
+                continue
+            self.log.append(line)
+            if 'usb_claim_interface error' in line:
+                self.state = 'busy'
+
+    # =========================================================================
+    # CONSUMERS
+    # =========================================================================
+
+    def subscribe(self, name, backlog_samples=0):
+        """
+        New reader positioned at the live edge (minus backlog_samples)
+
+        Raises:
+            RuntimeError: If the multiplexer was never started
+        """
+        if self.ring is None:
+            raise RuntimeError('IQ multiplexer is not running')
+        subscription = IQSubscription(self, name, backlog_samples)
+        with self.lock:
+            self.subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            if subscription in self.subscriptions:
+                self.subscriptions.remove(subscription)
+
+    def busy(self, exclude=()):
+        """Consumers that would be disturbed by a retune"""
+        with self.lock:
+            return [s.name for s in self.subscriptions if s.name not in exclude]
+
+    def record(self, path, num_samples, timeout=2.0):
+        """
+        Write the next num_samples of the stream to a .cu8 file
+
+        Returns:
+            Dict with status, samples written and overruns
+        """
+        written = 0
+        with self.subscribe(f"record:{path}") as subscription:
+            with open(path, 'wb') as f:
+                for block in subscription.blocks(num_samples, timeout=timeout):
+                    if subscription.retuned:
+                        return {'status': 'error', 'message': 'Device retuned during recording',
+                                'samples': written}
+                    f.write(block.tobytes())
+                    written += len(block)
+            metrics.library_io(path, 'written', written * 2)
+
+            result = {
+                'status': 'success' if written == num_samples else 'incomplete',
+                'samples': written,
+                'overruns': subscription.overruns,
+                'dropped_samples': subscription.dropped_samples
+            }
+        if written < num_samples:
+            result['message'] = 'IQ stream stalled before the recording finished'
+        return result
+
+    def spectrum(self, fft_size=1024, duration=0.25):
+        """
+        Averaged power spectrum of the live stream around the tuned frequency
+
+        Returns:
+            (frequencies Hz, powers dB) - empty if no samples arrived
+        """
+        averager = SpectrumAverager(fft_size)
+        num_samples = int(duration * self.sample_rate)
+        with self.subscribe('spectrum') as subscription:
+            for block in subscription.blocks(num_samples):
+                averager.process(to_complex(block))
+        return averager.result(self.sample_rate, self.frequency)
+
+    def covers(self, start_hz, end_hz, usable=0.8):
+        """True if [start_hz, end_hz] lies inside the tuned band"""
+        half = self.sample_rate * usable / 2
+        return self.frequency - half <= start_hz and end_hz <= self.frequency + half
+
+    # =========================================================================
+    # RTL_TCP SERVER
+    # =========================================================================
+
+    @property
+    def rtl_tcp_address(self):
+        """rtl_433 -d value for the server (loopback when it listens on every interface)"""
+        if not self.server:
+            return None
+        host = '127.0.0.1' if self.rtl_tcp_host in ('', '0.0.0.0') else self.rtl_tcp_host
+        return f"rtl_tcp:{host}:{self.rtl_tcp_port}"
+
+    def _start_server(self):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((self.rtl_tcp_host, self.rtl_tcp_port))
+        self.server.listen(4)
+        self.server_thread = threading.Thread(target=self._serve, name='iq-rtl_tcp', daemon=True)
+        self.server_thread.start()
+
+    def _serve(self):
+        server = self.server
+        while self.server is server:
+            try:
+                conn, addr = server.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._client, args=(conn, addr), daemon=True).start()
+
+    def _client(self, conn, addr):
+        """Stream to one rtl_tcp client and handle its 5-byte commands"""
+        peer = f"{addr[0]}:{addr[1]}"
+        self.clients += 1
+        self.log.append(f"rtl_tcp client connected: {peer}")
+        pending = b''
+        try:
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn.sendall(RTL_TCP_MAGIC + struct.pack('>II', RTL_TCP_TUNER_R820T, RTL_TCP_GAIN_COUNT))
+            with self.subscribe(f"rtl_tcp:{peer}") as subscription:
+                while self.ring is not None and not self.ring.closed:
+                    readable, _, _ = select.select([conn], [], [], 0)
+                    if readable:
+                        data = conn.recv(64)
+                        if not data:
+                            break
+                        pending += data
+                        while len(pending) >= 5:
+                            self._client_command(*struct.unpack('>BI', pending[:5]))
+                            pending = pending[5:]
+
+                    block = subscription.read(1 << 15, timeout=0.5)
+                    if block is not None and len(block):
+                        conn.sendall(block.tobytes())
+        except OSError:
+            pass
+        finally:
+            conn.close()
+            self.clients -= 1
+            self.log.append(f"rtl_tcp client disconnected: {peer}")
+
+    def _client_command(self, command, param):
+        if not self.allow_control:
+            return
+        if command == 0x01:
+            self.tune(frequency=param)
+        elif command == 0x02:
+            self.tune(sample_rate=param)
+        elif command == 0x04:
+            self.tune(gain=param / 10)
+
+    # =========================================================================
+    # STATUS
+    # =========================================================================
+
+    def status(self):
+        running = self.thread is not None and self.thread.is_alive()
+        with self.lock:
+            consumers = [s.info() for s in self.subscriptions]
+        return {
+            'state': self.state,
+            'running': running,
+            'frequency': self.frequency,
+            'sample_rate': self.sample_rate,
+            'gain': self.gain,
+            'generation': self.generation,
+            'uptime': round(time.time() - self.started, 1) if running and self.started else 0,
+            'samples_streamed': self.ring.written // 2 if self.ring else 0,
+            'buffer_seconds': round(self.ring.size / 2 / self.sample_rate, 2) if self.ring else 0,
+            'shared_memory': self.ring.name if self.ring else None,
+            'rtl_tcp': self.rtl_tcp_address,
+            'rtl_tcp_clients': self.clients,
+            'allow_control': self.allow_control,
+            'restarts': self.restarts,
+            'source': self.source.status() if hasattr(self.source, 'status') else (
+                'rtl_sdr' if self.source is None else 'custom'),
+            'consumers': consumers,
+            'log': list(self.log)[-5:]
+        }
@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+"""
+Chunked IQ Streaming for PiFlip
+Constant-memory processing of arbitrarily long RTL-SDR .cu8 captures
+
+A capture is memory-mapped and walked in fixed-size, zero-copy blocks.
+Every processor below keeps its own state (filter history, partial
+decimation groups, open bursts, hysteresis level) across block
+boundaries, so a block-by-block run gives the same answer as processing
+the whole file at once - without ever holding the whole file in RAM.
+"""
+
+from collections import deque
+
+import numpy as np
+import metrics
+
+
+def magnitude_lut():
+    """256x256 table of |I + jQ| for unsigned 8-bit samples centred on 127.5"""
+    levels = np.arange(256, dtype=np.float32) - 127.5
+    return np.sqrt(levels[:, np.newaxis] ** 2 + levels[np.newaxis, :] ** 2).astype(np.float32)
+
+
+MAGNITUDE_LUT = magnitude_lut()
+
+
+def to_complex(block):
+    """Convert (samples x 2) uint8 I/Q pairs to complex64 in [-1, 1]"""
+    return ((block.astype(np.float32) - 127.5) / 127.5).view(np.complex64).ravel()
+
+
+def schmitt_trigger(values, low, high, state=0):
+    """
+    Two-threshold slicer: 1 above `high`, 0 below `low`, otherwise the
+    previous decision (starting from `state`). Thresholds broadcast
+    against `values`.
+
+    Returns:
+        uint8 array of 0/1 states, flattened
+    """
+    events = np.full(np.shape(values), -1, dtype=np.int8)
+    events[values < low] = 0
+    events[values > high] = 1
+    events = np.concatenate([[state], events.ravel()])
+
+    decided = np.where(events >= 0, np.arange(len(events)), 0)
+    np.maximum.accumulate(decided, out=decided)
+    return events[decided][1:].astype(np.uint8)
+
+
+def run_lengths(states):
+    """(levels, lengths) of the runs in a 0/1 array"""
+    if len(states) == 0:
+        return np.empty(0, dtype=np.uint8), np.empty(0, dtype=np.int64)
+    change = np.flatnonzero(np.diff(states)) + 1
+    starts = np.concatenate([[0], change])
+    return states[starts], np.diff(np.concatenate([starts, [len(states)]]))
+
+
+# =============================================================================
+# STATEFUL BLOCK PROCESSORS
+# =============================================================================
+
+class BoxcarDecimator:
+    """Moving-average low-pass + decimation; partial groups carry over"""
+
+    def __init__(self, factor):
+        self.factor = max(1, int(factor))
+        self.carry = None
+
+    def process(self, samples):
+        if self.carry is not None and len(self.carry):
+            samples = np.concatenate([self.carry, samples])
+        usable = len(samples) - len(samples) % self.factor
+        self.carry = samples[usable:].copy()
+        return samples[:usable].reshape(-1, self.factor).mean(axis=1)
+
+
+class FIRFilter:
+    """FIR filter (overlap-save); the last len(taps)-1 inputs carry over"""
+
+    def __init__(self, taps):
+        self.taps = np.asarray(taps)
+        self.history = None
+
+    def process(self, samples):
+        if self.history is None:
+            self.history = np.zeros(len(self.taps) - 1, dtype=np.result_type(samples, self.taps))
+        padded = np.concatenate([self.history, samples])
+        if len(self.taps) > 1:
+            self.history = padded[len(padded) - (len(self.taps) - 1):].copy()
+        return np.convolve(padded, self.taps, mode='valid')
+
+
+class Mixer:
+    """Shift a complex stream by -freq_hz; the oscillator phase carries over"""
+
+    def __init__(self, freq_hz, sample_rate):
+        self.step = -2 * np.pi * freq_hz / sample_rate
+        self.position = 0
+
+    def process(self, samples):
+        phase = self.step * (self.position + np.arange(len(samples)))
+        self.position += len(samples)
+        return (samples * np.exp(1j * phase)).astype(np.complex64)
+
+
+class FrequencyDiscriminator:
+    """
+    Instantaneous frequency from the conjugate-product phase difference
+
+    angle(x[n] * conj(x[n-1])) is the phase step per sample; the last
+    sample of each block carries over so no step is lost at boundaries.
+    """
+
+    def __init__(self, sample_rate):
+        self.scale = sample_rate / (2 * np.pi)
+        self.last = None
+
+    def process(self, samples):
+        """Returns the frequency offset in Hz of every input sample"""
+        if len(samples) == 0:
+            return np.empty(0, dtype=np.float32)
+        previous = np.concatenate([[samples[0] if self.last is None else self.last], samples[:-1]])
+        self.last = samples[-1]
+        return (np.angle(samples * np.conj(previous)) * self.scale).astype(np.float32)
+
+
+class HysteresisSlicer:
+    """
+    Adaptive Schmitt-trigger slicer for an amplitude envelope
+
+    The envelope is cut into threshold blocks, each with its own noise
+    (20th percentile) and peak (99th percentile) level. A block's peak is
+    spread over its neighbours so a long gap inside a transmission keeps
+    the transmission's threshold - which needs one block of lookahead, so
+    output lags input by one threshold block until flush(). Blocks without
+    enough SNR above the running noise floor are forced low.
+    """
+
+    def __init__(self, block_len, min_snr_db=6.0, history=256):
+        self.block_len = max(16, int(block_len))
+        self.min_snr_db = min_snr_db
+        self.noise_history = deque(maxlen=history)
+        self.buffer = np.empty(0, dtype=np.float32)
+        self.held = None
+        self.held_peak = None
+        self.prev_peak = None
+        self.state = 0
+
+    def process(self, env):
+        """Feed envelope samples; returns the 0/1 states decided so far"""
+        env = np.concatenate([self.buffer, env])
+        num_blocks = len(env) // self.block_len
+        self.buffer = env[num_blocks * self.block_len:].copy()
+        if num_blocks == 0:
+            return np.empty(0, dtype=np.uint8)
+
+        rows = env[:num_blocks * self.block_len].reshape(num_blocks, self.block_len)
+        noise = np.percentile(rows, 20, axis=1)
+        peak = np.percentile(rows, 99, axis=1)
+        self.noise_history.extend(noise.tolist())
+
+        if self.held is not None:
+            rows = np.vstack([self.held, rows])
+            peak = np.concatenate([[self.held_peak], peak])
+
+        # Every row but the newest has its right-hand neighbour now
+        self.held, self.held_peak = rows[-1].copy(), float(peak[-1])
+        if len(rows) == 1:
+            return np.empty(0, dtype=np.uint8)
+
+        left = np.concatenate([[self.prev_peak if self.prev_peak is not None else peak[0]], peak[:-2]])
+        spread = np.maximum(peak[:-1], np.maximum(left, peak[1:]))
+        self.prev_peak = float(peak[-2])
+        return self._slice(rows[:-1], spread)
+
+    def flush(self):
+        """Slice everything still held back"""
+        rows = []
+        peaks = []
+        if self.held is not None:
+            rows.append(self.held)
+            peaks.append(max(self.held_peak, self.prev_peak if self.prev_peak is not None else -np.inf))
+        if len(self.buffer):
+            self.noise_history.append(float(np.percentile(self.buffer, 20)))
+            rows.append(self.buffer)
+            peaks.append(float(np.percentile(self.buffer, 99)))
+
+        states = [self._slice(row[np.newaxis, :], np.array([peak])) for row, peak in zip(rows, peaks)]
+        self.held = self.held_peak = self.prev_peak = None
+        self.buffer = np.empty(0, dtype=np.float32)
+        return np.concatenate(states) if states else np.empty(0, dtype=np.uint8)
+
+    def _slice(self, rows, peak):
+        noise_floor = float(np.median(self.noise_history)) if self.noise_history else 0.0
+        snr_db = 20 * np.log10(np.maximum(peak, 1e-6) / max(noise_floor, 1e-6))
+        has_signal = snr_db >= self.min_snr_db
+
+        # Schmitt trigger at 40% / 60% of the noise-to-peak swing
+        swing = peak - noise_floor
+        high = np.where(has_signal, noise_floor + swing * 0.6, np.inf)[:, np.newaxis]
+        low = np.where(has_signal, noise_floor + swing * 0.4, np.inf)[:, np.newaxis]
+
+        states = schmitt_trigger(rows, low, high, self.state)
+        if len(states):
+            self.state = int(states[-1])
+        return states
+
+
+class RunLengthEncoder:
+    """Run-length encode a 0/1 stream; the open run carries over"""
+
+    def __init__(self):
+        self.level = None
+        self.length = 0
+
+    def process(self, states):
+        """Returns (levels, lengths) of the runs completed by this block"""
+        if len(states) == 0:
+            return np.empty(0, dtype=np.uint8), np.empty(0, dtype=np.int64)
+
+        levels, lengths = run_lengths(states)
+
+        # Join the open run from the previous block
+        if self.level is not None:
+            if levels[0] == self.level:
+                lengths[0] += self.length
+            else:
+                levels = np.concatenate([[self.level], levels])
+                lengths = np.concatenate([[self.length], lengths])
+
+        self.level, self.length = levels[-1], int(lengths[-1])
+        return levels[:-1], lengths[:-1]
+
+    def flush(self):
+        if self.level is None:
+            return np.empty(0, dtype=np.uint8), np.empty(0, dtype=np.int64)
+        levels, lengths = np.array([self.level]), np.array([self.length])
+        self.level, self.length = None, 0
+        return levels, lengths
+
+
+class SpectrumAverager:
+    """Averaged power spectrum (Welch, no overlap); leftover samples carry over"""
+
+    def __init__(self, fft_size=1024):
+        self.fft_size = fft_size
+        self.window = np.hanning(fft_size).astype(np.float32)
+        self.carry = np.empty(0, dtype=np.complex64)
+        self.power_sum = np.zeros(fft_size)
+        self.frames = 0
+
+    def process(self, samples):
+        samples = np.concatenate([self.carry, samples])
+        num_frames = len(samples) // self.fft_size
+        self.carry = samples[num_frames * self.fft_size:].copy()
+        if num_frames:
+            frames = samples[:num_frames * self.fft_size].reshape(num_frames, self.fft_size)
+            spectra = np.fft.fft(frames * self.window, axis=1)
+            self.power_sum += (np.abs(spectra) ** 2).sum(axis=0)
+            self.frames += num_frames
+
+    def result(self, sample_rate, center_freq=0.0):
+        """(frequencies_hz, powers_db) in ascending frequency"""
+        if self.frames == 0:
+            return np.empty(0), np.empty(0)
+        power = np.fft.fftshift(self.power_sum / self.frames) / (self.window ** 2).sum()
+        freqs = center_freq + np.fft.fftshift(np.fft.fftfreq(self.fft_size, 1 / sample_rate))
+        return freqs, 10 * np.log10(np.maximum(power, 1e-20))
+
+
+class BurstTracker:
+    """
+    Energy burst detection on an envelope stream
+
+    A burst is a stretch of samples above the noise threshold; gaps shorter
+    than `max_gap` samples do not end it. A burst still open at the end of
+    a block carries over into the next.
+    """
+
+    def __init__(self, snr_db=10.0, max_gap=1, history=256, block_len=4096):
+        self.ratio = 10 ** (snr_db / 20)
+        self.max_gap = max(1, int(max_gap))
+        self.block_len = block_len
+        self.noise_history = deque(maxlen=history)
+        self.position = 0
+        self.open = None
+
+    def threshold(self):
+        return float(np.median(self.noise_history)) * self.ratio
+
+    def process(self, env):
+        """
+        Returns completed bursts as a list of (start, end, peak) with sample
+        positions in envelope samples since the first block (end exclusive)
+        """
+        offset = self.position
+        self.position += len(env)
+        if len(env) == 0:
+            return []
+
+        usable = len(env) - len(env) % self.block_len
+        if usable:
+            rows = env[:usable].reshape(-1, self.block_len)
+            self.noise_history.extend(np.percentile(rows, 20, axis=1).tolist())
+        elif not self.noise_history:
+            self.noise_history.append(float(np.percentile(env, 20)))
+
+        hot = np.flatnonzero(env > self.threshold())
+        bursts = []
+
+        if len(hot) == 0:
+            if self.open is not None and self.position - self.open[1] > self.max_gap:
+                bursts.append(tuple(self.open))
+                self.open = None
+            return bursts
+
+        # Split the above-threshold samples wherever the gap is too long
+        breaks = np.flatnonzero(np.diff(hot) > self.max_gap) + 1
+        group_start = np.concatenate([[0], breaks])
+        starts = hot[group_start] + offset
+        ends = hot[np.concatenate([breaks - 1, [len(hot) - 1]])] + offset + 1
+        peaks = np.maximum.reduceat(env[hot], group_start)
+
+        starts, ends, peaks = starts.tolist(), ends.tolist(), peaks.tolist()
+
+        if self.open is not None:
+            if starts[0] - self.open[1] <= self.max_gap:
+                starts[0] = self.open[0]
+                peaks[0] = max(peaks[0], self.open[2])
+            else:
+                bursts.append(tuple(self.open))
+
+        bursts.extend(zip(starts[:-1], ends[:-1], peaks[:-1]))
+        self.open = [starts[-1], ends[-1], peaks[-1]]
+        if self.position - ends[-1] > self.max_gap:
+            bursts.append(tuple(self.open))
+            self.open = None
+        return bursts
+
+    def flush(self):
+        bursts = [tuple(self.open)] if self.open is not None else []
+        self.open = None
+        return bursts
+
+
+# =============================================================================
+# CAPTURE STREAM
+# =============================================================================
+
+class IQStream:
+    """Block-wise access to a memory-mapped .cu8 capture"""
+
+    def __init__(self, capture_file, sample_rate=2048000, block_samples=1 << 18):
+        """
+        Args:
+            capture_file: Path to the .cu8 file (interleaved uint8 I/Q), or
+                          an in-memory uint8 array of the same layout
+            sample_rate: Capture sample rate in Hz
+            block_samples: IQ samples per block (bounds working memory)
+        """
+        self.sample_rate = sample_rate
+        self.block_samples = int(block_samples)
+        if isinstance(capture_file, np.ndarray):
+            self.capture_file = None
+            raw = capture_file.reshape(-1)
+        else:
+            self.capture_file = str(capture_file)
+            raw = np.memmap(self.capture_file, dtype=np.uint8, mode='r')
+            metrics.library_io(self.capture_file, 'read', len(raw))
+        usable = len(raw) - len(raw) % 2
+        self.iq = raw[:usable].reshape(-1, 2)
+
+    def __len__(self):
+        return len(self.iq)
+
+    @property
+    def duration(self):
+        return len(self) / self.sample_rate
+
+    def blocks(self, start=0, stop=None):
+        """Yield (offset, block) zero-copy views of (samples x 2) uint8 I/Q"""
+        stop = len(self.iq) if stop is None else min(stop, len(self.iq))
+        for offset in range(start, stop, self.block_samples):
+            yield offset, self.iq[offset:min(offset + self.block_samples, stop)]
+
+    def complex_blocks(self, start=0, stop=None):
+        """Yield (offset, complex64 block)"""
+        for offset, block in self.blocks(start, stop):
+            yield offset, to_complex(block)
+
+    def envelope_blocks(self, decimation=8):
+        """
+        Yield (offset, envelope) blocks: LUT magnitude, boxcar low-passed and
+        decimated. Offsets are in envelope samples.
+        """
+        decimator = BoxcarDecimator(decimation)
+        position = 0
+        for _, block in self.blocks():
+            env = decimator.process(MAGNITUDE_LUT[block[:, 0], block[:, 1]])
+            if len(env):
+                yield position, env
+                position += len(env)
+
+    def spectrum(self, fft_size=1024, center_freq=0.0):
+        """Averaged power spectrum of the whole capture"""
+        averager = SpectrumAverager(fft_size)
+        for _, samples in self.complex_blocks():
+            averager.process(samples)
+        freqs, powers = averager.result(self.sample_rate, center_freq)
+        return {
+            'frequencies': freqs,
+            'powers': powers,
+            'frames': averager.frames
+        }
+
+    def bursts(self, decimation=8, snr_db=10.0, max_gap_us=5000):
+        """
+        Yield energy bursts as they complete
+
+        Yields:
+            Dicts with start/end sample (IQ samples, end exclusive),
+            start/end time in seconds and peak envelope level
+        """
+        env_rate = self.sample_rate / decimation
+        tracker = BurstTracker(
+            snr_db=snr_db,
+            max_gap=max_gap_us * env_rate / 1e6,
+            block_len=max(64, int(env_rate * 0.02))
+        )
+
+        def describe(burst):
+            start, end, peak = burst
+            return {
+                'start_sample': int(start * decimation),
+                'end_sample': int(min(end * decimation, len(self))),
+                'start_time': round(start / env_rate, 6),
+                'end_time': round(end / env_rate, 6),
+                'peak': round(float(peak), 2)
+            }
+
+        for _, env in self.envelope_blocks(decimation):
+            for burst in tracker.process(env):
+                yield describe(burst)
+        for burst in tracker.flush():
+            yield describe(burst)
+
+
+def open_stream(source, sample_rate=2048000, block_samples=1 << 18):
+    """IQStream for a .cu8 path or uint8 I/Q array; an IQStream (e.g. a packed capture) is used as is"""
+    if isinstance(source, IQStream):
+        return source
+    return IQStream(source, sample_rate, block_samples)
@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Job Manager for PiFlip
+Asynchronous jobs for long-running routes and capture analysis
+
+Bluetooth scans, wallet tests, waterfalls, frequency sweeps, playlists
+and capture analysis take seconds to minutes. Run inline, each one holds
+a Flask worker thread for that long. Run as jobs:
+
+- submit() returns a job ID at once; the handler runs on its own thread
+- handlers report progress(stage, percent), streamed to clients over SSE
+- every job is a JSON file under ~/piflip/jobs/tasks (result included),
+  rewritten atomically on each change
+- cancel() takes effect at the handler's next progress point (queued
+  jobs are dropped immediately); subprocesses started through
+  JobContext.run() are terminated straight away
+- each job kind names the device it needs; a per-device limit (1 for
+  radios) queues jobs instead of letting two fight over the hardware,
+  and an optional `hold` (e.g. DeviceManager.use) is entered around the
+  handler so jobs also wait for - and block - synchronous users of it
+
+Hardware jobs are not re-run after a restart: a scan or a transmission
+belongs to the moment it was requested, so unfinished jobs are marked
+'interrupted'. Kinds registered with resume=True (capture analysis) are
+put back on the queue instead, so nothing submitted is lost.
+"""
+
+import json
+import os
+import subprocess
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+from pathlib import Path
+
+# 'cpu' is for jobs that only compute (analysis) - one at a time on a Pi
+DEFAULT_LIMITS = {'rtl-sdr': 1, 'cc1101': 1, 'pn532': 1, 'bluetooth': 1, 'cpu': 1}
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler once its job has been cancelled"""
+
+
+class JobContext:
+    """Handed to job handlers: progress reporting and cancellation"""
+
+    def __init__(self, manager, job):
+        self.manager = manager
+        self.job = job
+        self.process = None
+
+    @property
+    def cancelled(self):
+        return self.job.get('cancel_requested', False)
+
+    def check(self):
+        """Raise JobCancelled if the job was cancelled"""
+        if self.cancelled:
+            raise JobCancelled()
+
+    def progress(self, stage, percent=None, **data):
+        """
+        Report progress (also a cancellation point)
+
+        Args:
+            stage: Human-readable description of the current step
+            percent: 0-100, or None to leave unchanged
+            data: Partial results to publish with the job
+        """
+        self.check()
+        fields = {'stage': stage}
+        if percent is not None:
+            fields['progress'] = int(percent)
+        if data:
+            fields['partial'] = data
+        self.manager._update(self.job, **fields)
+
+    def sleep(self, seconds):
+        """Sleep that wakes up (and raises) on cancellation"""
+        deadline = time.time() + seconds
+        while time.time() < deadline:
+            self.check()
+            time.sleep(min(0.2, max(0, deadline - time.time())))
+        self.check()
+
+    def run(self, cmd, timeout=None, **kwargs):
+        """subprocess.run() that cancel() can terminate"""
+        self.check()
+        self.process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                        text=True, **kwargs)
+        try:
+            stdout, stderr = self.process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            stdout, stderr = self.process.communicate()
+            raise
+        finally:
+            returncode = self.process.returncode
+            self.process = None
+        self.check()
+        return subprocess.CompletedProcess(cmd, returncode, stdout, stderr)
+
+
+class JobManager:
+    """Run registered job kinds on background threads with per-device limits"""
+
+    ACTIVE = ('queued', 'running')
+
+    def __init__(self, jobs_dir="~/piflip/jobs/tasks", limits=None, keep_finished=200, hold=None):
+        """
+        Args:
+            jobs_dir: Directory holding one JSON file per job
+            limits: Concurrent jobs allowed per device (default 1 per radio)
+            keep_finished: Finished jobs kept on disk before the oldest are pruned
+            hold: Optional hold(device) -> context manager held while a job
+                  runs on that device
+        """
+        self.jobs_dir = Path(os.path.expanduser(jobs_dir))
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self.limits = dict(DEFAULT_LIMITS)
+        self.limits.update(limits or {})
+        self.keep_finished = keep_finished
+        self.hold = hold
+
+        self.kinds = {}
+        self.jobs = {}
+        self.contexts = {}
+        self.unfinished = []
+        self.slots = {device: threading.Semaphore(limit) for device, limit in self.limits.items()}
+        self.changed = threading.Condition()
+        self._load()
+
+    # =========================================================================
+    # PERSISTENCE
+    # =========================================================================
+
+    def _load(self):
+        """Load jobs; unfinished ones wait for their kind to be registered"""
+        for job_file in self.jobs_dir.glob("*.json"):
+            try:
+                with open(job_file, 'r') as f:
+                    job = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                continue
+            self.jobs[job['id']] = job
+            if job['status'] in self.ACTIVE:
+                self.unfinished.append(job)
+        self.unfinished.sort(key=lambda j: j['created'])
+
+    def _recover(self, kind, resume):
+        """Re-queue (resume) or interrupt a kind's jobs left unfinished by the last run"""
+        jobs = [job for job in self.unfinished if job['kind'] == kind]
+        self.unfinished = [job for job in self.unfinished if job['kind'] != kind]
+        for job in jobs:
+            if resume:
+                job.update(status='queued', stage='Re-queued after restart', progress=0, started=None)
+                self._save(job)
+                self._start(job)
+            else:
+                job.update(status='interrupted', stage='Interrupted by restart', finished=time.time())
+                self._save(job)
+
+        if jobs and resume:
+            print(f"[*] Resuming {len(jobs)} queued {kind} job(s)")
+        elif jobs:
+            print(f"[!] {len(jobs)} {kind} job(s) interrupted by the last restart")
+
+    def _save(self, job):
+        """Write a job file atomically"""
+        job_file = self.jobs_dir / f"{job['id']}.json"
+        tmp_file = job_file.with_suffix('.tmp')
+        with open(tmp_file, 'w') as f:
+            json.dump(job, f, indent=2, default=str)
+        os.replace(tmp_file, job_file)
+
+    def _prune(self):
+        """Drop the oldest finished jobs beyond keep_finished"""
+        finished = sorted(
+            (job for job in self.jobs.values() if job['status'] not in self.ACTIVE),
+            key=lambda j: j['created']
+        )
+        for job in finished[:max(0, len(finished) - self.keep_finished)]:
+            self.jobs.pop(job['id'], None)
+            try:
+                (self.jobs_dir / f"{job['id']}.json").unlink()
+            except FileNotFoundError:
+                pass
+
+    # =========================================================================
+    # JOBS
+    # =========================================================================
+
+    def register(self, kind, handler, device=None, description='', resume=False):
+        """
+        Register a job kind
+
+        Args:
+            kind: Name clients submit
+            handler: handler(params, context) -> result dict
+            device: Device the job occupies (limited by `limits`), or None
+            description: Shown in the list of kinds
+            resume: Re-queue jobs a restart cut short (otherwise 'interrupted')
+        """
+        self.kinds[kind] = {'handler': handler, 'device': device, 'description': description,
+                            'resume': resume}
+        if device and device not in self.slots:
+            self.limits.setdefault(device, 1)
+            self.slots[device] = threading.Semaphore(self.limits[device])
+        self._recover(kind, resume)
+
+    def list_kinds(self):
+        return [{'kind': kind, 'device': spec['device'], 'description': spec['description'],
+                 'resume': spec['resume']}
+                for kind, spec in sorted(self.kinds.items())]
+
+    def submit(self, kind, params=None):
+        """
+        Start a job
+
+        Returns:
+            The new job dict (status 'queued')
+
+        Raises:
+            KeyError: If the kind is not registered
+        """
+        spec = self.kinds[kind]
+        job = {
+            'id': uuid.uuid4().hex[:12],
+            'kind': kind,
+            'device': spec['device'],
+            'params': params or {},
+            'status': 'queued',
+            'stage': 'Queued',
+            'progress': 0,
+            'created': time.time(),
+            'started': None,
+            'finished': None,
+            'result': None,
+            'error': None
+        }
+        with self.changed:
+            self.jobs[job['id']] = job
+            self._save(job)
+            self._prune()
+            self.changed.notify_all()
+
+        self._start(job)
+        return dict(job)
+
+    def get(self, job_id):
+        """Snapshot of one job, or None"""
+        with self.changed:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list_jobs(self, limit=50, kind=None, status=None, params=None):
+        """Most recent jobs first (params: only jobs submitted with these values)"""
+        with self.changed:
+            jobs = [dict(job) for job in self.jobs.values()
+                    if (kind is None or job['kind'] == kind)
+                    and (status is None or job['status'] == status)
+                    and all(job['params'].get(key) == value for key, value in (params or {}).items())]
+        jobs.sort(key=lambda j: j['created'], reverse=True)
+        return jobs[:limit]
+
+    def queue_position(self, job_id):
+        """Queued jobs for the same device ahead of this one"""
+        with self.changed:
+            job = self.jobs.get(job_id)
+            if not job or job['status'] != 'queued' or not job['device']:
+                return 0
+            return sum(1 for other in self.jobs.values()
+                       if other['status'] == 'queued' and other['device'] == job['device']
+                       and other['created'] < job['created'])
+
+    def device_busy(self, device):
+        """Kind of the job running on a device, or None"""
+        with self.changed:
+            for job in self.jobs.values():
+                if job['status'] == 'running' and job['device'] == device:
+                    return f"job {job['id']} ({job['kind']})"
+        return None
+
+    def cancel(self, job_id):
+        """
+        Request cancellation
+
+        Returns:
+            The job snapshot, or None if it does not exist
+        """
+        with self.changed:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if job['status'] in self.ACTIVE:
+                job['cancel_requested'] = True
+                if job['status'] == 'queued':
+                    job.update(status='cancelled', stage='Cancelled', finished=time.time())
+                self._save(job)
+                self.changed.notify_all()
+
+            context = self.contexts.get(job_id)
+            if context is not None and context.process is not None:
+                context.process.terminate()
+            return dict(job)
+
+    def wait(self, job_id, last=None, timeout=15):
+        """
+        Block until a job differs from `last` (or timeout)
+
+        Returns:
+            Latest job snapshot, or None if the job does not exist
+        """
+        deadline = time.time() + timeout
+        with self.changed:
+            while True:
+                job = self.jobs.get(job_id)
+                if job is None or job != last:
+                    return dict(job) if job else None
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return dict(job)
+                self.changed.wait(remaining)
+
+    def run(self, kind, params=None, timeout=None):
+        """Submit a job and block until it finishes (for synchronous callers)"""
+        job = self.submit(kind, params)
+        deadline = None if timeout is None else time.time() + timeout
+        while job['status'] in self.ACTIVE:
+            if deadline is not None and time.time() > deadline:
+                break
+            job = self.wait(job['id'], job)
+        return job
+
+    def _update(self, job, **fields):
+        with self.changed:
+            job.update(fields)
+            self._save(job)
+            self.changed.notify_all()
+
+    def _start(self, job):
+        threading.Thread(target=self._run, args=(job,), name=f"job-{job['kind']}", daemon=True).start()
+
+    def _run(self, job):
+        spec = self.kinds[job['kind']]
+        slot = self.slots.get(spec['device'])
+
+        # Wait for the device, giving up if cancelled meanwhile
+        if slot is not None:
+            while not slot.acquire(timeout=0.5):
+                if job.get('cancel_requested'):
+                    return
+            if job.get('cancel_requested'):
+                slot.release()
+                return
+
+        context = JobContext(self, job)
+        self.contexts[job['id']] = context
+        hold = self.hold(spec['device']) if self.hold and spec['device'] else nullcontext()
+        try:
+            with hold:
+                context.check()  # cancelled while a synchronous user held the device
+                self._update(job, status='running', stage='Starting', started=time.time())
+                result = spec['handler'](job['params'], context)
+            if job.get('cancel_requested'):
+                # The handler swallowed JobCancelled (or finished as it arrived)
+                raise JobCancelled()
+            failed = isinstance(result, dict) and (result.get('status') == 'error' or bool(result.get('error')))
+            self._update(
+                job,
+                status='failed' if failed else 'completed',
+                stage='Failed' if failed else 'Completed',
+                progress=100,
+                finished=time.time(),
+                result=result,
+                error=result.get('error') or result.get('message') if failed else None
+            )
+        except JobCancelled:
+            self._update(job, status='cancelled', stage='Cancelled', finished=time.time())
+        except Exception as e:
+            if job.get('cancel_requested'):
+                self._update(job, status='cancelled', stage='Cancelled', finished=time.time())
+            else:
+                self._update(job, status='failed', stage='Failed', finished=time.time(), error=str(e))
+        finally:
+            self.contexts.pop(job['id'], None)
+            if slot is not None:
+                slot.release()
@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+"""
+Metrics for PiFlip
+Route latency histograms and hardware-operation counters in Prometheus text
+
+Collects, in process and without any background work:
+
+- per-route request latency and response size histograms (Flask hooks)
+- SPI transfers (CC1101): count, duration and bytes, by operation
+- PN532 I2C reads/writes: count, duration and bytes, plus commands sent
+- subprocess spawns: count, spawn time and run time, by program
+- bytes and files read and written under the ~/piflip libraries
+  (rf_library, nfc_library, captures, ...), by library, counted at
+  their save/load points via library_io()
+- named stages timed with metrics.stage('...')
+
+Hardware and subprocess hooks wrap the library entry points
+(spidev.SpiDev, PN532_I2C._read_data/_write_data, subprocess.Popen)
+once at install time; builtins.open is left alone. Nothing runs while nothing happens, so an
+idle PiFlip pays nothing. Export with render() (GET /api/metrics).
+"""
+
+import bisect
+import os
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1, 1.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for labels, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.series = {}           # labels -> [bucket counts..., +Inf count, sum]
+        self.lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            items = sorted((labels, list(series)) for labels, series in self.series.items())
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series[:-1]):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, labels)} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.labels, labels)} {cumulative}")
+        return lines
+
+
+# =============================================================================
+# METRICS
+# =============================================================================
+
+http_seconds = Histogram('piflip_http_request_duration_seconds',
+                         'Request latency (time to first byte for streams)', ('method', 'route'))
+http_bytes = Histogram('piflip_http_response_bytes', 'Response body size', ('method', 'route'), SIZE_BUCKETS)
+http_requests = Counter('piflip_http_requests_total', 'Requests by route and status',
+                        ('method', 'route', 'status'))
+
+spi_seconds = Histogram('piflip_spi_transfer_seconds', 'SPI transfer duration', ('op',), FAST_BUCKETS)
+spi_bytes = Counter('piflip_spi_bytes_total', 'Bytes moved over SPI', ('op',))
+
+i2c_seconds = Histogram('piflip_i2c_transfer_seconds', 'PN532 I2C transfer duration', ('op',), FAST_BUCKETS)
+i2c_bytes = Counter('piflip_i2c_bytes_total', 'Bytes moved over I2C to/from the PN532', ('op',))
+pn532_commands = Counter('piflip_pn532_commands_total', 'PN532 commands sent', ('command',))
+
+subprocess_spawn_seconds = Histogram('piflip_subprocess_spawn_seconds', 'Time to fork/exec a subprocess',
+                                     ('program',), FAST_BUCKETS)
+subprocess_seconds = Histogram('piflip_subprocess_duration_seconds', 'Subprocess run time (spawn to exit)',
+                               ('program',))
+subprocess_failures = Counter('piflip_subprocess_failures_total', 'Subprocesses exiting non-zero or failing to start',
+                              ('program',))
+
+library_bytes = Counter('piflip_library_bytes_total', 'Bytes read/written under ~/piflip by library',
+                        ('library', 'direction'))
+library_files = Counter('piflip_library_files_total', 'Files read/written under ~/piflip by library',
+                        ('library', 'direction'))
+
+stage_seconds = Histogram('piflip_stage_duration_seconds', 'Duration of named processing stages', ('stage',))
+
+REGISTRY = [
+    http_seconds, http_bytes, http_requests,
+    spi_seconds, spi_bytes,
+    i2c_seconds, i2c_bytes, pn532_commands,
+    subprocess_spawn_seconds, subprocess_seconds, subprocess_failures,
+    library_bytes, library_files,
+    stage_seconds
+]
+
+installed = set()
+install_lock = threading.Lock()
+started = time.time()
+
+
+@contextmanager
+def stage(name):
+    """Time a block: with metrics.stage('cc1101_capture'): ..."""
+    began = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_seconds.observe(time.perf_counter() - began, name)
+
+
+def render():
+    """All metrics in Prometheus text exposition format"""
+    lines = [
+        "# HELP piflip_uptime_seconds Seconds since metrics were installed",
+        "# TYPE piflip_uptime_seconds gauge",
+        f"piflip_uptime_seconds {time.time() - started:.1f}"
+    ]
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# =============================================================================
+# FLASK
+# =============================================================================
+
+def install_flask(app):
+    """Time every request by route template (not raw path, to bound cardinality)"""
+    from flask import g, request
+
+    @app.before_request
+    def _metrics_start():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _metrics_record(response):
+        began = g.pop('metrics_started', None)
+        if began is not None:
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            http_seconds.observe(time.perf_counter() - began, request.method, route)
+            http_requests.inc(request.method, route, str(response.status_code))
+            if not response.is_streamed:
+                http_bytes.observe(response.content_length or 0, request.method, route)
+        return response
+
+    installed.add('flask')
+
+
+# =============================================================================
+# SPI (spidev)
+# =============================================================================
+
+SPI_OPERATIONS = ('xfer', 'xfer2', 'xfer3', 'writebytes', 'writebytes2', 'readbytes')
+
+
+class InstrumentedSpi:
+    """SpiDev wrapper timing every transfer; attributes pass through"""
+
+    def __init__(self, spi):
+        object.__setattr__(self, '_spi', spi)
+
+    def __getattr__(self, name):
+        attribute = getattr(self._spi, name)
+        if name not in SPI_OPERATIONS:
+            return attribute
+
+        def timed(data, *args, **kwargs):
+            began = time.perf_counter()
+            try:
+                return attribute(data, *args, **kwargs)
+            finally:
+                spi_seconds.observe(time.perf_counter() - began, name)
+                spi_bytes.inc(name, amount=data if name == 'readbytes' else len(data))
+        return timed
+
+    def __setattr__(self, name, value):
+        setattr(self._spi, name, value)
+
+
+def install_spi():
+    """Wrap spidev.SpiDev so every new SPI handle is instrumented"""
+    import spidev
+    with install_lock:
+        if 'spi' in installed:
+            return
+        original = spidev.SpiDev
+
+        def SpiDev(*args, **kwargs):
+            return InstrumentedSpi(original(*args, **kwargs))
+
+        spidev.SpiDev = SpiDev
+        installed.add('spi')
+
+
+# =============================================================================
+# I2C (PN532)
+# =============================================================================
+
+def install_pn532():
+    """Time PN532_I2C frame reads/writes and count commands"""
+    from adafruit_pn532.adafruit_pn532 import PN532
+    from adafruit_pn532.i2c import PN532_I2C
+    with install_lock:
+        if 'pn532' in installed:
+            return
+        installed.add('pn532')
+
+    read_data, write_data, send_command = PN532_I2C._read_data, PN532_I2C._write_data, PN532.send_command
+
+    def _read_data(self, count):
+        began = time.perf_counter()
+        try:
+            return read_data(self, count)
+        finally:
+            i2c_seconds.observe(time.perf_counter() - began, 'read')
+            i2c_bytes.inc('read', amount=count)
+
+    def _write_data(self, framebytes):
+        began = time.perf_counter()
+        try:
+            return write_data(self, framebytes)
+        finally:
+            i2c_seconds.observe(time.perf_counter() - began, 'write')
+            i2c_bytes.inc('write', amount=len(framebytes))
+
+    def send_command_counted(self, command, *args, **kwargs):
+        pn532_commands.inc(f"0x{command:02X}")
+        return send_command(self, command, *args, **kwargs)
+
+    PN532_I2C._read_data = _read_data
+    PN532_I2C._write_data = _write_data
+    PN532.send_command = send_command_counted
+
+
+# =============================================================================
+# SUBPROCESS
+# =============================================================================
+
+def _program(args):
+    if isinstance(args, (str, bytes)):
+        args = args.split()
+    if not args:
+        return 'unknown'
+    program = os.path.basename(os.fsdecode(args[0]))
+    if program == 'sudo' and len(args) > 1:
+        program = os.path.basename(os.fsdecode(args[1]))
+    return program
+
+
+class TimedPopen(subprocess.Popen):
+    """Popen that records spawn time, run time and failures per program"""
+
+    def __init__(self, args, *rest, **kwargs):
+        self._metrics_program = _program(args)
+        self._metrics_recorded = False
+        began = time.perf_counter()
+        try:
+            super().__init__(args, *rest, **kwargs)
+        except OSError:
+            subprocess_failures.inc(self._metrics_program)
+            raise
+        self._metrics_started = began
+        subprocess_spawn_seconds.observe(time.perf_counter() - began, self._metrics_program)
+
+    def _metrics_exit(self):
+        if self.returncode is not None and not self._metrics_recorded:
+            self._metrics_recorded = True
+            subprocess_seconds.observe(time.perf_counter() - self._metrics_started, self._metrics_program)
+            if self.returncode != 0:
+                subprocess_failures.inc(self._metrics_program)
+
+    def wait(self, timeout=None):
+        try:
+            return super().wait(timeout)
+        finally:
+            self._metrics_exit()
+
+    def poll(self):
+        result = super().poll()
+        self._metrics_exit()
+        return result
+
+
+def install_subprocess():
+    with install_lock:
+        if 'subprocess' in installed:
+            return
+        subprocess.Popen = TimedPopen
+        installed.add('subprocess')
+
+
+# =============================================================================
+# LIBRARY I/O
+# =============================================================================
+
+LIBRARY_ROOT = "~/piflip"
+
+
+def install_library_io():
+    """Start counting library_io() calls (the save/load points call it unconditionally)"""
+    with install_lock:
+        installed.add('library_io')
+
+
+def library_io(path, direction, amount=None):
+    """
+    Count one library save/load under ~/piflip, labelled by its top-level directory
+
+    Called where the libraries read or write whole files (signal and NFC
+    JSON, captures, burst packs, IQStream maps), so memmap/tofile traffic
+    is counted the same as open().
+
+    Args:
+        path: File read or written
+        direction: 'read' or 'written'
+        amount: Bytes moved (default: the file's size)
+    """
+    if 'library_io' not in installed:
+        return
+    try:
+        root = os.path.abspath(os.path.expanduser(LIBRARY_ROOT)) + os.sep
+        path = os.path.abspath(os.fsdecode(path))
+        if not path.startswith(root):
+            return
+        if amount is None:
+            amount = os.path.getsize(path)
+    except (OSError, TypeError, ValueError):
+        return
+    relative = path[len(root):]
+    library = relative.split(os.sep, 1)[0] if os.sep in relative else 'piflip'
+    library_bytes.inc(library, direction, amount=int(amount))
+    library_files.inc(library, direction)
+
+
+HARDWARE_HOOKS = (('spidev', 'spi', install_spi), ('adafruit_pn532.i2c', 'pn532', install_pn532))
+
+
+def install_hardware(*_):
+    """
+    Instrument the hardware libraries that are already imported
+
+    Never imports them itself, so it is cheap to call after every
+    subsystem load (subsystems.on_load): the hooks land as soon as
+    spidev or adafruit_pn532 is first pulled in, before any caller
+    gets to open a device.
+    """
+    for module, name, install in HARDWARE_HOOKS:
+        if name not in installed and module in sys.modules:
+            try:
+                install()
+            except Exception as e:
+                print(f"[!] Metrics: {name} hooks unavailable ({e})")
+    return sorted(installed)
+
+
+def enabled():
+    return os.environ.get('PIFLIP_METRICS', '1') != '0'
+
+
+def install(app=None):
+    """
+    Install the Flask, subprocess and library I/O hooks (no-op if disabled)
+
+    Hardware hooks follow via install_hardware() once spidev/PN532 load.
+
+    Returns:
+        Names of the installed hook sets
+    """
+    if not enabled():
+        return sorted(installed)
+    if app is not None and 'flask' not in installed:
+        install_flask(app)
+    install_subprocess()
+    install_library_io()
+    install_hardware()
+    return sorted(installed)
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Modulation Classifier for PiFlip
+Feature-based OOK/ASK vs FSK vs PSK decision per burst
+
+Features (on the channel-filtered baseband of each burst):
+- Amplitude: fraction of the burst the carrier is on, envelope variation
+- Frequency: bimodality of the instantaneous frequency (two FSK tones)
+- Spectral lines: strongest line of x, x^2 and x^4 above the median.
+  PSK suppresses the carrier line of x but squaring (BPSK) or raising
+  to the 4th power (QPSK) strips the modulation and restores a line.
+
+Cheap enough to run on every burst before choosing a demodulator.
+"""
+
+import numpy as np
+from iq_stream import open_stream, FrequencyDiscriminator
+from fsk_demodulator import FSKDemodulator
+
+
+class ModulationClassifier:
+    """Label bursts OOK, FSK or PSK with a confidence"""
+
+    LABELS = ('OOK', 'FSK', 'PSK')
+
+    def __init__(self, sample_rate=2048000, snr_db=10.0, max_bursts=20):
+        """
+        Args:
+            sample_rate: Capture sample rate in Hz
+            snr_db: Envelope level above noise that marks a burst
+            max_bursts: Bursts examined per capture (the first ones)
+        """
+        self.sample_rate = sample_rate
+        self.snr_db = snr_db
+        self.max_bursts = max_bursts
+        self.channel = FSKDemodulator(sample_rate=sample_rate, snr_db=snr_db)
+
+    # =========================================================================
+    # FEATURES
+    # =========================================================================
+
+    @staticmethod
+    def spectral_line_db(samples):
+        """Strongest spectral line above the median bin, in dB"""
+        spectrum = np.abs(np.fft.fft(samples)) ** 2
+        return float(10 * np.log10(spectrum.max() / max(np.median(spectrum), 1e-20)))
+
+    @staticmethod
+    def bimodality(values):
+        """Sarle's bimodality coefficient (> 0.555 suggests two modes)"""
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) < 8 or values.std() == 0:
+            return 0.0
+        z = (values - values.mean()) / values.std()
+        skew = np.mean(z ** 3)
+        kurtosis = np.mean(z ** 4)
+        return float((skew ** 2 + 1) / kurtosis)
+
+    def features(self, stream, burst):
+        """
+        Feature vector of one burst
+
+        Returns:
+            Dict of features, or None if the burst is too short
+        """
+        # The start of a long burst is enough to tell the modulation
+        samples, rate, centre = self.channel.baseband(stream, burst['start_sample'], burst['end_sample'],
+                                                      max_samples=self.channel.max_track)
+        if len(samples) < 64:
+            return None
+        samples = samples[2:-2]
+
+        env = np.abs(samples)
+        carrier = env > 0.5 * np.percentile(env, 95)
+        on = samples[carrier]
+
+        track = FrequencyDiscriminator(rate).process(samples)[carrier]
+        track = track[1:] if len(track) > 1 else track
+
+        # Normalise the carrier-on samples before raising to powers
+        unit = on / np.maximum(np.abs(on), 1e-9)
+
+        return {
+            'carrier_fraction': round(float(carrier.mean()), 3),
+            'amplitude_cv': round(float(env.std() / max(env.mean(), 1e-9)), 3),
+            'frequency_bimodality': round(self.bimodality(track), 3),
+            'frequency_spread_hz': round(float(np.subtract(*np.percentile(track, [90, 10]))) / 2, 1)
+                if len(track) else 0.0,
+            'line_x1_db': round(self.spectral_line_db(unit), 1),
+            'line_x2_db': round(self.spectral_line_db(unit ** 2), 1),
+            'line_x4_db': round(self.spectral_line_db(unit ** 4), 1),
+            'centre_hz': round(centre, 1),
+            'duration_ms': round((burst['end_sample'] - burst['start_sample']) / self.sample_rate * 1000, 2)
+        }
+
+    # =========================================================================
+    # DECISION
+    # =========================================================================
+
+    def decide(self, features):
+        """
+        Label a feature vector
+
+        Returns:
+            (label, confidence 0-1)
+        """
+        # On-off keying: the carrier is missing for a good part of the burst
+        ook = max(np.clip((0.85 - features['carrier_fraction']) / 0.25, 0, 1),
+                  np.clip((features['amplitude_cv'] - 0.35) / 0.3, 0, 1))
+        if ook > 0:
+            return 'OOK', round(float(0.5 + 0.5 * ook), 2)
+
+        # Constant envelope: two frequency modes (FSK) or a line that only
+        # appears after squaring (PSK)
+        fsk = float(np.clip((features['frequency_bimodality'] - 0.45) / 0.35, 0, 1))
+        psk_gain = max(features['line_x2_db'], features['line_x4_db']) - features['line_x1_db']
+        psk = float(np.clip((psk_gain - 3) / 9, 0, 1))
+
+        if max(fsk, psk) < 0.3:
+            # Steady unmodulated carrier - a single long OOK pulse
+            if features['line_x1_db'] >= 20:
+                return 'OOK', 0.5
+            return 'unknown', round(1 - max(fsk, psk), 2)
+
+        label = 'FSK' if fsk >= psk else 'PSK'
+        return label, round(float(0.5 + 0.5 * abs(fsk - psk)), 2)
+
+    # =========================================================================
+    # PIPELINE
+    # =========================================================================
+
+    def classify_burst(self, stream, burst):
+        """Classify one burst (dict with start_sample/end_sample)"""
+        features = self.features(stream, burst)
+        if features is None:
+            return None
+        label, confidence = self.decide(features)
+        return {
+            'start_time': burst.get('start_time'),
+            'end_time': burst.get('end_time'),
+            'modulation': label,
+            'confidence': confidence,
+            'features': features
+        }
+
+    def classify(self, capture_file, bursts=None):
+        """
+        Classify the bursts of a capture
+
+        Args:
+            capture_file: Path to the .cu8 file (or a uint8 I/Q array or IQStream)
+            bursts: Bursts to classify (default: detect them)
+
+        Returns:
+            Dict with the overall modulation (confidence-weighted vote),
+            per-label counts and per-burst results
+        """
+        stream = open_stream(capture_file, self.sample_rate)
+        if bursts is None:
+            bursts = stream.bursts(snr_db=self.snr_db)
+
+        results = []
+        for burst in bursts:
+            result = self.classify_burst(stream, burst)
+            if result is not None:
+                results.append(result)
+            if len(results) >= self.max_bursts:
+                break
+
+        return self.summarize(results)
+
+    def summarize(self, results):
+        """Combine per-burst results into one capture-level verdict"""
+        if not results:
+            return {'status': 'no_signal', 'modulation': 'unknown', 'confidence': 0.0, 'bursts': []}
+
+        votes = {}
+        counts = {}
+        for result in results:
+            votes[result['modulation']] = votes.get(result['modulation'], 0) + result['confidence']
+            counts[result['modulation']] = counts.get(result['modulation'], 0) + 1
+        modulation = max(votes, key=votes.get)
+
+        return {
+            'status': 'success',
+            'modulation': modulation,
+            'confidence': round(float(votes[modulation] / sum(votes.values()) *
+                                      np.mean([r['confidence'] for r in results
+                                               if r['modulation'] == modulation])), 2),
+            'counts': counts,
+            'bursts': results
+        }
@@ -11,6 +11,8 @@ import time
 import json
 from pathlib import Path
 
+import metrics
+
 class NFCEmulator:
     """Emulate NFC cards with PN532"""
 
@@ -36,7 +38,9 @@ class NFCEmulator:
             return None
 
         with open(card_file, 'r') as f:
-            return json.load(f)
+            card_data = json.load(f)
+        metrics.library_io(card_file, 'read')
+        return card_data
 
     def emulate_card(self, card_data, duration=30):
         """
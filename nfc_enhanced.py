@@ -13,6 +13,8 @@ import os
 from datetime import datetime
 from pathlib import Path
 
+import metrics
+
 class NFCEnhanced:
     def __init__(self):
         """Initialize PN532"""
@@ -164,6 +166,7 @@ class NFCEnhanced:
 
         with open(filepath, 'w') as f:
             json.dump(card_data, f, indent=2)
+        metrics.library_io(filepath, 'written')
 
         return {
             'status': 'success',
@@ -183,6 +186,7 @@ class NFCEnhanced:
             try:
                 with open(file, 'r') as f:
                     card_data = json.load(f)
+                    metrics.library_io(file, 'read')
                     cards.append(card_data)
             except:
                 pass
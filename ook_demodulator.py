@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+OOK Demodulator for PiFlip
+In-process OOK/ASK demodulation of RTL-SDR .cu8 captures
+
+Pipeline (block by block, constant memory - see iq_stream):
+1. Memory-map the .cu8 file (interleaved unsigned 8-bit I/Q)
+2. Magnitude through a 256x256 lookup table (no sqrt per sample)
+3. Low-pass + decimate the envelope with a boxcar average
+4. Slice with an adaptive, hysteretic threshold
+5. Run-length encode into {state, duration_us} timings (CC1101 format)
+"""
+
+import numpy as np
+from iq_stream import open_stream, HysteresisSlicer, RunLengthEncoder
+
+
+class OOKDemodulator:
+    """Demodulate OOK/ASK bursts from .cu8 captures into pulse timings"""
+
+    def __init__(self, sample_rate=2048000, decimation=8, block_samples=1 << 18,
+                 min_snr_db=6.0, min_pulse_us=40, block_ms=20.0):
+        """
+        Args:
+            sample_rate: Capture sample rate in Hz
+            decimation: Envelope decimation factor (boxcar low-pass length)
+            block_samples: IQ samples processed per block (bounds memory)
+            min_snr_db: Envelope peak above noise needed to slice a block
+            min_pulse_us: Shorter pulses are treated as glitches and merged
+            block_ms: Length of the blocks the adaptive threshold is computed over
+        """
+        self.sample_rate = sample_rate
+        self.decimation = max(1, int(decimation))
+        self.block_samples = block_samples
+        self.min_snr_db = min_snr_db
+        self.min_pulse_us = min_pulse_us
+        self.block_ms = block_ms
+
+    @property
+    def envelope_rate(self):
+        """Sample rate of the decimated envelope in Hz"""
+        return self.sample_rate / self.decimation
+
+    def slicer(self):
+        """Fresh adaptive slicer for one envelope stream"""
+        return HysteresisSlicer(self.envelope_rate * self.block_ms / 1000, self.min_snr_db)
+
+    # =========================================================================
+    # SLICING
+    # =========================================================================
+
+    def slice(self, env):
+        """
+        Slice a whole in-memory envelope
+
+        Returns:
+            uint8 array of 0/1 states, one per envelope sample
+        """
+        slicer = self.slicer()
+        return np.concatenate([slicer.process(np.asarray(env, dtype=np.float32)), slicer.flush()])
+
+    def to_timings(self, states):
+        """Run-length encode states into {state, duration_us} timings"""
+        encoder = RunLengthEncoder()
+        levels, lengths = encoder.process(np.asarray(states, dtype=np.uint8))
+        last_levels, last_lengths = encoder.flush()
+        return self._timings(np.concatenate([levels, last_levels]),
+                             np.concatenate([lengths, last_lengths]))
+
+    def _timings(self, levels, lengths):
+        if len(levels) == 0:
+            return []
+        durations = lengths * (1e6 / self.envelope_rate)
+        levels, durations = self._merge_glitches(levels, durations)
+        return [
+            {'state': int(level), 'duration_us': int(round(duration))}
+            for level, duration in zip(levels, durations)
+        ]
+
+    def _merge_glitches(self, levels, durations):
+        """Fold pulses shorter than min_pulse_us into the surrounding state"""
+        if self.min_pulse_us <= 0 or len(levels) < 3:
+            return levels, durations
+
+        keep = durations >= self.min_pulse_us
+        keep[0] = keep[-1] = True
+        levels = levels[keep]
+
+        # Time of the dropped glitches goes to the preceding kept run
+        owner = np.cumsum(keep) - 1
+        durations_kept = np.bincount(owner, weights=durations, minlength=len(levels))
+
+        # Dropping glitches can leave equal neighbours - merge those runs
+        boundary = np.concatenate([[True], levels[1:] != levels[:-1]])
+        group = np.cumsum(boundary) - 1
+        return levels[boundary], np.bincount(group, weights=durations_kept)
+
+    # =========================================================================
+    # PIPELINE
+    # =========================================================================
+
+    def demodulate(self, capture_file, trim=True):
+        """
+        Demodulate a whole .cu8 capture
+
+        Args:
+            capture_file: Path to the .cu8 file (or a uint8 I/Q array or IQStream)
+            trim: Drop the leading and trailing silence
+
+        Returns:
+            Dict with timings (CC1101 format) and pulse statistics
+        """
+        stream = open_stream(capture_file, self.sample_rate, self.block_samples)
+        if len(stream) < self.decimation * 16:
+            return {'status': 'error', 'message': 'Capture too short'}
+
+        slicer = self.slicer()
+        encoder = RunLengthEncoder()
+        levels = []
+        lengths = []
+
+        for _, env in stream.envelope_blocks(self.decimation):
+            run_levels, run_lengths = encoder.process(slicer.process(env))
+            levels.append(run_levels)
+            lengths.append(run_lengths)
+
+        run_levels, run_lengths = encoder.process(slicer.flush())
+        levels.append(run_levels)
+        lengths.append(run_lengths)
+        run_levels, run_lengths = encoder.flush()
+        levels.append(run_levels)
+        lengths.append(run_lengths)
+
+        timings = self._timings(np.concatenate(levels), np.concatenate(lengths))
+
+        if trim:
+            while timings and timings[0]['state'] == 0:
+                timings.pop(0)
+            while timings and timings[-1]['state'] == 0:
+                timings.pop()
+
+        pulses = [t['duration_us'] for t in timings if t['state'] == 1]
+
+        return {
+            'status': 'success' if pulses else 'no_signal',
+            'modulation': 'OOK',
+            'sample_rate': self.sample_rate,
+            'envelope_rate': self.envelope_rate,
+            'samples': len(stream),
+            'duration': round(stream.duration, 3),
+            'timings': timings,
+            'pulse_count': len(pulses),
+            'shortest_pulse_us': min(pulses) if pulses else None,
+            'longest_pulse_us': max(pulses) if pulses else None
+        }
@@ -8,6 +8,7 @@ import time
 import json
 import os
 from cc1101_enhanced import CC1101Enhanced
+from capture_converter import CaptureConverter
 from pathlib import Path
 
 class RFAdvancedTX:
@@ -47,12 +48,19 @@ class RFAdvancedTX:
         with open(signal_path) as f:
             signal_data = json.load(f)
 
-        # Check if signal has timing data (CC1101 capture)
+        # RTL-SDR captures are raw IQ samples - convert them to timings first
         if 'timings' not in signal_data:
-            return {
-                'status': 'error',
-                'message': 'Signal has no timing data. Only CC1101 captures can be replayed. RTL-SDR captures are raw IQ samples.'
-            }
+            converted = CaptureConverter().convert(signal_name)
+            if converted['status'] != 'success':
+                return {
+                    'status': 'error',
+                    'message': f"Signal has no timing data and could not be converted: {converted['message']}"
+                }
+            signal_data = converted['signal']
+
+        error = self.cc1101.unsupported_modulation(signal_data)
+        if error:
+            return error
 
         base_freq = signal_data.get('frequency', 433.92)
         # Handle frequency in Hz vs MHz
@@ -195,12 +203,19 @@ class RFAdvancedTX:
         with open(signal_path) as f:
             signal_data = json.load(f)
 
-        # Check if signal has timing data (CC1101 capture)
+        # RTL-SDR captures are raw IQ samples - convert them to timings first
         if 'timings' not in signal_data:
-            return {
-                'status': 'error',
-                'message': 'Signal has no timing data. Only CC1101 captures can be fuzzed. RTL-SDR captures are raw IQ samples.'
-            }
+            converted = CaptureConverter().convert(signal_name)
+            if converted['status'] != 'success':
+                return {
+                    'status': 'error',
+                    'message': f"Signal has no timing data and could not be converted: {converted['message']}"
+                }
+            signal_data = converted['signal']
+
+        error = self.cc1101.unsupported_modulation(signal_data)
+        if error:
+            return error
 
         base_timings = signal_data['timings']
         frequency = signal_data.get('frequency', 433.92)
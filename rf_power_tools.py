@@ -56,6 +56,10 @@ class RFPowerTools:
         if 'timings' not in signal_data:
             return {'status': 'error', 'message': 'Signal has no timing data. Only CC1101 captures can be fuzzed.'}
 
+        error = self.cc1101.unsupported_modulation(signal_data)
+        if error:
+            return error
+
         frequency = signal_data.get('frequency', 433.92)
         if frequency > 1000:
             frequency = frequency / 1e6
@@ -345,7 +349,8 @@ class RFPowerTools:
     # 3. FREQUENCY SCANNER
     # =========================================================================
 
-    def frequency_sweep(self, signal_name, start_freq, end_freq, step_mhz=0.05, delay_ms=500, repeats=3):
+    def frequency_sweep(self, signal_name, start_freq, end_freq, step_mhz=0.05, delay_ms=500, repeats=3,
+                        progress=None):
         """
         Sweep frequency range while transmitting signal
         Useful for finding unknown frequency of target device
@@ -357,6 +362,7 @@ class RFPowerTools:
             step_mhz: Step size in MHz
             delay_ms: Delay between frequencies
             repeats: Number of times to transmit at each frequency
+            progress: Optional callback(stage, percent) before each frequency
 
         Returns:
             Dict with results
@@ -368,6 +374,10 @@ class RFPowerTools:
         if 'timings' not in signal_data:
             return {'status': 'error', 'message': 'Signal has no timing data'}
 
+        error = self.cc1101.unsupported_modulation(signal_data)
+        if error:
+            return error
+
         timings = signal_data['timings']
 
         frequencies_tested = []
@@ -377,8 +387,12 @@ class RFPowerTools:
         print(f"    Step: {step_mhz} MHz")
         print(f"    Signal: {signal_name}")
 
+        steps = int((end_freq - start_freq) / step_mhz) + 1 if step_mhz > 0 else 1
+
         while current_freq <= end_freq:
             print(f"  [+] Testing {current_freq:.3f} MHz...")
+            if progress:
+                progress(f"Transmitting at {current_freq:.3f} MHz", len(frequencies_tested) * 100 // steps)
 
             signal = {
                 'frequency': current_freq,
@@ -408,7 +422,7 @@ class RFPowerTools:
     # 4. SIGNAL PLAYLIST
     # =========================================================================
 
-    def execute_playlist(self, playlist):
+    def execute_playlist(self, playlist, progress=None):
         """
         Execute sequence of signal transmissions
 
@@ -418,6 +432,7 @@ class RFPowerTools:
                     {'signal': 'signal_name', 'delay': 1.0, 'repeats': 3},
                     {'signal': 'signal_name2', 'delay': 0.5, 'repeats': 1},
                 ]
+            progress: Optional callback(stage, percent) before each step
 
         Returns:
             Dict with results
@@ -438,6 +453,8 @@ class RFPowerTools:
             frequency = step.get('frequency', None)
 
             print(f"  [{i+1}/{len(playlist)}] Signal: {signal_name}, Delay: {delay}s")
+            if progress:
+                progress(f"Step {i + 1}/{len(playlist)}: {signal_name}", i * 100 // len(playlist))
 
             # Load signal
             signal_data = self._load_signal(signal_name)
@@ -461,6 +478,12 @@ class RFPowerTools:
                 })
                 continue
 
+            error = self.cc1101.unsupported_modulation(signal_data)
+            if error:
+                print(f"    [!] {error['message']}")
+                results['steps'].append({'step': i + 1, 'signal': signal_name, **error})
+                continue
+
             # Use custom frequency if provided
             if frequency:
                 signal_data['frequency'] = frequency
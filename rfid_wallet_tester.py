@@ -24,7 +24,7 @@ class RFIDWalletTester:
             print(f"[!] PN532 not available: {e}")
             self.available = False
 
-    def test_blocking_effectiveness(self, duration=10, sample_interval=0.2):
+    def test_blocking_effectiveness(self, duration=10, sample_interval=0.2, progress=None):
         """
         Test RFID blocking wallet
 
@@ -37,6 +37,7 @@ class RFIDWalletTester:
         Args:
             duration: How long to test (seconds)
             sample_interval: How often to check (seconds)
+            progress: Optional callback(stage, percent) after each sample
 
         Returns:
             dict with test results
@@ -67,6 +68,8 @@ class RFIDWalletTester:
             if uid:
                 baseline_detections += 1
             time.sleep(sample_interval)
+            if progress:
+                progress("Phase 1: card outside wallet", min(50, (time.time() - start_time) * 50 // duration))
 
         baseline_success_rate = (baseline_detections / baseline_attempts * 100) if baseline_attempts > 0 else 0
 
@@ -102,6 +105,8 @@ class RFIDWalletTester:
             if uid:
                 protected_detections += 1
             time.sleep(sample_interval)
+            if progress:
+                progress("Phase 2: card inside wallet", min(100, 50 + (time.time() - start_time) * 50 // duration))
 
         protected_success_rate = (protected_detections / protected_attempts * 100) if protected_attempts > 0 else 0
 
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+rtl_433 Daemon for PiFlip
+One long-running rtl_433 feeding an in-memory sensor cache
+
+rtl_433 runs continuously (hopping between the configured frequencies)
+and its JSON events stream into:
+- a ring buffer of recent events, each with a sequence number so clients
+  can ask for everything after the last one they saw
+- a per-sensor index keyed by model and ID holding the latest reading,
+  first/last seen time and message count
+
+/api/scan433, /api/tpms and /api/weather answer from the cache instantly
+instead of launching rtl_433 and blocking for 30-60 seconds. The process
+is restarted with backoff if it exits, and can be paused while another
+tool needs the RTL-SDR.
+"""
+
+import json
+import subprocess
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+WEATHER_FIELDS = ('temperature_C', 'temperature_F', 'humidity', 'wind_avg_km_h', 'wind_avg_m_s',
+                  'wind_max_km_h', 'rain_mm', 'rain_in', 'pressure_hPa', 'uv', 'light_lux')
+
+
+class Rtl433Daemon:
+    """Supervise rtl_433 and cache what it hears"""
+
+    def __init__(self, frequencies=('433.92M', '315M'), hop_interval=30, gain=40,
+                 protocols=None, ring_size=5000, max_backoff=30, device=None, sample_rate=None):
+        """
+        Args:
+            frequencies: rtl_433 -f values; more than one hops between them
+            hop_interval: Seconds per frequency when hopping
+            gain: Tuner gain
+            protocols: rtl_433 -R protocol numbers (None = rtl_433 defaults)
+            ring_size: Recent events kept in memory
+            max_backoff: Longest wait (s) before restarting a failed rtl_433
+            device: rtl_433 -d value, e.g. rtl_tcp:127.0.0.1:1234 to listen
+                    through the IQ multiplexer (None = first RTL-SDR)
+            sample_rate: rtl_433 -s value (must match a shared stream's rate)
+        """
+        self.frequencies = list(frequencies)
+        self.hop_interval = hop_interval
+        self.gain = gain
+        self.protocols = list(protocols) if protocols else None
+        self.max_backoff = max_backoff
+        self.device = device
+        self.sample_rate = sample_rate
+
+        self.events = deque(maxlen=ring_size)
+        self.listeners = []
+        self.sensors = {}
+        self.seq = 0
+        self.stderr = deque(maxlen=50)
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+
+        self.state = 'stopped'
+        self.started = None
+        self.restarts = 0
+        self.process = None
+        self.thread = None
+        self.stopping = threading.Event()
+
+    # =========================================================================
+    # PROCESS
+    # =========================================================================
+
+    def command(self):
+        """rtl_433 command line"""
+        cmd = ['rtl_433', '-g', str(self.gain), '-F', 'json',
+               '-M', 'time:unix:usec', '-M', 'level', '-M', 'protocol']
+        if self.device:
+            cmd += ['-d', str(self.device)]
+        if self.sample_rate:
+            cmd += ['-s', str(self.sample_rate)]
+        for frequency in self.frequencies:
+            cmd += ['-f', str(frequency)]
+        if len(self.frequencies) > 1:
+            cmd += ['-H', str(self.hop_interval)]
+        for protocol in self.protocols or []:
+            cmd += ['-R', str(protocol)]
+        return cmd
+
+    def start(self, **config):
+        """
+        Start the daemon (idempotent); config keywords replace the
+        constructor settings and restart a running rtl_433
+        """
+        if config:
+            self.stop()
+            for key in ('frequencies', 'hop_interval', 'gain', 'protocols', 'device', 'sample_rate'):
+                if key in config:
+                    setattr(self, key, config[key])
+
+        if self.thread and self.thread.is_alive():
+            return self.status()
+
+        self.stopping.clear()
+        self.state = 'starting'
+        self.started = time.time()
+        self.thread = threading.Thread(target=self._supervise, name='rtl433', daemon=True)
+        self.thread.start()
+        return self.status()
+
+    def stop(self):
+        """Stop rtl_433 and the supervisor thread"""
+        self.stopping.set()
+        process = self.process
+        if process and process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if self.thread:
+            self.thread.join(timeout=5)
+        self.thread = None
+        self.state = 'stopped'
+
+    @contextmanager
+    def released(self):
+        """Free the RTL-SDR for another tool, then carry on listening"""
+        was_running = self.thread is not None and self.thread.is_alive()
+        self.stop()
+        if was_running:
+            self.state = 'paused'
+        try:
+            yield
+        finally:
+            if was_running:
+                self.start()
+
+    def _supervise(self):
+        """Run rtl_433, restarting it with backoff until stopped"""
+        backoff = 1
+        while not self.stopping.is_set():
+            launched = time.time()
+            try:
+                self.process = subprocess.Popen(
+                    self.command(), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                    text=True, bufsize=1
+                )
+            except FileNotFoundError:
+                self.state = 'error'
+                self.stderr.append('rtl_433 not installed')
+                return
+
+            self.state = 'running'
+            stderr_thread = threading.Thread(target=self._read_stderr, args=(self.process,), daemon=True)
+            stderr_thread.start()
+
+            for line in self.process.stdout:
+                if line.startswith('{'):
+                    try:
+                        self._add(json.loads(line))
+                    except json.JSONDecodeError:
+                        pass
+
+            self.process.wait()
+            stderr_thread.join(timeout=1)
+            if self.stopping.is_set():
+                break
+
+            # Exited on its own (device busy, unplugged) - restart after a pause
+            if self.state != 'busy':
+                self.state = 'restarting'
+            self.restarts += 1
+            if time.time() - launched > 60:
+                backoff = 1
+            print(f"[!] rtl_433 exited (code {self.process.returncode}), restarting in {backoff}s")
+            self.stopping.wait(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def _read_stderr(self, process):
+        for line in process.stderr:
+            line = line.strip()
+            if not line:
+                continue
+            self.stderr.append(line)
+            if 'usb_claim_interface error' in line:
+                self.state = 'busy'
+
+    # =========================================================================
+    # CACHE
+    # =========================================================================
+
+    @staticmethod
+    def category(event):
+        """tpms, weather or other"""
+        if event.get('type') == 'TPMS' or 'pressure_kPa' in event or 'pressure_PSI' in event:
+            return 'tpms'
+        if any(field in event for field in WEATHER_FIELDS):
+            return 'weather'
+        return 'other'
+
+    @staticmethod
+    def sensor_key(event):
+        """Stable sensor identity: model plus ID (or channel)"""
+        ident = event.get('id', event.get('channel', 'unknown'))
+        return f"{event.get('model', 'unknown')}:{ident}"
+
+    def _add(self, event):
+        now = time.time()
+        with self.lock:
+            self.seq += 1
+            event['seq'] = self.seq
+            event['received'] = round(now, 3)
+            event['category'] = self.category(event)
+            self.events.append(event)
+
+            key = self.sensor_key(event)
+            sensor = self.sensors.get(key)
+            if sensor is None:
+                sensor = self.sensors[key] = {
+                    'key': key,
+                    'model': event.get('model'),
+                    'id': event.get('id', event.get('channel')),
+                    'category': event['category'],
+                    'first_seen': event['received'],
+                    'count': 0
+                }
+            sensor['count'] += 1
+            sensor['last_seen'] = event['received']
+            sensor['latest'] = event
+            self.changed.notify_all()
+
+        for listener in self.listeners:
+            try:
+                listener(event, key)
+            except Exception as e:
+                print(f"[!] rtl_433 listener failed: {e}")
+
+    def subscribe(self, listener):
+        """Call listener(event, sensor_key) for every new event (on the reader thread)"""
+        if listener not in self.listeners:
+            self.listeners.append(listener)
+
+    def query(self, since=None, cursor=None, category=None, limit=500):
+        """
+        Cached events, oldest first
+
+        Args:
+            since: Only events received after this epoch time
+            cursor: Only events with a higher sequence number
+            category: 'tpms', 'weather' or 'other' (None = all)
+            limit: Newest events returned at most
+        """
+        with self.lock:
+            events = [
+                event for event in self.events
+                if (since is None or event['received'] > since)
+                and (cursor is None or event['seq'] > cursor)
+                and (category is None or event['category'] == category)
+            ]
+        return events[-limit:] if limit else events
+
+    def latest(self, category=None, since=None):
+        """Per-sensor latest readings, most recently heard first"""
+        with self.lock:
+            sensors = [
+                dict(sensor) for sensor in self.sensors.values()
+                if (category is None or sensor['category'] == category)
+                and (since is None or sensor['last_seen'] > since)
+            ]
+        return sorted(sensors, key=lambda s: s['last_seen'], reverse=True)
+
+    def wait(self, cursor, timeout=15):
+        """Block until an event newer than cursor arrives (or timeout)"""
+        with self.changed:
+            self.changed.wait_for(lambda: self.seq > cursor, timeout=timeout)
+            return self.seq
+
+    def clear(self):
+        with self.lock:
+            self.events.clear()
+            self.sensors.clear()
+
+    def status(self):
+        return {
+            'state': self.state,
+            'running': self.thread is not None and self.thread.is_alive(),
+            'command': ' '.join(self.command()),
+            'uptime': round(time.time() - self.started, 1) if self.started and self.state == 'running' else 0,
+            'restarts': self.restarts,
+            'cursor': self.seq,
+            'cached_events': len(self.events),
+            'sensors': len(self.sensors),
+            'log': list(self.stderr)[-5:]
+        }
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Streaming rtl_power CSV Parser for PiFlip
+Shared by every spectrum path (scans, waterfalls, SSE stream, hop detection)
+
+rtl_power line format:
+    date, time, Hz low, Hz high, Hz step, samples, dB, dB, dB...
+
+One line is one tuning hop. Lines are grouped into complete sweeps (all
+hops of one pass) and the dB fields of each line are parsed in bulk into
+a NumPy array.
+"""
+
+import time
+from datetime import datetime
+
+import numpy as np
+
+
+class Sweep:
+    """One complete rtl_power pass over the requested span"""
+
+    def __init__(self, stamp, hops, received=None):
+        """
+        Args:
+            stamp: rtl_power 'date time' string (one second resolution)
+            hops: List of (hz_low, hz_high, hz_step, powers array)
+            received: Wall-clock time the sweep was completed
+        """
+        self.stamp = stamp
+        self.hops = hops
+        self.received = received if received is not None else time.time()
+        self.frequencies = None
+        self.powers = None
+
+    @property
+    def timestamp(self):
+        """rtl_power timestamp as epoch seconds"""
+        try:
+            return datetime.strptime(self.stamp, '%Y-%m-%d %H:%M:%S').timestamp()
+        except ValueError:
+            return self.received
+
+    @property
+    def hz_low(self):
+        return self.hops[0][0] if self.hops else None
+
+    @property
+    def hz_high(self):
+        return self.hops[-1][1] if self.hops else None
+
+    def assemble(self, stitch=None):
+        """
+        Build the sweep's (frequencies_hz, powers) arrays
+
+        Args:
+            stitch: Optional callable taking the hop list (e.g.
+                    SweepScheduler.stitch); hops are simply concatenated
+                    otherwise
+        """
+        if self.powers is None:
+            if stitch is not None:
+                self.frequencies, self.powers = stitch(self.hops)
+            elif self.hops:
+                self.frequencies = np.concatenate([
+                    hz_low + np.arange(len(powers)) * hz_step
+                    for hz_low, _, hz_step, powers in self.hops
+                ])
+                self.powers = np.concatenate([hop[3] for hop in self.hops])
+            else:
+                self.frequencies, self.powers = np.empty(0), np.empty(0)
+        return self.frequencies, self.powers
+
+
+class RTLPowerParser:
+    """Incremental parser turning rtl_power output lines into Sweep objects"""
+
+    def __init__(self, end_hz=None, stitch=None):
+        """
+        Args:
+            end_hz: Upper edge of the requested span. When known, a sweep is
+                    emitted as soon as its last hop arrives instead of when
+                    the next sweep starts.
+            stitch: Optional hop stitching callable passed to Sweep.assemble
+        """
+        self.end_hz = end_hz
+        self.stitch = stitch
+        self.pending = None
+        self.last_low = None
+
+    @staticmethod
+    def parse_line(line):
+        """
+        Parse one rtl_power line
+
+        Returns:
+            (stamp, hz_low, hz_high, hz_step, powers) or None for invalid lines
+        """
+        parts = line.split(',', 6)
+        if len(parts) < 7:
+            return None
+        try:
+            powers = np.fromstring(parts[6], sep=',')
+            return (f'{parts[0].strip()} {parts[1].strip()}',
+                    float(parts[2]), float(parts[3]), float(parts[4]), powers)
+        except ValueError:
+            return None
+
+    def feed(self, line):
+        """
+        Feed one output line
+
+        Returns:
+            A completed Sweep, or None if the current sweep is still open
+        """
+        parsed = self.parse_line(line)
+        if parsed is None:
+            return None
+        stamp, hz_low, hz_high, hz_step, powers = parsed
+
+        completed = None
+        # A new sweep starts when the hop frequency wraps or the timestamp changes
+        if self.pending is not None and (hz_low <= self.last_low or stamp != self.pending.stamp):
+            completed = self._emit()
+
+        if self.pending is None:
+            self.pending = Sweep(stamp, [])
+        self.pending.hops.append((hz_low, hz_high, hz_step, powers))
+        self.last_low = hz_low
+
+        if completed is None and self.end_hz is not None and hz_high >= self.end_hz:
+            completed = self._emit()
+
+        return completed
+
+    def flush(self):
+        """Return the sweep still being assembled, if any"""
+        if self.pending is None:
+            return None
+        return self._emit()
+
+    def _emit(self):
+        sweep = self.pending
+        self.pending = None
+        self.last_low = None
+        sweep.received = time.time()
+        sweep.assemble(self.stitch)
+        return sweep
+
+    def iter_sweeps(self, stream):
+        """
+        Yield sweeps from a line iterable (e.g. a Popen stdout) as they complete
+        """
+        for line in stream:
+            sweep = self.feed(line)
+            if sweep is not None:
+                yield sweep
+        sweep = self.flush()
+        if sweep is not None:
+            yield sweep
+
+    def parse(self, output):
+        """Parse complete rtl_power output text into a list of sweeps"""
+        return list(self.iter_sweeps(output.splitlines()))
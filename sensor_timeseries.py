@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Sensor Time-Series Store for PiFlip
+History of decoded rtl_433 telemetry (weather, TPMS, ...)
+
+Layout under ~/piflip/telemetry:
+    sensors.json                  catalog: model, id, category, fields, seen
+    <sensor>/<field>.raw          append-only (time f64, value f32) records
+    <sensor>/<field>.1m / .1h     rollups: (bucket start, min, max, mean, count)
+
+Every numeric field of every event is one column per sensor. A write
+appends one fixed-size record and updates the open 1 min / 1 h buckets
+in memory; a bucket is appended to its rollup file when the first
+reading of the next bucket arrives - constant work per reading.
+
+Records are time-ordered, so range queries binary-search the
+memory-mapped file and read only the matching slice. Queries pick raw
+data, 1 min or 1 h rollups to stay under a point budget for charts.
+Retention trims each resolution separately (raw shortest).
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+RAW = np.dtype([('t', '<f8'), ('v', '<f4')])
+ROLLUP = np.dtype([('t', '<f8'), ('min', '<f4'), ('max', '<f4'), ('mean', '<f4'), ('count', '<u4')])
+
+RESOLUTIONS = {'1m': 60, '1h': 3600}
+
+# Event keys that identify or describe a message rather than measure anything
+SKIP_FIELDS = {'time', 'seq', 'received', 'id', 'channel', 'protocol', 'subtype', 'mic', 'mod'}
+
+
+class SensorTimeSeries:
+    """Append-only per-sensor columns with 1 min / 1 h rollups"""
+
+    def __init__(self, data_dir="~/piflip/telemetry", retention_days=None, compact_every=3600):
+        """
+        Args:
+            data_dir: Root directory of the store
+            retention_days: Days kept per resolution (raw, 1m, 1h)
+            compact_every: Seconds between retention passes (run from record())
+        """
+        self.data_dir = Path(os.path.expanduser(data_dir))
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        self.retention_days = {'raw': 7, '1m': 30, '1h': 365}
+        self.retention_days.update(retention_days or {})
+        self.compact_every = compact_every
+
+        self.catalog_file = self.data_dir / 'sensors.json'
+        self.catalog = self._load_catalog()
+        self.buckets = {}
+        self.handles = {}
+        self.lock = threading.Lock()
+        self.last_compact = time.time()
+
+    # =========================================================================
+    # CATALOG
+    # =========================================================================
+
+    def _load_catalog(self):
+        if not self.catalog_file.exists():
+            return {}
+        try:
+            with open(self.catalog_file, 'r') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def _save_catalog(self):
+        tmp_file = self.catalog_file.with_suffix('.tmp')
+        with open(tmp_file, 'w') as f:
+            json.dump(self.catalog, f, indent=2)
+        os.replace(tmp_file, self.catalog_file)
+
+    @staticmethod
+    def directory_name(key):
+        """Filesystem-safe directory for a sensor key"""
+        return re.sub(r'[^A-Za-z0-9_.-]', '_', key)
+
+    def series_file(self, key, field, resolution='raw'):
+        return self.data_dir / self.directory_name(key) / f"{field}.{resolution}"
+
+    def sensors(self, category=None):
+        """Catalog entries, most recently heard first"""
+        with self.lock:
+            sensors = [dict(entry) for entry in self.catalog.values()
+                       if category is None or entry.get('category') == category]
+        return sorted(sensors, key=lambda s: s.get('last_seen', 0), reverse=True)
+
+    # =========================================================================
+    # WRITING
+    # =========================================================================
+
+    @staticmethod
+    def numeric_fields(event):
+        """(field, value) pairs worth charting"""
+        for field, value in event.items():
+            if field in SKIP_FIELDS or isinstance(value, bool):
+                continue
+            if isinstance(value, (int, float)):
+                yield field, float(value)
+
+    def record(self, event, key=None):
+        """
+        Store the numeric fields of one rtl_433 event
+
+        Args:
+            event: Decoded event (as cached by Rtl433Daemon)
+            key: Sensor key (default model:id)
+        """
+        key = key or f"{event.get('model', 'unknown')}:{event.get('id', event.get('channel', 'unknown'))}"
+        stamp = float(event.get('received') or time.time())
+        fields = list(self.numeric_fields(event))
+        if not fields:
+            return
+
+        with self.lock:
+            entry = self.catalog.get(key)
+            changed = entry is None
+            if entry is None:
+                entry = self.catalog[key] = {
+                    'key': key,
+                    'model': event.get('model'),
+                    'id': event.get('id', event.get('channel')),
+                    'category': event.get('category'),
+                    'fields': [],
+                    'first_seen': stamp
+                }
+                (self.data_dir / self.directory_name(key)).mkdir(exist_ok=True)
+            entry['last_seen'] = stamp
+            entry['count'] = entry.get('count', 0) + 1
+
+            for field, value in fields:
+                if field not in entry['fields']:
+                    entry['fields'].append(field)
+                    changed = True
+                self._append(key, field, 'raw', np.array([(stamp, value)], dtype=RAW))
+                for resolution, seconds in RESOLUTIONS.items():
+                    self._roll(key, field, resolution, seconds, stamp, value)
+
+            if changed:
+                self._save_catalog()
+
+        if time.time() - self.last_compact > self.compact_every:
+            self.compact()
+
+    def _append(self, key, field, resolution, records):
+        handle_key = (key, field, resolution)
+        handle = self.handles.get(handle_key)
+        if handle is None:
+            if len(self.handles) >= 256:
+                for old in self.handles.values():
+                    old.close()
+                self.handles.clear()
+            handle = self.handles[handle_key] = open(self.series_file(key, field, resolution), 'ab')
+        handle.write(records.tobytes())
+        handle.flush()
+
+    def _roll(self, key, field, resolution, seconds, stamp, value):
+        """Fold a reading into its open bucket, writing out the previous one"""
+        start = stamp - stamp % seconds
+        bucket = self.buckets.get((key, field, resolution))
+        if bucket is None:
+            bucket = self._resume_bucket(key, field, resolution, seconds, start)
+        elif bucket['t'] != start:
+            self._append(key, field, resolution, self._bucket_record(bucket))
+            bucket = None
+
+        if bucket is None:
+            bucket = {'t': start, 'min': value, 'max': value, 'sum': 0.0, 'count': 0}
+        bucket['min'] = min(bucket['min'], value)
+        bucket['max'] = max(bucket['max'], value)
+        bucket['sum'] += value
+        bucket['count'] += 1
+        self.buckets[(key, field, resolution)] = bucket
+
+    def _resume_bucket(self, key, field, resolution, seconds, start):
+        """
+        After a restart, rebuild the open bucket from the raw readings
+        already in it, and write out the previous bucket if the restart
+        happened before it was closed
+        """
+        raw = self._read(self.series_file(key, field, 'raw'), RAW)
+        # The reading being recorded is already appended - leave it out
+        raw = raw[:-1]
+        lo = int(np.searchsorted(raw['t'], start))
+
+        if lo:
+            last = float(raw['t'][lo - 1])
+            previous = last - last % seconds
+            rollup = self._read(self.series_file(key, field, resolution), ROLLUP)
+            if not len(rollup) or rollup['t'][-1] < previous:
+                closed = self._bucket_from(raw[np.searchsorted(raw['t'], previous):lo], previous)
+                self._append(key, field, resolution, self._bucket_record(closed))
+
+        return self._bucket_from(raw[lo:], start) if lo < len(raw) else None
+
+    @staticmethod
+    def _bucket_from(readings, start):
+        values = readings['v'].astype(np.float64)
+        return {'t': start, 'min': float(values.min()), 'max': float(values.max()),
+                'sum': float(values.sum()), 'count': len(values)}
+
+    @staticmethod
+    def _bucket_record(bucket):
+        return np.array([(bucket['t'], bucket['min'], bucket['max'],
+                          bucket['sum'] / bucket['count'], bucket['count'])], dtype=ROLLUP)
+
+    # =========================================================================
+    # READING
+    # =========================================================================
+
+    @staticmethod
+    def _read(path, dtype):
+        """Memory-map a series file (whole records only)"""
+        if not path.exists():
+            return np.empty(0, dtype=dtype)
+        count = path.stat().st_size // dtype.itemsize
+        if count == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r', shape=(count,))
+
+    def _slice(self, key, field, resolution, start, end):
+        dtype = RAW if resolution == 'raw' else ROLLUP
+        records = self._read(self.series_file(key, field, resolution), dtype)
+        if start is not None and resolution != 'raw':
+            # Buckets are stamped with their start - keep the one overlapping `start`
+            start = start - RESOLUTIONS[resolution] + 1e-6
+        lo = np.searchsorted(records['t'], start, side='left') if start is not None else 0
+        hi = np.searchsorted(records['t'], end, side='right') if end is not None else len(records)
+        records = np.array(records[lo:hi])
+
+        if resolution != 'raw':
+            # Include the bucket still being filled
+            bucket = self.buckets.get((key, field, resolution))
+            if bucket and (start is None or bucket['t'] >= start) and (end is None or bucket['t'] <= end):
+                records = np.concatenate([records, self._bucket_record(bucket)])
+        return records
+
+    def query(self, key, field, start=None, end=None, resolution='auto', max_points=1000):
+        """
+        Readings of one sensor field between two epoch times
+
+        Args:
+            resolution: 'raw', '1m', '1h' or 'auto' (finest within max_points)
+
+        Returns:
+            Dict with the resolution used and points: [t, value] for raw,
+            [t, min, max, mean, count] for rollups
+        """
+        if key not in self.catalog or field not in self.catalog[key]['fields']:
+            return {'status': 'error', 'message': f'Unknown series: {key} {field}'}
+
+        with self.lock:
+            candidates = ['raw', '1m', '1h'] if resolution == 'auto' else [resolution]
+            for candidate in candidates:
+                records = self._slice(key, field, candidate, start, end)
+                if len(records) <= max_points:
+                    break
+            if len(records) > max_points:
+                # Even hourly is too dense - thin it evenly
+                records = records[np.linspace(0, len(records) - 1, max_points).astype(int)]
+
+        if candidate == 'raw':
+            points = [[round(float(r['t']), 3), round(float(r['v']), 3)] for r in records]
+        else:
+            points = [[float(r['t']), round(float(r['min']), 3), round(float(r['max']), 3),
+                       round(float(r['mean']), 3), int(r['count'])] for r in records]
+
+        return {
+            'status': 'success',
+            'sensor': key,
+            'field': field,
+            'resolution': candidate,
+            'columns': ['t', 'value'] if candidate == 'raw' else ['t', 'min', 'max', 'mean', 'count'],
+            'count': len(points),
+            'points': points
+        }
+
+    # =========================================================================
+    # RETENTION
+    # =========================================================================
+
+    def compact(self, now=None):
+        """Drop records older than each resolution's retention"""
+        now = now or time.time()
+        removed = 0
+        with self.lock:
+            for handle in self.handles.values():
+                handle.close()
+            self.handles.clear()
+
+            for key, entry in self.catalog.items():
+                for field in entry['fields']:
+                    for resolution, dtype in (('raw', RAW), ('1m', ROLLUP), ('1h', ROLLUP)):
+                        cutoff = now - self.retention_days[resolution] * 86400
+                        path = self.series_file(key, field, resolution)
+                        records = self._read(path, dtype)
+                        drop = int(np.searchsorted(records['t'], cutoff)) if len(records) else 0
+                        if drop:
+                            tmp_path = path.with_suffix(path.suffix + '.tmp')
+                            np.array(records[drop:]).tofile(tmp_path)
+                            del records
+                            os.replace(tmp_path, path)
+                            removed += drop
+            self._save_catalog()
+            self.last_compact = time.time()
+
+        if removed:
+            print(f"[*] Telemetry retention removed {removed} records")
+        return removed
+
+    def close(self):
+        with self.lock:
+            for handle in self.handles.values():
+                handle.close()
+            self.handles.clear()
+            self._save_catalog()
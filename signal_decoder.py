@@ -63,11 +63,20 @@ class SignalDecoder:
         if len(sorted_durations) < 4:
             return None
 
-        # Use simple k-means-like clustering for 2 clusters (short/long)
+        # Sync and inter-frame gaps (> 4x the median) are not data pulses;
+        # left in, they become the widest gap and swallow the long cluster
         median = statistics.median(sorted_durations)
+        pulses = [d for d in sorted_durations if d <= median * 4]
+        if len(pulses) < 4:
+            return None
+
+        # Split short/long at the widest relative gap between neighbouring
+        # durations (a median split breaks when one width dominates)
+        ratios = [b / a for a, b in zip(pulses, pulses[1:])]
+        split = ratios.index(max(ratios)) + 1
 
-        short_pulses = [d for d in sorted_durations if d < median]
-        long_pulses = [d for d in sorted_durations if d >= median]
+        short_pulses = pulses[:split]
+        long_pulses = pulses[split:]
 
         if not short_pulses or not long_pulses:
             return None
@@ -324,14 +333,39 @@ class SignalDecoder:
         return replay_data
 
 
+def self_test():
+    """Regression check: a PT2262-style frame with a sync gap keeps all its bits"""
+    frame = []
+    for bit in '010110010110':
+        # 350/1050 us PWM: 0 = short high + long low, 1 = long high + short low
+        high, low = (350, 1050) if bit == '0' else (1050, 350)
+        frame += [{'state': 1, 'duration_us': high}, {'state': 0, 'duration_us': low}]
+    frame += [{'state': 1, 'duration_us': 350}, {'state': 0, 'duration_us': 10850}]
+    timings = frame * 6
+
+    decoder = SignalDecoder()
+    pulse_info = decoder.analyze_timings(timings)
+    clusters = pulse_info['clusters']
+    assert 300 <= clusters['short']['avg'] <= 400, clusters
+    assert 1000 <= clusters['long']['avg'] <= 1100, clusters
+    bits = decoder.timings_to_binary(timings, pulse_info)
+    assert bits['bit_count'] == 150, bits['bit_count']
+    print(f"[+] Self-test passed: {bits['bit_count']} bits, "
+          f"short {clusters['short']['avg']} us, long {clusters['long']['avg']} us")
+
+
 if __name__ == '__main__':
     # Test decoder
     import sys
 
     if len(sys.argv) < 2:
-        print("Usage: python3 signal_decoder.py <signal_name>")
+        print("Usage: python3 signal_decoder.py <signal_name> | --self-test")
         sys.exit(1)
 
+    if sys.argv[1] == '--self-test':
+        self_test()
+        sys.exit(0)
+
     decoder = SignalDecoder()
     result = decoder.decode_signal(sys.argv[1])
 
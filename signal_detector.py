@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+CFAR Signal Detector for PiFlip
+Finds signals in spectrum frames and waterfalls against an adaptive noise floor
+
+Works on a single spectrum (1 x bins) or a whole waterfall (scans x bins)
+in one call - fast enough to run on every frame of a live stream.
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+class SignalDetector:
+    """Vectorized CFAR detector with peak grouping and bandwidth measurement"""
+
+    def __init__(self, window_bins=31, guard_bins=2, snr_db=6.0, method='median',
+                 merge_gap_bins=1, min_bins=1):
+        """
+        Args:
+            window_bins: Sliding window size used to estimate the noise floor
+            guard_bins: Bins each side of the cell under test left out of
+                        the training cells (CA-CFAR only)
+            snr_db: How far above the local noise floor a bin must be
+            method: 'median' (robust sliding median) or 'ca' (cell-averaging CFAR)
+            merge_gap_bins: Gaps up to this many bins are bridged so one
+                            signal is not split into fragments
+            min_bins: Minimum number of bins for a detection
+        """
+        self.window_bins = max(3, int(window_bins) | 1)  # Odd, so it has a centre
+        self.guard_bins = max(0, int(guard_bins))
+        self.snr_db = snr_db
+        self.method = method
+        self.merge_gap_bins = max(0, int(merge_gap_bins))
+        self.min_bins = max(1, int(min_bins))
+
+    # =========================================================================
+    # NOISE FLOOR
+    # =========================================================================
+
+    def noise_floor(self, powers):
+        """
+        Estimate the noise floor for every bin
+
+        Args:
+            powers: 1D (bins) or 2D (scans x bins) array of dB values
+
+        Returns:
+            Array of the same shape with the noise floor in dB
+        """
+        powers = np.asarray(powers, dtype=np.float64)
+        frame = np.atleast_2d(powers)
+
+        if self.method == 'ca':
+            floor = self._ca_floor(frame)
+        else:
+            floor = self._median_floor(frame)
+
+        return floor.reshape(powers.shape)
+
+    def _median_floor(self, frame):
+        """Sliding median, evaluated every half window and interpolated between"""
+        num_bins = frame.shape[1]
+        window = min(self.window_bins, num_bins | 1)
+        half = window // 2
+        hop = max(1, half)
+
+        padded = np.pad(frame, ((0, 0), (half, half)), mode='reflect')
+        # Lazy strided view - only the hop positions are ever materialised
+        windows = sliding_window_view(padded, window, axis=1)[:, ::hop, :]
+        medians = np.median(windows, axis=2)
+
+        centres = np.arange(0, num_bins, hop)
+        if medians.shape[1] == 1:
+            return np.repeat(medians, num_bins, axis=1)
+
+        # Linear interpolation weights are shared by every row
+        bins = np.arange(num_bins)
+        right = np.clip(np.searchsorted(centres, bins, side='right'), 1, len(centres) - 1)
+        left = right - 1
+        weight = np.clip((bins - centres[left]) / (centres[right] - centres[left]), 0.0, 1.0)
+
+        return medians[:, left] * (1.0 - weight) + medians[:, right] * weight
+
+    def _ca_floor(self, frame):
+        """Cell-averaging CFAR in linear power with guard cells"""
+        num_bins = frame.shape[1]
+        half = min(self.window_bins // 2, max(1, num_bins - 1))
+        guard = min(self.guard_bins, half - 1) if half > 1 else 0
+
+        linear = np.power(10.0, frame / 10.0)
+        padded = np.pad(linear, ((0, 0), (half, half)), mode='reflect')
+        csum = np.concatenate(
+            [np.zeros((frame.shape[0], 1)), np.cumsum(padded, axis=1)], axis=1)
+
+        centre = np.arange(num_bins) + half
+        outer = csum[:, centre + half + 1] - csum[:, centre - half]
+        inner = csum[:, centre + guard + 1] - csum[:, centre - guard]
+        training_cells = 2 * (half - guard)
+
+        mean = (outer - inner) / training_cells
+        return 10.0 * np.log10(np.maximum(mean, 1e-20))
+
+    # =========================================================================
+    # DETECTION
+    # =========================================================================
+
+    def detect(self, powers, frequencies, timestamps=None, min_power_db=None, min_width=0.0):
+        """
+        Detect signals in a spectrum frame or waterfall matrix
+
+        Adjacent bins above the threshold are grouped into peaks, and peaks
+        that overlap in frequency on consecutive scans are joined into one
+        signal with a time and frequency extent.
+
+        Args:
+            powers: 1D (bins) or 2D (scans x bins) array of dB values
+            frequencies: Frequency of each bin in MHz
+            timestamps: Optional timestamp for each scan
+            min_power_db: Optional absolute power floor in dB
+            min_width: Minimum signal bandwidth in MHz
+
+        Returns:
+            Dict with 'signals' list and the median 'noise_floor'
+        """
+        frame = np.atleast_2d(np.asarray(powers, dtype=np.float64))
+        freqs = np.asarray(frequencies, dtype=np.float64)
+        num_scans, num_bins = frame.shape
+
+        if num_bins == 0 or len(freqs) != num_bins:
+            return {'signals': [], 'noise_floor': None}
+
+        bin_width = float(np.median(np.diff(freqs))) if num_bins > 1 else 0.0
+        floor = self.noise_floor(frame)
+
+        mask = frame > floor + self.snr_db
+        if min_power_db is not None:
+            mask &= frame > min_power_db
+        if self.merge_gap_bins:
+            mask = self.close_gaps(mask, self.merge_gap_bins)
+
+        runs = self.find_runs(mask)
+        if runs is None:
+            return {'signals': [], 'noise_floor': round(float(np.median(floor)), 2)}
+
+        rows, starts, ends = runs
+        keep = (ends - starts) >= self.min_bins
+        rows, starts, ends = rows[keep], starts[keep], ends[keep]
+        if len(rows) == 0:
+            return {'signals': [], 'noise_floor': round(float(np.median(floor)), 2)}
+
+        # Per-run statistics over the compressed in-run values
+        lengths = ends - starts
+        offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        flat_index = np.repeat(rows * num_bins + starts - offsets, lengths) + np.arange(lengths.sum())
+        values = frame.ravel()[flat_index]
+        floors = floor.ravel()[flat_index]
+
+        run_peak = np.maximum.reduceat(values, offsets)
+        run_sum = np.add.reduceat(values, offsets)
+        run_floor = np.add.reduceat(floors, offsets)
+        # Bin of the peak: first index inside the run that equals the run's max
+        is_peak = values == np.repeat(run_peak, lengths)
+        peak_pos = np.minimum.reduceat(
+            np.where(is_peak, np.arange(len(values)), len(values)), offsets)
+        run_peak_bin = starts + (peak_pos - offsets)
+
+        # Join runs into signals across consecutive scans
+        labels = self._link_runs(rows, starts, ends, num_bins)
+        _, group = np.unique(labels, return_inverse=True)
+        count = group.max() + 1
+
+        first_row = np.full(count, num_scans)
+        last_row = np.full(count, -1)
+        low_bin = np.full(count, num_bins)
+        high_bin = np.full(count, -1)
+        peak = np.full(count, -np.inf)
+        total = np.zeros(count)
+        floor_total = np.zeros(count)
+        bins_total = np.zeros(count)
+
+        np.minimum.at(first_row, group, rows)
+        np.maximum.at(last_row, group, rows)
+        np.minimum.at(low_bin, group, starts)
+        np.maximum.at(high_bin, group, ends)
+        np.maximum.at(peak, group, run_peak)
+        np.add.at(total, group, run_sum)
+        np.add.at(floor_total, group, run_floor)
+        np.add.at(bins_total, group, lengths)
+
+        # Location of each signal's strongest run
+        order = np.lexsort((-run_peak, group))
+        best = order[np.concatenate([[True], group[order][1:] != group[order][:-1]])]
+        peak_bin = np.empty(count, dtype=np.int64)
+        peak_row = np.empty(count, dtype=np.int64)
+        peak_bin[group[best]] = run_peak_bin[best]
+        peak_row[group[best]] = rows[best]
+
+        start_freq = freqs[low_bin]
+        end_freq = freqs[high_bin - 1] + bin_width
+        bandwidth = end_freq - start_freq
+        avg_power = total / bins_total
+        snr = avg_power - floor_total / bins_total
+
+        if timestamps is not None and len(timestamps) == num_scans:
+            times = np.asarray(timestamps, dtype=np.float64)
+        else:
+            times = None
+
+        signals = []
+        for i in np.argsort(-peak):
+            if bandwidth[i] < min_width:
+                continue
+            signal = {
+                'center_freq': round(float((start_freq[i] + end_freq[i]) / 2), 4),
+                'peak_freq': round(float(freqs[peak_bin[i]] + bin_width / 2), 4),
+                'start_freq': round(float(start_freq[i]), 4),
+                'end_freq': round(float(end_freq[i]), 4),
+                'bandwidth': round(float(bandwidth[i]), 4),
+                'peak_power': round(float(peak[i]), 2),
+                'avg_power': round(float(avg_power[i]), 2),
+                'snr': round(float(snr[i]), 2),
+                'start_scan': int(first_row[i]),
+                'end_scan': int(last_row[i]),
+                'scans': int(last_row[i] - first_row[i] + 1)
+            }
+            if times is not None:
+                signal['start_time'] = float(times[first_row[i]])
+                signal['end_time'] = float(times[last_row[i]])
+                signal['peak_time'] = float(times[peak_row[i]])
+            signals.append(signal)
+
+        return {'signals': signals, 'noise_floor': round(float(np.median(floor)), 2)}
+
+    @staticmethod
+    def close_gaps(mask, gap):
+        """Bridge runs of False up to `gap` bins long that sit between detections"""
+        num_bins = mask.shape[1]
+        counts = np.concatenate(
+            [np.zeros((mask.shape[0], 1), dtype=np.int64), np.cumsum(mask, axis=1)], axis=1)
+        bins = np.arange(num_bins)
+        filled = mask.copy()
+        # A bin can be filled if there is a detection within `gap` bins on both sides
+        for left_reach in range(1, gap + 1):
+            right_reach = gap + 1 - left_reach
+            lo = np.maximum(bins - left_reach, 0)
+            hi = np.minimum(bins + right_reach + 1, num_bins)
+            left_hit = counts[:, bins] - counts[:, lo] > 0
+            right_hit = counts[:, hi] - counts[:, bins + 1] > 0
+            filled |= left_hit & right_hit
+        return filled
+
+    @staticmethod
+    def find_runs(mask):
+        """Return (row, start, end) arrays for every run of True, end exclusive"""
+        padded = np.zeros((mask.shape[0], mask.shape[1] + 2), dtype=np.int8)
+        padded[:, 1:-1] = mask
+        edges = np.diff(padded, axis=1)
+        start_rows, starts = np.nonzero(edges == 1)
+        _, ends = np.nonzero(edges == -1)
+        if len(starts) == 0:
+            return None
+        # Padding closes every run inside its own row, so both lists line up
+        return start_rows, starts, ends
+
+    @staticmethod
+    def _link_runs(rows, starts, ends, num_bins):
+        """Label runs so that overlapping runs on consecutive scans share a label"""
+        count = len(rows)
+        labels = np.arange(count)
+        if count < 2:
+            return labels
+
+        start_key = rows * num_bins + starts
+        end_key = rows * num_bins + ends
+
+        # Runs on the previous scan overlapping [start, end) form a contiguous block
+        lo = np.searchsorted(end_key, (rows - 1) * num_bins + starts, side='right')
+        hi = np.searchsorted(start_key, (rows - 1) * num_bins + ends, side='left')
+        links = np.maximum(hi - lo, 0)
+        if links.sum() == 0:
+            return labels
+
+        src = np.repeat(np.arange(count), links)
+        dst = np.repeat(lo, links) + (np.arange(links.sum()) - np.repeat(np.cumsum(links) - links, links))
+
+        # Min-label hooking with pointer jumping
+        while True:
+            low = np.minimum(labels[src], labels[dst])
+            np.minimum.at(labels, labels[src], low)
+            np.minimum.at(labels, labels[dst], low)
+            while True:
+                jumped = labels[labels]
+                if np.array_equal(jumped, labels):
+                    break
+                labels = jumped
+            if np.array_equal(labels[src], labels[dst]):
+                return labels
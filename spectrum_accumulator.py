@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Spectrum Accumulators for PiFlip
+Max-hold, min-hold, exponential average and persistence maintained per frame
+
+Each update is O(bins), so any view can be served at any time without
+reprocessing history. Decimation for narrow displays uses max-of-bins so
+short bursts never fall between the columns.
+"""
+
+import threading
+import time
+
+import numpy as np
+
+
+def decimate_max(powers, width):
+    """
+    Reduce the last axis to `width` columns keeping the maximum of each group
+
+    Works on a single spectrum or a (scans x bins) waterfall.
+    """
+    powers = np.asarray(powers, dtype=np.float64)
+    num_bins = powers.shape[-1]
+    if num_bins <= width:
+        return powers
+    edges = (np.arange(width) * num_bins) // width
+    return np.maximum.reduceat(powers, edges, axis=-1)
+
+
+class SpectrumAccumulator:
+    """Incrementally maintained spectrum views"""
+
+    VIEWS = ('live', 'max', 'min', 'avg', 'persistence')
+
+    def __init__(self, alpha=0.2, floor_db=-120.0, ceiling_db=0.0, levels=64, decay=0.0):
+        """
+        Args:
+            alpha: Exponential average weight of the newest frame
+            floor_db: Lowest power level of the persistence histogram
+            ceiling_db: Highest power level of the persistence histogram
+            levels: Number of power levels in the persistence histogram
+            decay: Fraction the persistence counts fade per frame (0 = none)
+        """
+        self.alpha = alpha
+        self.floor_db = floor_db
+        self.ceiling_db = ceiling_db
+        self.levels = levels
+        self.decay = decay
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Clear all accumulated history"""
+        with self.lock:
+            self.frequencies = None
+            self.live = None
+            self.max_hold = None
+            self.min_hold = None
+            self.average = None
+            self.persistence = None
+            self.frames = 0
+            self.started = time.time()
+            self.updated = None
+
+    def update(self, powers, frequencies=None):
+        """
+        Fold one spectrum frame into every accumulator
+
+        Args:
+            powers: Power of each bin in dB
+            frequencies: Optional frequency of each bin in MHz
+
+        A frame with a different bin count (span or resolution changed)
+        restarts accumulation.
+        """
+        powers = np.asarray(powers, dtype=np.float64)
+
+        with self.lock:
+            if self.live is None or len(powers) != len(self.live):
+                self._start(len(powers))
+
+            if frequencies is not None:
+                self.frequencies = np.asarray(frequencies, dtype=np.float64)
+
+            self.live = powers
+            np.maximum(self.max_hold, powers, out=self.max_hold)
+            np.minimum(self.min_hold, powers, out=self.min_hold)
+            if self.frames == 0:
+                self.average[:] = powers
+            else:
+                self.average += self.alpha * (powers - self.average)
+
+            if self.decay:
+                self.persistence *= (1.0 - self.decay)
+            self.persistence[self._level_index(powers), np.arange(len(powers))] += 1
+
+            self.frames += 1
+            self.updated = time.time()
+
+    def _start(self, num_bins):
+        self.max_hold = np.full(num_bins, -np.inf)
+        self.min_hold = np.full(num_bins, np.inf)
+        self.average = np.zeros(num_bins)
+        self.persistence = np.zeros((self.levels, num_bins))
+        self.frames = 0
+        self.started = time.time()
+
+    def _level_index(self, powers):
+        scale = (self.levels - 1) / (self.ceiling_db - self.floor_db)
+        index = np.round((powers - self.floor_db) * scale).astype(np.int64)
+        return np.clip(index, 0, self.levels - 1)
+
+    def view(self, name='max', width=None):
+        """
+        Get one accumulated view, optionally decimated to `width` columns
+
+        Args:
+            name: 'live', 'max', 'min', 'avg' or 'persistence'
+            width: Number of display columns (max-of-bins decimation)
+
+        Returns:
+            Dict with the view data and its frequency axis
+        """
+        with self.lock:
+            if self.live is None:
+                return {'status': 'error', 'message': 'No spectrum data yet'}
+
+            frequencies = self.frequencies
+            if name == 'persistence':
+                data = self.persistence / max(1.0, self.persistence.sum(axis=0).max())
+            else:
+                data = {
+                    'live': self.live,
+                    'max': self.max_hold,
+                    'min': self.min_hold,
+                    'avg': self.average
+                }.get(name)
+                if data is None:
+                    return {'status': 'error', 'message': f'Unknown view: {name}'}
+                data = data.copy()
+            frames = self.frames
+
+        if width and data.shape[-1] > width:
+            if name == 'min':
+                # Keep the quietest bin of each group for min-hold
+                data = -decimate_max(-data, width)
+            else:
+                data = decimate_max(data, width)
+            if frequencies is not None:
+                edges = (np.arange(width) * len(frequencies)) // width
+                frequencies = frequencies[edges]
+
+        result = {
+            'status': 'success',
+            'view': name,
+            'frames': frames,
+            'data': np.round(data, 4 if name == 'persistence' else 2).tolist(),
+            'frequencies': frequencies.tolist() if frequencies is not None else None
+        }
+        if name == 'persistence':
+            result['levels'] = np.linspace(self.floor_db, self.ceiling_db, self.levels).tolist()
+        return result
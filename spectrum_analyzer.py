@@ -8,17 +8,124 @@ import subprocess
 import numpy as np
 import json
 import time
+from contextlib import ExitStack, closing
 from datetime import datetime
 from pathlib import Path
+from signal_detector import SignalDetector
+from hop_detector import HopDetector
+from sweep_scheduler import SweepScheduler
+from rtl_power_parser import Sweep
+from spectrum_accumulator import decimate_max
+from iq_stream import SpectrumAverager, to_complex
 
 class SpectrumAnalyzer:
     """RTL-SDR based spectrum analyzer with waterfall"""
 
-    def __init__(self):
+    def __init__(self, multiplexer=None, rtl433=None):
+        """
+        Args:
+            multiplexer: Running IQMultiplexer, if one owns the RTL-SDR
+            rtl433: Rtl433Daemon, paused while rtl_power needs the RTL-SDR
+        """
+        self.multiplexer = multiplexer
+        self.rtl433 = rtl433
         self.scan_history = []
         self.max_history = 100
         self.data_dir = Path.home() / 'piflip' / 'spectrum_data'
         self.data_dir.mkdir(parents=True, exist_ok=True)
+        self.scheduler = SweepScheduler()
+
+    def _streaming(self):
+        return self.multiplexer is not None and self.multiplexer.status()['running']
+
+    def _device(self):
+        """Hand the RTL-SDR to rtl_power for the duration (pausing the multiplexer and rtl_433)"""
+        # rtl_433 first, so on exit it resumes after the stream it may listen to
+        stack = ExitStack()
+        if self.rtl433 is not None:
+            stack.enter_context(self.rtl433.released())
+        if self._streaming():
+            stack.enter_context(self.multiplexer.released())
+        return stack
+
+    def _stream_band(self, averager, start_freq, end_freq, bins):
+        """Slice an averaged stream spectrum to [start_freq, end_freq], at most `bins` wide"""
+        mux = self.multiplexer
+        freqs, db_values = averager.result(mux.sample_rate, mux.frequency)
+        keep = (freqs >= start_freq) & (freqs <= end_freq)
+        freqs, db_values = freqs[keep], db_values[keep]
+        if len(db_values) > bins:
+            db_values = decimate_max(db_values, bins)
+            freqs = np.linspace(freqs[0], freqs[-1], len(db_values))
+        return freqs, db_values
+
+    def _stream_fft_size(self, start_freq, end_freq, bins):
+        return 1 << int(np.ceil(np.log2(max(bins * self.multiplexer.sample_rate / (end_freq - start_freq), 64))))
+
+    def _stream_spectrum(self, start_freq, end_freq, bins):
+        """Spectrum of a span inside the multiplexer's band, from its live IQ"""
+        averager = SpectrumAverager(self._stream_fft_size(start_freq, end_freq, bins))
+        num_samples = int(0.1 * self.multiplexer.sample_rate)
+        with self.multiplexer.subscribe('spectrum') as subscription:
+            for block in subscription.blocks(num_samples):
+                averager.process(to_complex(block))
+        if averager.frames == 0:
+            return {'status': 'error', 'message': 'No samples from the IQ multiplexer'}
+
+        freqs, db_values = self._stream_band(averager, start_freq, end_freq, bins)
+        return {
+            'status': 'success',
+            'frequencies': freqs,
+            'powers': db_values,
+            'hops': 0,
+            'sweep_time': 0.1,
+            'sweep_rate_mhz_s': round((end_freq - start_freq) / 1e6 / 0.1, 2)
+        }
+
+    def _stream_sweeps(self, start_freq, end_freq, bins, interval):
+        """
+        Yield back-to-back spectra of the live IQ as rtl_power Sweeps (same
+        shape as SweepScheduler.stream); stops when the stream stalls
+        """
+        fft_size = self._stream_fft_size(start_freq, end_freq, bins)
+        per_scan = max(fft_size, int(interval * self.multiplexer.sample_rate))
+        with self.multiplexer.subscribe('spectrum-stream') as subscription:
+            while True:
+                averager = SpectrumAverager(fft_size)
+                for block in subscription.blocks(per_scan):
+                    averager.process(to_complex(block))
+                if averager.frames == 0:
+                    return
+                sweep = Sweep(datetime.now().strftime('%Y-%m-%d %H:%M:%S'), [])
+                sweep.frequencies, sweep.powers = self._stream_band(averager, start_freq, end_freq, bins)
+                yield sweep
+
+    def _stream_series(self, start_freq, end_freq, bins, interval, duration, progress=None):
+        """Back-to-back spectra of the live IQ (same shape as SweepScheduler.sweep_series)"""
+        powers = []
+        timestamps = []
+        freqs = None
+
+        deadline = time.time() + duration
+        sweeps = self._stream_sweeps(start_freq, end_freq, bins, interval)
+        with closing(sweeps):
+            for sweep in sweeps:
+                freqs = sweep.frequencies
+                powers.append(sweep.powers)
+                timestamps.append(sweep.received)
+                if progress:
+                    progress(f"{len(powers)} scans", min(99, 100 - (deadline - time.time()) * 100 // duration))
+                if time.time() >= deadline:
+                    break
+
+        if not powers:
+            return {'status': 'error', 'message': 'No samples from the IQ multiplexer'}
+        return {
+            'status': 'success',
+            'frequencies': freqs,
+            'powers': np.array(powers),
+            'timestamps': timestamps
+        }
 
     def quick_scan(self, center_freq=433.92, span=2.0, bins=256):
         """
@@ -33,50 +140,27 @@ class SpectrumAnalyzer:
         end_freq = (center_freq + span/2) * 1e6
 
         try:
-            # Use rtl_power for quick scan
-            result = subprocess.run(
-                ['rtl_power', '-f', f'{int(start_freq)}:{int(end_freq)}:1M',
-                 '-i', '0.1', '-1', '-'],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-
-            if result.returncode != 0:
-                return {
-                    'status': 'error',
-                    'message': 'RTL-SDR busy or not available'
-                }
-
-            # Parse rtl_power output
-            lines = [l for l in result.stdout.strip().split('\n') if l]
-
-            if not lines:
-                return {'status': 'error', 'message': 'No data received'}
-
-            parts = lines[-1].split(',')
-            if len(parts) < 7:
-                return {'status': 'error', 'message': 'Invalid data format'}
-
-            # Extract power values
-            db_values = [float(x) for x in parts[6:]]
+            if self._streaming() and self.multiplexer.covers(start_freq, end_freq):
+                # Already streaming this band - no need to take the device away
+                sweep = self._stream_spectrum(start_freq, end_freq, bins)
+            else:
+                # Tiled rtl_power sweep - spans wider than one hop are stitched
+                bin_size = self.scheduler.bin_size(start_freq, end_freq, bins)
+                with self._device():
+                    sweep = self.scheduler.sweep(start_freq, end_freq, bin_size, interval=0.1)
+            if sweep['status'] != 'success':
+                return sweep
 
-            # Calculate frequencies
-            freq_low = float(parts[2])
-            freq_high = float(parts[3])
-            freq_step = (freq_high - freq_low) / len(db_values)
+            freqs = sweep['frequencies']
+            db_values = sweep['powers']
 
-            spectrum = []
-            for i, db in enumerate(db_values):
-                freq = freq_low + (i * freq_step)
-                spectrum.append({
-                    'frequency': freq / 1e6,  # MHz
-                    'power': db
-                })
+            spectrum = [
+                {'frequency': freq / 1e6, 'power': db}  # MHz
+                for freq, db in zip(freqs.tolist(), db_values.tolist())
+            ]
 
             # Find peak
-            peak_idx = db_values.index(max(db_values))
-            peak_freq = freq_low + (peak_idx * freq_step)
+            peak_idx = int(np.argmax(db_values))
 
             return {
                 'status': 'success',
@@ -84,19 +168,20 @@ class SpectrumAnalyzer:
                 'center_freq': center_freq,
                 'span': span,
                 'bins': len(db_values),
+                'hops': sweep['hops'],
+                'sweep_time': sweep['sweep_time'],
+                'sweep_rate_mhz_s': sweep['sweep_rate_mhz_s'],
                 'peak': {
-                    'frequency': peak_freq / 1e6,
-                    'power': max(db_values)
+                    'frequency': float(freqs[peak_idx]) / 1e6,
+                    'power': float(db_values[peak_idx])
                 },
                 'timestamp': time.time()
             }
 
-        except subprocess.TimeoutExpired:
-            return {'status': 'error', 'message': 'Scan timeout'}
         except Exception as e:
             return {'status': 'error', 'message': str(e)}
 
-    def waterfall_scan(self, center_freq=433.92, span=2.0, duration=10, interval=0.2):
+    def waterfall_scan(self, center_freq=433.92, span=2.0, duration=10, interval=0.2, progress=None):
         """
         Continuous waterfall scan
 
@@ -105,58 +190,40 @@ class SpectrumAnalyzer:
             span: Frequency span in MHz
             duration: Scan duration in seconds
             interval: Time between scans in seconds
+            progress: Optional callback(stage, percent) after each scan
+                      (live IQ stream only; rtl_power reports once at start)
         """
         start_freq = (center_freq - span/2) * 1e6
         end_freq = (center_freq + span/2) * 1e6
 
-        waterfall_data = []
-        start_time = time.time()
-
         try:
-            while time.time() - start_time < duration:
-                # Quick scan
-                result = subprocess.run(
-                    ['rtl_power', '-f', f'{int(start_freq)}:{int(end_freq)}:1M',
-                     '-i', str(interval), '-1', '-'],
-                    capture_output=True,
-                    text=True,
-                    timeout=max(3, interval + 2)  # At least 3 seconds
-                )
-
-                if result.returncode == 0:
-                    lines = [l for l in result.stdout.strip().split('\n') if l]
-                    if lines:
-                        parts = lines[-1].split(',')
-                        if len(parts) >= 7:
-                            db_values = [float(x) for x in parts[6:]]
-                            waterfall_data.append({
-                                'timestamp': time.time(),
-                                'powers': db_values
-                            })
-
-                time.sleep(max(0, interval - 0.1))
-
-            # Calculate frequency bins (same for all scans)
-            if waterfall_data and lines:
-                parts = lines[-1].split(',')
-                freq_low = float(parts[2])
-                freq_high = float(parts[3])
-                num_bins = len(waterfall_data[0]['powers'])
-                freq_step = (freq_high - freq_low) / num_bins
-
-                frequencies = [freq_low + i * freq_step for i in range(num_bins)]
-
-                return {
-                    'status': 'success',
-                    'waterfall': waterfall_data,
-                    'frequencies': [f / 1e6 for f in frequencies],  # MHz
-                    'center_freq': center_freq,
-                    'span': span,
-                    'duration': duration,
-                    'scan_count': len(waterfall_data)
-                }
+            # One rtl_power running back-to-back sweeps instead of a relaunch per scan
+            if self._streaming() and self.multiplexer.covers(start_freq, end_freq):
+                series = self._stream_series(start_freq, end_freq, 256, interval, duration, progress)
             else:
-                return {'status': 'error', 'message': 'No data collected'}
+                bin_size = self.scheduler.bin_size(start_freq, end_freq, 256)
+                if progress:
+                    progress("Sweeping with rtl_power", 0)
+                with self._device():
+                    series = self.scheduler.sweep_series(start_freq, end_freq, bin_size,
+                                                         interval=interval, duration=duration)
+            if series['status'] != 'success' or len(series['powers']) == 0:
+                return {'status': 'error', 'message': series.get('message', 'No data collected')}
+
+            waterfall_data = [
+                {'timestamp': timestamp, 'powers': powers.tolist()}
+                for timestamp, powers in zip(series['timestamps'], series['powers'])
+            ]
+
+            return {
+                'status': 'success',
+                'waterfall': waterfall_data,
+                'frequencies': (series['frequencies'] / 1e6).tolist(),  # MHz
+                'center_freq': center_freq,
+                'span': span,
+                'duration': duration,
+                'scan_count': len(waterfall_data)
+            }
 
         except Exception as e:
             return {'status': 'error', 'message': str(e)}
@@ -183,25 +250,17 @@ class SpectrumAnalyzer:
 
         # Process each scan (newest at top)
         for scan in reversed(scans):
-            powers = scan['powers']
+            # Max-of-bins decimation so narrow peaks survive the resampling
+            powers = decimate_max(scan['powers'], width)
 
             # Normalize to character range
-            min_power = min(powers)
-            max_power = max(powers)
+            min_power = powers.min()
+            max_power = powers.max()
             power_range = max_power - min_power if max_power > min_power else 1
 
-            # Resample to width
-            step = len(powers) / width
-            resampled = []
-            for i in range(width):
-                idx = int(i * step)
-                power = powers[idx]
-                # Map to char index
-                normalized = (power - min_power) / power_range
-                char_idx = int(normalized * (len(chars) - 1))
-                resampled.append(chars[char_idx])
-
-            lines.append(''.join(resampled))
+            normalized = (powers - min_power) / power_range
+            char_idx = (normalized * (len(chars) - 1)).astype(int)
+            lines.append(''.join(chars[i] for i in char_idx))
 
         # Footer with frequency scale
         freq_min = waterfall_data['center_freq'] - waterfall_data['span']/2
@@ -211,93 +270,89 @@ class SpectrumAnalyzer:
 
         return '\n'.join(lines)
 
-    def detect_signals(self, spectrum_data, threshold_db=-80, min_width=0.05):
+    def detect_signals(self, spectrum_data, threshold_db=-80, min_width=0.05, snr_db=6.0):
         """
-        Detect signals in spectrum data
+        Detect signals in spectrum data against an adaptive noise floor
+
+        Accepts a quick_scan result or a whole waterfall_scan result, in
+        which case each signal also carries its time extent.
 
         Args:
-            spectrum_data: Spectrum scan result
-            threshold_db: Power threshold in dBm
+            spectrum_data: Spectrum or waterfall scan result
+            threshold_db: Absolute power floor in dBm (None to rely on CFAR only)
             min_width: Minimum signal width in MHz
+            snr_db: Required margin above the local noise floor in dB
         """
-        if spectrum_data['status'] != 'success':
+        if not spectrum_data or spectrum_data.get('status') != 'success':
             return {'status': 'error', 'message': 'Invalid spectrum data'}
 
-        spectrum = spectrum_data['spectrum']
-        signals = []
-
-        in_signal = False
-        signal_start = None
-        signal_freqs = []
-        signal_powers = []
-
-        for point in spectrum:
-            freq = point['frequency']
-            power = point['power']
-
-            if power > threshold_db:
-                if not in_signal:
-                    # Start of new signal
-                    in_signal = True
-                    signal_start = freq
-                    signal_freqs = [freq]
-                    signal_powers = [power]
-                else:
-                    # Continue signal
-                    signal_freqs.append(freq)
-                    signal_powers.append(power)
-            else:
-                if in_signal:
-                    # End of signal
-                    in_signal = False
-
-                    # Check if signal is wide enough
-                    signal_width = signal_freqs[-1] - signal_freqs[0]
-                    if signal_width >= min_width:
-                        # Calculate signal center and peak
-                        center_freq = (signal_freqs[0] + signal_freqs[-1]) / 2
-                        peak_power = max(signal_powers)
-
-                        signals.append({
-                            'center_freq': round(center_freq, 3),
-                            'start_freq': round(signal_freqs[0], 3),
-                            'end_freq': round(signal_freqs[-1], 3),
-                            'bandwidth': round(signal_width, 3),
-                            'peak_power': round(peak_power, 2),
-                            'avg_power': round(sum(signal_powers) / len(signal_powers), 2)
-                        })
+        if 'waterfall' in spectrum_data:
+            frequencies = spectrum_data['frequencies']
+            scans = spectrum_data['waterfall']
+            powers = np.array([scan['powers'] for scan in scans], dtype=np.float64)
+            timestamps = [scan['timestamp'] for scan in scans]
+        else:
+            spectrum = spectrum_data['spectrum']
+            frequencies = [point['frequency'] for point in spectrum]
+            powers = np.array([point['power'] for point in spectrum], dtype=np.float64)
+            timestamps = None
+
+        detector = SignalDetector(snr_db=snr_db)
+        result = detector.detect(powers, frequencies, timestamps,
+                                 min_power_db=threshold_db, min_width=min_width)
 
         return {
             'status': 'success',
-            'signals': signals,
-            'count': len(signals),
-            'threshold': threshold_db
+            'signals': result['signals'],
+            'count': len(result['signals']),
+            'threshold': threshold_db,
+            'snr_db': snr_db,
+            'noise_floor': result['noise_floor']
         }
 
-    def frequency_hopper_detect(self, duration=30):
-        """
-        Detect frequency hopping signals (Bluetooth, cordless phones, etc.)
+    def frequency_hopper_detect(self, duration=30, center_freq=433.92, span=2.0, interval=0.05,
+                                bin_size=10000, snr_db=8.0):
         """
-        # Scan wide range looking for hopping patterns
-        # This is advanced - requires multiple scans and correlation
+        Detect frequency hopping signals from rapid sweeps
 
-        scans = []
-        center_freqs = [2.44, 2.45, 2.46]  # 2.4 GHz ISM band
+        Note: RTL-SDR tops out around 1.7 GHz, so 2.4 GHz Bluetooth is out
+        of reach - use this on sub-GHz hoppers (915 MHz FHSS, LoRa, etc.)
 
-        for freq in center_freqs:
-            result = self.quick_scan(center_freq=freq, span=0.1, bins=512)
-            if result['status'] == 'success':
-                scans.append(result)
-            time.sleep(0.5)
+        Args:
+            duration: Capture duration in seconds
+            center_freq: Center frequency in MHz
+            span: Frequency span in MHz
+            interval: Integration time per sweep in seconds
+            bin_size: FFT bin size in Hz
+            snr_db: Occupancy threshold above the noise floor
+        """
+        start_freq = (center_freq - span/2) * 1e6
+        end_freq = (center_freq + span/2) * 1e6
 
-        # Analyze for hopping
-        # Look for signals appearing/disappearing across scans
+        try:
+            # One long-running rtl_power instead of repeated single scans
+            if self._streaming() and self.multiplexer.covers(start_freq, end_freq):
+                bins = max(16, int((end_freq - start_freq) / bin_size))
+                series = self._stream_series(start_freq, end_freq, bins, interval, duration)
+            else:
+                with self._device():
+                    series = self.scheduler.sweep_series(start_freq, end_freq, bin_size,
+                                                         interval=interval, duration=duration)
+            if series['status'] != 'success':
+                return series
+            if len(series['powers']) < 2:
+                return {'status': 'error', 'message': 'Not enough sweeps collected'}
+
+            analysis = HopDetector(snr_db=snr_db).analyze(
+                series['powers'], series['frequencies'] / 1e6, series['timestamps'])
+            analysis.update({
+                'center_freq': center_freq,
+                'span': span
+            })
+            return analysis
 
-        return {
-            'status': 'analysis_complete',
-            'scans': len(scans),
-            'note': 'Frequency hopping detection is experimental'
-        }
+        except Exception as e:
+            return {'status': 'error', 'message': str(e)}
 
     def save_scan(self, scan_data, name):
         """Save spectrum scan to file"""
@@ -324,14 +379,27 @@ class SpectrumAnalyzer:
         try:
             result = {'steps': []}
 
-            # Step 1: Kill any stuck rtl processes
-            kill_result = subprocess.run(
-                ['sudo', 'killall', '-9', 'rtl_power', 'rtl_fm', 'rtl_sdr', 'rtl_tcp', 'rtl_test'],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            result['steps'].append('Killed stuck RTL-SDR processes')
+            # Step 1: Stop the IQ multiplexer cleanly, then ask stray rtl tools to exit
+            streaming = self._streaming()
+            if self.multiplexer is not None:
+                self.multiplexer.stop()
+                result['steps'].append('Stopped IQ multiplexer')
+            if self.rtl433 is not None and self.rtl433.state != 'stopped':
+                # Restarted by the next 433 MHz query
+                self.rtl433.stop()
+                result['steps'].append('Stopped rtl_433 daemon')
+
+            tools = ['rtl_power', 'rtl_fm', 'rtl_sdr', 'rtl_tcp', 'rtl_test']
+            subprocess.run(['sudo', 'killall', '-TERM'] + tools, capture_output=True, text=True, timeout=5)
+            for _ in range(20):
+                if subprocess.run(['pgrep', '-x', '|'.join(tools)], capture_output=True).returncode != 0:
+                    break
+                time.sleep(0.1)
+            else:
+                # Still holding the device after 2 s - force it
+                subprocess.run(['sudo', 'killall', '-KILL'] + tools, capture_output=True, text=True, timeout=5)
+                result['steps'].append('Force-killed unresponsive RTL-SDR processes')
+            result['steps'].append('Stopped stray RTL-SDR processes')
 
             # Step 2: Reset USB device
             reset_result = subprocess.run(
@@ -366,6 +434,9 @@ class SpectrumAnalyzer:
 
             if 'Found 1 device' in test_result.stdout or 'Found 1 device' in test_result.stderr:
                 result['steps'].append('RTL-SDR device detected')
+                if streaming:
+                    self.multiplexer.start()
+                    result['steps'].append('Restarted IQ multiplexer')
                 result['status'] = 'success'
                 result['message'] = 'RTL-SDR reset successfully'
             else:
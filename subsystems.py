@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Subsystems for PiFlip
+Lazy module loading, background warm-up and import-time reporting
+
+web_interface used to import every module, hardware library and NumPy
+before Flask could serve a byte, and one missing library stopped the
+whole interface. Instead each subsystem is declared with lazy():
+
+    SpectrumAnalyzer = subsystems.lazy('spectrum_analyzer', 'SpectrumAnalyzer', group='spectrum')
+    GPIO = subsystems.lazy('RPi.GPIO', group='hardware')
+
+The name behaves like the real class or module (calls and attribute
+access are forwarded) but the import happens on first use. A missing
+library only fails the routes that need it, with the ImportError as the
+error message.
+
+warm_up() then imports everything in a background thread once the
+server is up and runs hardware probes (PN532 init etc.), so the first
+click rarely waits. Every import is timed: report() lists what each
+subsystem cost and how many modules it pulled in.
+"""
+
+import importlib
+import sys
+import threading
+import time
+
+
+class LazyImport:
+    """Stand-in for a module or module attribute, imported on first use"""
+
+    def __init__(self, registry, module, attribute=None):
+        self._registry = registry
+        self._module = module
+        self._attribute = attribute
+
+    def _target(self):
+        return self._registry.load(self._module, self._attribute)
+
+    def __call__(self, *args, **kwargs):
+        return self._target()(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._target(), name)
+
+    def __repr__(self):
+        name = f"{self._module}.{self._attribute}" if self._attribute else self._module
+        return f"<lazy {name}>"
+
+
+class SubsystemRegistry:
+    """Registry of lazily imported modules and deferred hardware probes"""
+
+    def __init__(self):
+        self.created = time.time()
+        self.subsystems = {}       # module -> state
+        self.probes = []           # (name, function)
+        self.probe_results = {}
+        self.listeners = []        # function(module) after each first load
+        self.lock = threading.RLock()
+        self.warm_thread = None
+        self.ready = None          # seconds from registry creation to mark_ready()
+        self.warmed = None         # seconds from registry creation to warm-up end
+
+    def lazy(self, module, attribute=None, group='core'):
+        """
+        Declare a subsystem and return its lazy stand-in
+
+        Args:
+            module: Module to import on first use
+            attribute: Attribute of the module to stand in for (None = the module)
+            group: Report grouping ('rf', 'nfc', 'hardware', ...)
+        """
+        with self.lock:
+            self.subsystems.setdefault(module, {
+                'module': module,
+                'group': group,
+                'status': 'pending',
+                'seconds': None,
+                'new_modules': 0,
+                'loaded_by': None,
+                'error': None
+            })
+        return LazyImport(self, module, attribute)
+
+    def probe(self, name, function):
+        """Register a hardware probe to run at the end of warm-up"""
+        self.probes.append((name, function))
+
+    def on_load(self, function):
+        """Call function(module) after each subsystem's first successful import"""
+        self.listeners.append(function)
+
+    def load(self, module, attribute=None):
+        """
+        Import a registered module (timed once) and return it or its attribute
+
+        Raises:
+            ImportError: If the module (or one of its libraries) is missing
+        """
+        state = self.subsystems.get(module)
+        loaded = sys.modules.get(module)
+        if loaded is None or state is None or state['status'] != 'loaded':
+            loaded = self._import(module)
+        return getattr(loaded, attribute) if attribute else loaded
+
+    def _import(self, module):
+        with self.lock:
+            state = self.subsystems.setdefault(module, {
+                'module': module, 'group': 'core', 'status': 'pending', 'seconds': None,
+                'new_modules': 0, 'loaded_by': None, 'error': None
+            })
+            if state['status'] == 'loaded':
+                return sys.modules[module]
+
+        # No registry lock while importing: importlib serialises per module,
+        # and a request should not wait for an unrelated warm-up import
+        before = len(sys.modules)
+        started = time.perf_counter()
+        try:
+            loaded = importlib.import_module(module)
+        except Exception as e:
+            with self.lock:
+                state.update(status='failed', error=f"{type(e).__name__}: {e}",
+                             seconds=round(time.perf_counter() - started, 4))
+            raise ImportError(f"{module} unavailable: {e}") from e
+
+        with self.lock:
+            first = state['status'] != 'loaded'
+            if first:
+                state.update(
+                    status='loaded',
+                    seconds=round(time.perf_counter() - started, 4),
+                    new_modules=max(0, len(sys.modules) - before),
+                    loaded_by=threading.current_thread().name,
+                    error=None
+                )
+        if first:
+            for listener in self.listeners:
+                try:
+                    listener(module)
+                except Exception as e:
+                    print(f"[!] {module} load listener failed: {e}")
+        return loaded
+
+    def available(self, module):
+        """Import a module if needed; False if it cannot be loaded"""
+        try:
+            self.load(module)
+            return True
+        except ImportError:
+            return False
+
+    # =========================================================================
+    # WARM-UP
+    # =========================================================================
+
+    def mark_ready(self):
+        """Record how long it took until the server could start"""
+        self.ready = round(time.time() - self.created, 3)
+
+    def warm_up(self, background=True):
+        """
+        Import every pending subsystem, then run the hardware probes
+
+        Args:
+            background: Run in a daemon thread (False = block until done)
+        """
+        if self.warm_thread and self.warm_thread.is_alive():
+            return self.warm_thread
+        if not background:
+            self._warm()
+            return None
+        self.warm_thread = threading.Thread(target=self._warm, name='subsystem-warm-up', daemon=True)
+        self.warm_thread.start()
+        return self.warm_thread
+
+    def _warm(self):
+        for module in list(self.subsystems):
+            if self.subsystems[module]['status'] == 'pending':
+                try:
+                    self._import(module)
+                except ImportError as e:
+                    print(f"[!] {e}")
+
+        for name, function in self.probes:
+            started = time.perf_counter()
+            try:
+                result = function()
+                self.probe_results[name] = {'status': 'ok', 'result': bool(result) if result is not None else None}
+            except Exception as e:
+                self.probe_results[name] = {'status': 'failed', 'error': str(e)}
+            self.probe_results[name]['seconds'] = round(time.perf_counter() - started, 4)
+
+        self.warmed = round(time.time() - self.created, 3)
+        report = self.report()
+        print(f"[+] Subsystems warm: {report['loaded']}/{report['total']} loaded in "
+              f"{report['import_seconds']:.2f}s ({report['failed']} failed)")
+        for state in report['subsystems'][:5]:
+            if state['seconds']:
+                print(f"    {state['module']:24s} {state['seconds'] * 1000:7.1f} ms  (+{state['new_modules']} modules)")
+
+    # =========================================================================
+    # REPORT
+    # =========================================================================
+
+    def report(self):
+        """Import cost per subsystem, most expensive first"""
+        with self.lock:
+            subsystems = [dict(state) for state in self.subsystems.values()]
+        subsystems.sort(key=lambda s: s['seconds'] or 0, reverse=True)
+
+        groups = {}
+        for state in subsystems:
+            group = groups.setdefault(state['group'], {'seconds': 0.0, 'loaded': 0, 'failed': 0})
+            group['seconds'] = round(group['seconds'] + (state['seconds'] or 0), 4)
+            if state['status'] in ('loaded', 'failed'):
+                group[state['status']] += 1
+
+        return {
+            'total': len(subsystems),
+            'loaded': sum(1 for s in subsystems if s['status'] == 'loaded'),
+            'failed': sum(1 for s in subsystems if s['status'] == 'failed'),
+            'pending': sum(1 for s in subsystems if s['status'] == 'pending'),
+            'import_seconds': round(sum(s['seconds'] or 0 for s in subsystems), 4),
+            'startup_seconds': self.ready,
+            'warm_up_seconds': self.warmed,
+            'warming': self.warm_thread is not None and self.warm_thread.is_alive(),
+            'groups': groups,
+            'probes': dict(self.probe_results),
+            'subsystems': subsystems
+        }
+
+
+# Shared registry (web_interface declares its subsystems here)
+subsystems = SubsystemRegistry()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Wideband Sweep Scheduler for PiFlip
+Tiles spans wider than the RTL-SDR bandwidth and stitches the hops
+
+rtl_power prints one line per tuning hop. Anything that only reads the
+last line loses every hop but one, so wide spans (e.g. a 300-930 MHz
+survey) need all hops collected, DC spikes removed and overlapping hop
+edges trimmed before they form one seamless spectrum.
+"""
+
+import subprocess
+import time
+
+import numpy as np
+from rtl_power_parser import RTLPowerParser
+
+
+class SweepScheduler:
+    """Plan, run and stitch multi-hop rtl_power sweeps"""
+
+    def __init__(self, sample_rate=2.4e6, crop=0.2, dc_bins=3):
+        """
+        Args:
+            sample_rate: RTL-SDR sample rate in Hz (sets the hop width)
+            crop: Fraction of each hop discarded at the filter edges
+            dc_bins: Bins around each hop centre treated as the DC spike
+        """
+        self.sample_rate = sample_rate
+        self.crop = crop
+        self.dc_bins = dc_bins
+
+    # =========================================================================
+    # PLANNING
+    # =========================================================================
+
+    def plan(self, start_hz, end_hz):
+        """
+        Tile a span into hops that fit the SDR's usable bandwidth
+
+        Returns:
+            Dict with hop width, hop count and the list of (low, high) tiles
+        """
+        usable = self.sample_rate * (1 - self.crop)
+        span = max(0.0, end_hz - start_hz)
+        hop_count = max(1, int(np.ceil(span / usable)))
+        hop_width = span / hop_count if span else usable
+
+        edges = start_hz + np.arange(hop_count + 1) * hop_width
+        tiles = [(float(edges[i]), float(edges[i + 1])) for i in range(hop_count)]
+
+        return {
+            'start_hz': start_hz,
+            'end_hz': end_hz,
+            'hop_width_hz': hop_width,
+            'hop_count': hop_count,
+            'tiles': tiles
+        }
+
+    @staticmethod
+    def bin_size(start_hz, end_hz, bins):
+        """FFT bin size in Hz for roughly `bins` bins across the span (1 kHz - 1 MHz)"""
+        return min(max((end_hz - start_hz) / max(1, bins), 1e3), 1e6)
+
+    def command(self, start_hz, end_hz, bin_hz=1e6, interval=0.1, single=True, exit_after=None):
+        """Build the rtl_power command for one back-to-back pass over every tile"""
+        cmd = ['rtl_power', '-f', f'{int(start_hz)}:{int(end_hz)}:{int(bin_hz)}',
+               '-i', str(interval)]
+        if self.crop:
+            cmd += ['-c', f'{int(self.crop * 100)}%']
+        if single:
+            cmd.append('-1')
+        elif exit_after:
+            cmd += ['-e', f'{int(exit_after)}s']
+        cmd.append('-')
+        return cmd
+
+    # =========================================================================
+    # STITCHING
+    # =========================================================================
+
+    def remove_dc(self, powers):
+        """Replace the DC spike at the hop centre with its neighbours' level"""
+        count = len(powers)
+        if self.dc_bins <= 0 or count < self.dc_bins + 4:
+            return powers
+        powers = powers.copy()
+        centre = count // 2
+        lo = centre - self.dc_bins // 2
+        hi = lo + self.dc_bins
+        neighbours = np.concatenate([powers[lo - 2:lo], powers[hi:hi + 2]])
+        powers[lo:hi] = np.median(neighbours)
+        return powers
+
+    def stitch(self, hops):
+        """
+        Stitch hops into one spectrum
+
+        Each hop keeps only the bins nearest its own centre: where two hops
+        overlap the boundary is the middle of the overlap.
+
+        Returns:
+            (frequencies_hz, powers) arrays in ascending frequency
+        """
+        if not hops:
+            return np.empty(0), np.empty(0)
+
+        hops = sorted(hops, key=lambda hop: hop[0])
+        frequencies = []
+        powers = []
+
+        for i, (hz_low, hz_high, hz_step, values) in enumerate(hops):
+            if len(values) == 0:
+                continue
+            step = hz_step if hz_step > 0 else (hz_high - hz_low) / len(values)
+            freqs = hz_low + np.arange(len(values)) * step
+            values = self.remove_dc(values)
+
+            lower = -np.inf
+            upper = np.inf
+            if i > 0 and hops[i - 1][1] > hz_low:
+                lower = (hops[i - 1][1] + hz_low) / 2
+            if i + 1 < len(hops) and hz_high > hops[i + 1][0]:
+                upper = (hz_high + hops[i + 1][0]) / 2
+            elif i + 1 < len(hops):
+                upper = hops[i + 1][0]
+
+            keep = (freqs >= lower) & (freqs < upper)
+            frequencies.append(freqs[keep])
+            powers.append(values[keep])
+
+        return np.concatenate(frequencies), np.concatenate(powers)
+
+    # =========================================================================
+    # SWEEPING
+    # =========================================================================
+
+    def parser(self, end_hz=None):
+        """rtl_power parser that stitches every sweep with this scheduler"""
+        return RTLPowerParser(end_hz=end_hz, stitch=self.stitch)
+
+    def sweep(self, start_hz, end_hz, bin_hz=1e6, interval=0.1, timeout=None):
+        """
+        Run one stitched sweep over [start_hz, end_hz]
+
+        Returns:
+            Dict with 'frequencies' (Hz), 'powers' (dB), hop count and the
+            measured sweep rate
+        """
+        plan = self.plan(start_hz, end_hz)
+        if timeout is None:
+            # Each hop needs the integration time plus retune/settle overhead
+            timeout = max(5, plan['hop_count'] * (interval + 0.05) + 5)
+
+        started = time.time()
+        try:
+            result = subprocess.run(
+                self.command(start_hz, end_hz, bin_hz, interval),
+                capture_output=True,
+                text=True,
+                timeout=timeout
+            )
+        except subprocess.TimeoutExpired:
+            return {'status': 'error', 'message': 'Sweep timeout'}
+        elapsed = time.time() - started
+
+        if result.returncode != 0 or 'usb_claim_interface' in result.stderr:
+            return {'status': 'error', 'message': 'RTL-SDR busy or not available'}
+
+        sweeps = self.parser().parse(result.stdout)
+        if not sweeps:
+            return {'status': 'error', 'message': 'No data received'}
+
+        sweep = sweeps[-1]
+        if len(sweep.powers) == 0:
+            return {'status': 'error', 'message': 'Invalid data format'}
+
+        return {
+            'status': 'success',
+            'frequencies': sweep.frequencies,
+            'powers': sweep.powers,
+            'hops': len(sweep.hops),
+            'planned_hops': plan['hop_count'],
+            'sweep_time': round(elapsed, 3),
+            'sweep_rate_mhz_s': round((end_hz - start_hz) / 1e6 / elapsed, 2) if elapsed > 0 else None,
+            'timestamp': sweep.timestamp
+        }
+
+    def stream(self, start_hz, end_hz, bin_hz=1e6, interval=0.1, duration=None):
+        """
+        Yield stitched sweeps from one long-running rtl_power as they complete
+
+        The rtl_power process is stopped when the generator is closed (e.g.
+        an SSE client disconnects) or `duration` seconds have passed.
+        """
+        process = subprocess.Popen(
+            self.command(start_hz, end_hz, bin_hz, interval, single=False, exit_after=duration),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1
+        )
+        try:
+            yield from self.parser(end_hz).iter_sweeps(process.stdout)
+        finally:
+            if process.poll() is None:
+                process.terminate()
+                try:
+                    process.wait(timeout=2)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+    def sweep_series(self, start_hz, end_hz, bin_hz=1e6, interval=0.1, duration=10):
+        """
+        Run back-to-back stitched sweeps for `duration` seconds in one rtl_power
+
+        Sweeps are timestamped as they arrive (rtl_power's own timestamps
+        only have one second resolution). Incomplete sweeps, e.g. cut off
+        by the exit timer, are dropped.
+
+        Returns:
+            Dict with 'frequencies' (Hz), 'powers' (sweeps x bins) and 'timestamps'
+        """
+        sweeps = []
+        deadline = time.time() + duration + 10
+        for sweep in self.stream(start_hz, end_hz, bin_hz, interval, duration):
+            sweeps.append(sweep)
+            if time.time() > deadline:
+                break
+
+        if not sweeps:
+            return {'status': 'error', 'message': 'No data collected - RTL-SDR busy or not available'}
+
+        num_bins = max(len(sweep.powers) for sweep in sweeps)
+        sweeps = [sweep for sweep in sweeps if len(sweep.powers) == num_bins]
+
+        return {
+            'status': 'success',
+            'frequencies': sweeps[0].frequencies,
+            'powers': np.array([sweep.powers for sweep in sweeps]),
+            'timestamps': [sweep.received for sweep in sweeps]
+        }
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Triggered Recorder for PiFlip
+Squelch-triggered IQ recording with pre-roll and hang time
+
+Instead of recording long files and searching them for an intermittent
+transmitter, the recorder watches channel power on the live IQ stream:
+
+- power is measured over short windows (1 ms by default), optionally
+  after a channel filter around an offset from the tuned frequency
+- the noise floor is the median of recent quiet windows; a window
+  `threshold_db` above it opens an event
+- the event starts `pre_roll` seconds before the trigger, taken from a
+  RAM ring of the most recent blocks, so the start of the transmission
+  is never lost
+- it closes once the power has stayed below the threshold for
+  `hang_time` seconds (or at `max_duration`)
+
+Each event becomes its own capture (.cu8 plus the usual .json metadata
+with a `trigger` section), ready for an analysis job.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+import metrics
+from iq_stream import FIRFilter, Mixer, to_complex
+
+
+class TriggeredRecorder:
+    """Record a capture per burst of channel energy on an IQ stream"""
+
+    def __init__(self, frequency=433920000, sample_rate=2048000, capture_dir="~/piflip/captures",
+                 threshold_db=10.0, pre_roll=0.25, hang_time=0.5, max_duration=30.0,
+                 min_duration=0.002, offset_hz=0, bandwidth_hz=None, window_ms=1.0,
+                 prefix='trigger', on_capture=None):
+        """
+        Args:
+            frequency: Tuned centre frequency (Hz, for metadata)
+            sample_rate: Stream sample rate in Hz
+            capture_dir: Where captures are written
+            threshold_db: Window power above the noise floor that opens an event
+            pre_roll: Seconds kept before the trigger
+            hang_time: Seconds below threshold that close an event
+            max_duration: Longest event in seconds (a new one follows if still active)
+            min_duration: Events with less active time are discarded
+            offset_hz: Channel offset from the tuned frequency
+            bandwidth_hz: Channel width to watch (None = whole stream)
+            window_ms: Power measurement window
+            prefix: Capture name prefix
+            on_capture: Called with the metadata of every saved capture
+        """
+        self.frequency = frequency
+        self.sample_rate = sample_rate
+        self.capture_dir = os.path.expanduser(capture_dir)
+        os.makedirs(self.capture_dir, exist_ok=True)
+        self.threshold_db = threshold_db
+        self.pre_roll = int(pre_roll * sample_rate)
+        self.hang = int(hang_time * sample_rate)
+        self.max_samples = int(max_duration * sample_rate)
+        self.min_active = int(min_duration * sample_rate)
+        self.offset_hz = offset_hz
+        self.bandwidth_hz = bandwidth_hz
+        self.window = max(16, int(window_ms * sample_rate / 1000))
+        self.prefix = prefix
+        self.on_capture = on_capture
+
+        self.mixer = Mixer(offset_hz, sample_rate) if offset_hz else None
+        self.channel_filter = None
+        if bandwidth_hz:
+            length = max(1, int(sample_rate / bandwidth_hz))
+            self.channel_filter = FIRFilter(np.ones(length, dtype=np.float32) / length)
+
+        self.recent = deque()          # (position, block) of the last pre_roll samples
+        self.recent_samples = 0
+        self.carry = np.empty((0, 2), dtype=np.uint8)
+        self.position = 0              # stream samples consumed (window-aligned)
+        self.noise_history = deque(maxlen=2000)
+
+        self.event = None
+        self.captures = deque(maxlen=100)
+        self.discarded = 0
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stopping = threading.Event()
+        self.started = None
+
+    # =========================================================================
+    # DETECTION
+    # =========================================================================
+
+    @property
+    def noise_floor(self):
+        return float(np.median(self.noise_history)) if self.noise_history else None
+
+    def threshold(self):
+        floor = self.noise_floor
+        return None if floor is None else floor * 10 ** (self.threshold_db / 10)
+
+    def window_power(self, block):
+        """Mean power of every window of a window-aligned (samples x 2) block"""
+        samples = to_complex(block)
+        if self.mixer is not None:
+            samples = self.mixer.process(samples)
+        if self.channel_filter is not None:
+            samples = self.channel_filter.process(samples)
+        power = samples.real ** 2 + samples.imag ** 2
+        return power.reshape(-1, self.window).mean(axis=1)
+
+    def process(self, block, arrival=None):
+        """
+        Feed (samples x 2) uint8 I/Q
+
+        Args:
+            arrival: Wall-clock time the last sample was received (default now)
+
+        Returns:
+            Metadata of the captures completed by this block
+        """
+        arrival = arrival or time.time()
+        if len(self.carry):
+            block = np.concatenate([self.carry, block])
+        usable = len(block) - len(block) % self.window
+        self.carry = block[usable:].copy()
+        block = block[:usable]
+        if not len(block):
+            return []
+
+        start = self.position
+        self.position += len(block)
+        end_time = arrival - len(self.carry) / self.sample_rate
+
+        power = self.window_power(block)
+        threshold = self.threshold()
+        if threshold is None:
+            # Nothing to compare against yet - learn the floor from this block
+            self.noise_history.append(float(np.percentile(power, 20)))
+            self._remember(start, block)
+            return []
+
+        hot = power > threshold
+        completed = []
+        cursor = 0
+        while cursor < len(block):
+            if self.event is None:
+                first = np.flatnonzero(hot[cursor // self.window:])
+                if not len(first):
+                    break
+                trigger = (cursor // self.window + int(first[0])) * self.window
+                self._open(start + trigger, block[:trigger], start, end_time, float(power[trigger // self.window]))
+                cursor = trigger
+
+            # Hot windows from here on; the event ends at the first gap of hang_time
+            active = np.flatnonzero(hot[cursor // self.window:]) + cursor // self.window
+            begins = start + active * self.window
+            ends = begins + self.window
+            previous = np.concatenate([[self.event['last_active']], ends[:-1]])
+            breaks = np.flatnonzero(begins - previous >= self.hang)
+            count = int(breaks[0]) if len(breaks) else len(active)
+            last_active = int(previous[count]) if count < len(active) else (
+                int(ends[-1]) if len(active) else self.event['last_active'])
+
+            close_at = min(last_active + self.hang, self.event['start'] + self.max_samples)
+            inside = active[:count][begins[:count] < close_at]
+            if len(inside):
+                self.event['active'] += len(inside) * self.window
+                self.event['peak'] = max(self.event['peak'], float(power[inside].max()))
+            self.event['last_active'] = min(last_active, close_at)
+
+            if close_at > start + len(block):
+                self._write(block[cursor:])
+                break
+            end = max(close_at - start, cursor)
+            self._write(block[cursor:end])
+            completed.extend(self._close())
+            cursor = end
+
+        if self.event is None and not completed and not hot.any():
+            self.noise_history.append(float(np.median(power)))
+        self._remember(start, block)
+        return completed
+
+    def _remember(self, start, block):
+        """Keep the last pre_roll samples in RAM"""
+        if self.pre_roll <= 0:
+            return
+        self.recent.append((start, block.copy()))
+        self.recent_samples += len(block)
+        while self.recent and self.recent_samples - len(self.recent[0][1]) >= self.pre_roll:
+            self.recent_samples -= len(self.recent.popleft()[1])
+
+    # =========================================================================
+    # EVENTS
+    # =========================================================================
+
+    def _open(self, trigger, before, block_start, end_time, power):
+        stamp = end_time - (self.position - trigger) / self.sample_rate
+        name = f"{self.prefix}_{datetime.fromtimestamp(stamp).strftime('%Y%m%d_%H%M%S')}_{int(stamp * 1000) % 1000:03d}"
+        path = os.path.join(self.capture_dir, f"{name}.cu8")
+        handle = open(path, 'wb')
+
+        # Pre-roll: the RAM history, then this block up to the trigger
+        first = trigger - self.pre_roll
+        for position, old in self.recent:
+            if position + len(old) > first:
+                handle.write(old[max(0, first - position):].tobytes())
+        handle.write(before[max(0, first - block_start):].tobytes())
+
+        self.event = {
+            'name': name,
+            'path': path,
+            'handle': handle,
+            'start': max(trigger - self.pre_roll, block_start - self.recent_samples, 0),
+            'trigger': trigger,
+            'trigger_time': stamp,
+            'last_active': trigger,
+            'active': 0,
+            'peak': power,
+            'noise_floor': self.noise_floor
+        }
+        print(f"[*] Trigger: {name} ({10 * np.log10(max(power, 1e-20) / max(self.noise_floor, 1e-20)):.1f} dB)")
+
+    def _write(self, samples):
+        if len(samples):
+            self.event['handle'].write(samples.tobytes())
+
+    def _close(self):
+        event, self.event = self.event, None
+        event['handle'].close()
+
+        if event['active'] < self.min_active:
+            os.remove(event['path'])
+            self.discarded += 1
+            return []
+
+        num_samples = os.path.getsize(event['path']) // 2
+        metrics.library_io(event['path'], 'written', num_samples * 2)
+        floor = max(event['noise_floor'], 1e-20)
+        metadata = {
+            'name': event['name'],
+            'filename': os.path.basename(event['path']),
+            'frequency': self.frequency + self.offset_hz,
+            'sample_rate': self.sample_rate,
+            'duration': round(num_samples / self.sample_rate, 3),
+            'num_samples': num_samples,
+            'timestamp': datetime.fromtimestamp(event['trigger_time']).isoformat(),
+            'file_size': num_samples * 2,
+            'trigger': {
+                'source': 'squelch',
+                'threshold_db': self.threshold_db,
+                'noise_floor_db': round(10 * np.log10(floor), 1),
+                'peak_db': round(10 * np.log10(max(event['peak'], 1e-20)), 1),
+                'snr_db': round(10 * np.log10(max(event['peak'], 1e-20) / floor), 1),
+                'pre_roll': round(min(self.pre_roll, event['trigger'] - event['start']) / self.sample_rate, 3),
+                'hang_time': round(self.hang / self.sample_rate, 3),
+                'active_time': round(event['active'] / self.sample_rate, 4),
+                'tuned_frequency': self.frequency,
+                'bandwidth_hz': self.bandwidth_hz
+            }
+        }
+        with open(os.path.join(self.capture_dir, f"{event['name']}.json"), 'w') as f:
+            json.dump(metadata, f, indent=2)
+
+        with self.lock:
+            self.captures.append(metadata)
+        print(f"[+] Triggered capture saved: {event['name']} ({metadata['duration']}s)")
+
+        if self.on_capture:
+            try:
+                self.on_capture(metadata)
+            except Exception as e:
+                print(f"[!] Triggered capture callback failed: {e}")
+        return [metadata]
+
+    def flush(self):
+        """Close an event still open (e.g. when stopping)"""
+        if self.event is None:
+            return []
+        return self._close()
+
+    # =========================================================================
+    # LIVE
+    # =========================================================================
+
+    def start(self, multiplexer):
+        """Watch the live stream of an IQMultiplexer in a background thread"""
+        if self.thread and self.thread.is_alive():
+            return self.status()
+        self.stopping.clear()
+        self.started = time.time()
+        self.thread = threading.Thread(target=self._run, args=(multiplexer,),
+                                       name='triggered-recorder', daemon=True)
+        self.thread.start()
+        return self.status()
+
+    def _run(self, multiplexer):
+        with multiplexer.subscribe('triggered-recorder') as subscription:
+            while not self.stopping.is_set():
+                if subscription.retuned:
+                    print("[!] Triggered recorder stopped: IQ multiplexer was retuned")
+                    break
+                block = subscription.read(1 << 16, timeout=1.0)
+                if block is not None and len(block):
+                    self.process(block)
+        self.flush()
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread:
+            self.thread.join(timeout=5)
+        self.thread = None
+
+    def status(self):
+        floor = self.noise_floor
+        with self.lock:
+            captures = list(self.captures)
+        return {
+            'running': self.thread is not None and self.thread.is_alive(),
+            'recording': self.event['name'] if self.event else None,
+            'frequency': self.frequency + self.offset_hz,
+            'sample_rate': self.sample_rate,
+            'threshold_db': self.threshold_db,
+            'noise_floor_db': round(10 * np.log10(max(floor, 1e-20)), 1) if floor else None,
+            'pre_roll': round(self.pre_roll / self.sample_rate, 3),
+            'hang_time': round(self.hang / self.sample_rate, 3),
+            'seconds_watched': round(self.position / self.sample_rate, 1),
+            'capture_count': len(captures),
+            'discarded': self.discarded,
+            'captures': captures[::-1]
+        }
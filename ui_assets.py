@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+UI Assets for PiFlip
+Fingerprinted, precompressed build of the single-page UI
+
+templates/flipper_ui.html (~250 KB of inline CSS and JS) used to be
+rendered and sent uncompressed on every page load. The build step:
+
+- moves the inline <style> and <script> into ui.<hash>.css / ui.<hash>.js
+  (content-hashed names, so they can be cached for a year)
+- writes gzip (and brotli, if the module is installed) versions of
+  the page and every asset next to the originals
+- records sizes and strong ETags in manifest.json
+
+serve() answers with the best encoding the client accepts, a strong
+ETag and 304 Not Modified on a match. The page itself must revalidate
+(it names the current assets); fingerprinted assets are immutable.
+
+Run `python3 ui_assets.py build` after editing the template; the web
+interface also rebuilds on startup when the template is newer than the
+build.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+BASE_DIR = Path(__file__).resolve().parent
+TEMPLATE = BASE_DIR / "templates" / "flipper_ui.html"
+BUILD_DIR = BASE_DIR / "build" / "ui"
+
+ASSET_CACHE = "public, max-age=31536000, immutable"
+PAGE_CACHE = "no-cache"
+CONTENT_TYPES = {
+    '.html': 'text/html; charset=utf-8',
+    '.css': 'text/css; charset=utf-8',
+    '.js': 'application/javascript; charset=utf-8'
+}
+# Encodings in order of preference: (token, file suffix, ETag suffix)
+ENCODINGS = (('br', '.br', '-br'), ('gzip', '.gz', '-gz'))
+
+
+def fingerprint(data, length=12):
+    return hashlib.sha256(data).hexdigest()[:length]
+
+
+# =============================================================================
+# BUILD
+# =============================================================================
+
+def split_page(html):
+    """
+    Move the first inline <style> and the inline <script> blocks out of a page
+
+    Returns:
+        (html with placeholders, css text, js text)
+    """
+    css = ''
+    style = re.search(r'<style>(.*?)</style>', html, re.S)
+    if style:
+        css = style.group(1)
+        html = html[:style.start()] + '<!--PIFLIP_CSS-->' + html[style.end():]
+
+    scripts = []
+
+    def take(match):
+        scripts.append(match.group(1))
+        return '<!--PIFLIP_JS-->' if len(scripts) == 1 else ''
+
+    html = re.sub(r'<script>(.*?)</script>', take, html, flags=re.S)
+    return html, css, ';\n'.join(scripts)
+
+
+def _write(path, data):
+    """Write a file plus its precompressed versions; returns the size entry"""
+    path.write_bytes(data)
+    sizes = {'identity': len(data)}
+
+    gz = gzip.compress(data, compresslevel=9, mtime=0)
+    path.with_name(path.name + '.gz').write_bytes(gz)
+    sizes['gzip'] = len(gz)
+
+    if brotli is not None:
+        br = brotli.compress(data, quality=11)
+        path.with_name(path.name + '.br').write_bytes(br)
+        sizes['br'] = len(br)
+    return sizes
+
+
+def build(template=TEMPLATE, build_dir=BUILD_DIR):
+    """
+    Build the UI: fingerprinted CSS/JS, page, compressed variants, manifest
+
+    Returns:
+        The manifest dict
+    """
+    template = Path(template)
+    build_dir = Path(build_dir)
+    build_dir.mkdir(parents=True, exist_ok=True)
+
+    html, css, js = split_page(template.read_text(encoding='utf-8'))
+    files = {}
+
+    for text, extension, tag in ((css, '.css', '<link rel="stylesheet" href="/assets/{}">'),
+                                 (js, '.js', '<script src="/assets/{}"></script>')):
+        if not text.strip():
+            continue
+        data = text.encode('utf-8')
+        name = f"ui.{fingerprint(data)}{extension}"
+        files[name] = {'etag': fingerprint(data, 32), 'sizes': _write(build_dir / name, data)}
+        html = html.replace(f'<!--PIFLIP_{extension[1:].upper()}-->', tag.format(name), 1)
+
+    page = html.encode('utf-8')
+    files['index.html'] = {'etag': fingerprint(page, 32), 'sizes': _write(build_dir / 'index.html', page)}
+
+    # Drop assets of earlier builds
+    for old in build_dir.glob('ui.*'):
+        if old.name.split('.gz')[0].split('.br')[0] not in files:
+            old.unlink()
+
+    manifest = {
+        'source': str(template),
+        'source_mtime': template.stat().st_mtime,
+        'source_size': template.stat().st_size,
+        'built': time.time(),
+        'brotli': brotli is not None,
+        'files': files
+    }
+    tmp_file = build_dir / 'manifest.json.tmp'
+    tmp_file.write_text(json.dumps(manifest, indent=2))
+    os.replace(tmp_file, build_dir / 'manifest.json')
+    return manifest
+
+
+# =============================================================================
+# SERVING
+# =============================================================================
+
+class UIAssets:
+    """Serve a UI build with content negotiation, ETags and 304s"""
+
+    def __init__(self, template=TEMPLATE, build_dir=BUILD_DIR, auto_build=True):
+        """
+        Args:
+            template: Source page
+            build_dir: Build output directory
+            auto_build: Rebuild when the template is newer than the build
+        """
+        self.template = Path(template)
+        self.build_dir = Path(build_dir)
+        self.auto_build = auto_build
+        self.manifest = None
+        self.cache = {}            # (name, encoding) -> bytes
+        self.lock = threading.Lock()
+        self.served = {'200': 0, '304': 0, 'bytes': 0}
+
+    def load(self):
+        """Load (and if needed rebuild) the manifest; False if there is no build"""
+        with self.lock:
+            manifest_file = self.build_dir / 'manifest.json'
+            manifest = None
+            if manifest_file.exists():
+                manifest = json.loads(manifest_file.read_text())
+
+            stale = manifest is None or (
+                self.template.exists() and self.template.stat().st_mtime != manifest['source_mtime'])
+            if stale and self.auto_build and self.template.exists():
+                print("[*] Building UI assets...")
+                manifest = build(self.template, self.build_dir)
+                page = manifest['files']['index.html']['sizes']
+                print(f"[+] UI built: page {page['identity'] // 1024} KB -> {page['gzip'] // 1024} KB gzip")
+
+            self.manifest = manifest
+            self.cache.clear()
+            return manifest is not None
+
+    def ready(self):
+        if self.manifest is None:
+            return self.load()
+        if self.auto_build and self.template.exists() \
+                and self.template.stat().st_mtime != self.manifest['source_mtime']:
+            return self.load()
+        return True
+
+    def _body(self, name, suffix):
+        key = (name, suffix)
+        body = self.cache.get(key)
+        if body is None:
+            body = (self.build_dir / (name + suffix)).read_bytes()
+            self.cache[key] = body
+        return body
+
+    def serve(self, name, accept_encoding='', if_none_match=''):
+        """
+        Response parts for a built file
+
+        Args:
+            name: 'index.html' or a fingerprinted asset name
+            accept_encoding: Request Accept-Encoding header
+            if_none_match: Request If-None-Match header
+
+        Returns:
+            (status, body bytes, headers dict), or None if the file is not in the build
+        """
+        if not self.ready():
+            return None
+        entry = self.manifest['files'].get(name)
+        if entry is None:
+            return None
+
+        accepted = {token.split(';')[0].strip() for token in accept_encoding.split(',')
+                    if not token.strip().endswith(';q=0')}
+        encoding, suffix, etag_suffix = None, '', ''
+        for token, file_suffix, tag_suffix in ENCODINGS:
+            if token in accepted and token in entry['sizes']:
+                encoding, suffix, etag_suffix = token, file_suffix, tag_suffix
+                break
+
+        etag = f'"{entry["etag"]}{etag_suffix}"'
+        headers = {
+            'ETag': etag,
+            'Cache-Control': PAGE_CACHE if name == 'index.html' else ASSET_CACHE,
+            'Vary': 'Accept-Encoding'
+        }
+
+        # Any encoding of the same content counts as a match
+        tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+        if '*' in tags or any(tag.strip('"').split('-')[0] == entry['etag'] for tag in tags if tag):
+            self.served['304'] += 1
+            return 304, b'', headers
+
+        body = self._body(name, suffix)
+        headers['Content-Type'] = CONTENT_TYPES.get(Path(name).suffix, 'application/octet-stream')
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        self.served['200'] += 1
+        self.served['bytes'] += len(body)
+        return 200, body, headers
+
+    def status(self):
+        if self.manifest is None:
+            return {'built': False}
+        return {
+            'built': True,
+            'brotli': self.manifest['brotli'],
+            'built_at': self.manifest['built'],
+            'files': {name: entry['sizes'] for name, entry in self.manifest['files'].items()},
+            'served': dict(self.served)
+        }
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] != 'build':
+        print("Usage: ui_assets.py build [template] [build_dir]")
+        sys.exit(1)
+    template = sys.argv[2] if len(sys.argv) > 2 else TEMPLATE
+    build_dir = sys.argv[3] if len(sys.argv) > 3 else BUILD_DIR
+    manifest = build(template, build_dir)
+    print(f"[+] Built {build_dir}" + ("" if manifest['brotli'] else " (brotli not installed: gzip only)"))
+    for name, entry in manifest['files'].items():
+        sizes = ', '.join(f"{encoding} {size / 1024:.1f} KB" for encoding, size in entry['sizes'].items())
+        print(f"    {name:24s} {sizes}")
+
+
+if __name__ == '__main__':
+    main()
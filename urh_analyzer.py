@@ -9,6 +9,11 @@ import sys
 import json
 import subprocess
 from pathlib import Path
+from ook_demodulator import OOKDemodulator
+from fsk_demodulator import FSKDemodulator
+from modulation_classifier import ModulationClassifier
+from waveform_generator import timing_columns
+from burst_store import BurstStore
 
 class URHAnalyzer:
     """Wrapper for Universal Radio Hacker CLI operations"""
@@ -17,6 +22,7 @@ class URHAnalyzer:
         self.capture_dir = Path(os.path.expanduser(capture_dir))
         self.decoded_dir = Path(os.path.expanduser(decoded_dir))
         self.decoded_dir.mkdir(parents=True, exist_ok=True)
+        self.bursts = BurstStore(capture_dir)
 
     def analyze_capture(self, capture_name):
         """
@@ -26,8 +32,12 @@ class URHAnalyzer:
         capture_file = self.capture_dir / f"{capture_name}.cu8"
         metadata_file = self.capture_dir / f"{capture_name}.json"
 
-        if not capture_file.exists():
+        sparse = not capture_file.exists() and self.bursts.is_sparse(capture_name)
+        if not capture_file.exists() and not sparse:
             return {'error': f'Capture file not found: {capture_name}'}
+        if sparse:
+            # Burst-only storage (original .cu8 discarded when packed)
+            capture_file = self.bursts.data_file(capture_name)
 
         # Load metadata
         metadata = {}
@@ -47,6 +57,7 @@ class URHAnalyzer:
                 'file': str(capture_file),
                 'file_size': capture_file.stat().st_size,
                 'metadata': metadata,
+                'sparse': sparse,
                 'status': 'analyzed',
                 'note': 'URH installed - GUI analysis available. CLI automation coming next.'
             }
@@ -69,9 +80,11 @@ class URHAnalyzer:
             return "No timing data available"
 
         timings = signal_data['timings']
+        if sum(t['duration_us'] for t in timings) == 0:
+            return "No timing data available"
 
-        # Calculate total duration
-        total_duration = sum(t['duration_us'] for t in timings)
+        # Column levels located by binary search over the timings (O(width log N))
+        maxs = timing_columns(timings, width)
 
         # Create waveform
         waveform = []
@@ -79,15 +92,9 @@ class URHAnalyzer:
             waveform.append([' '] * width)
 
         # Draw signal
-        x = 0
-        for timing in timings:
-            # Calculate width for this timing
-            timing_width = int((timing['duration_us'] / total_duration) * width)
-            if timing_width < 1:
-                timing_width = 1
-
+        for x, level in enumerate(maxs):
             # Determine y position (high or low)
-            if timing['state'] == 1:  # HIGH
+            if level:  # HIGH
                 y_start = 0
                 y_end = height // 2
             else:  # LOW
@@ -95,15 +102,8 @@ class URHAnalyzer:
                 y_end = height
 
             # Draw the signal level
-            for i in range(timing_width):
-                if x + i >= width:
-                    break
-                for y in range(y_start, y_end):
-                    waveform[y][x + i] = '█'
-
-            x += timing_width
-            if x >= width:
-                break
+            for y in range(y_start, y_end):
+                waveform[y][x] = '█'
 
         # Convert to string
         output = []
@@ -112,23 +112,79 @@ class URHAnalyzer:
 
         return '\n'.join(output)
 
-    def demodulate_signal(self, capture_name, modulation='ASK'):
+    def demodulate_signal(self, capture_name, modulation='auto'):
         """
         Demodulate captured signal
-        modulation: ASK, FSK, PSK, etc.
+        modulation: auto (classify first), ASK, FSK, PSK, etc.
         """
         capture_file = self.capture_dir / f"{capture_name}.cu8"
 
-        if not capture_file.exists():
+        sparse = not capture_file.exists() and self.bursts.is_sparse(capture_name)
+        if not capture_file.exists() and not sparse:
             return {'error': 'Capture not found'}
+        if sparse:
+            # Burst-only storage: demodulate on the original timeline, gaps as DC
+            capture_file = self.bursts.stream(capture_name)
+
+        metadata = {}
+        metadata_file = self.capture_dir / f"{capture_name}.json"
+        if metadata_file.exists():
+            with open(metadata_file, 'r') as f:
+                metadata = json.load(f)
+
+        sample_rate = metadata.get('sample_rate') or 2048000
+
+        classification = None
+        if modulation.lower() == 'auto':
+            classification = ModulationClassifier(sample_rate=sample_rate).classify(capture_file)
+            modulation = classification['modulation']
+            if modulation == 'unknown':
+                modulation = 'OOK'
+
+        if modulation.upper() not in ('ASK', 'OOK', 'FSK', 'GFSK'):
+            # Only ASK/OOK and FSK are demodulated in-process so far
+            return {
+                'capture': capture_name,
+                'modulation': modulation,
+                'classification_confidence': classification['confidence'] if classification else None,
+                'status': 'ready for GUI analysis',
+                'instructions': f'Open URH and load: {capture_file}' if not sparse else
+                                f'Unpack the capture (BurstStore.unpack) and load it in URH: {capture_name}'
+            }
+
+        if modulation.upper() in ('FSK', 'GFSK'):
+            demod = FSKDemodulator(sample_rate=sample_rate).demodulate(capture_file)
+            if demod['status'] == 'error':
+                return {'error': demod['message']}
+            return {
+                'capture': capture_name,
+                'modulation': modulation,
+                'classification_confidence': classification['confidence'] if classification else None,
+                'status': 'demodulated' if demod['timings'] else 'no_signal',
+                'timings': demod['timings'],
+                'bit_string': demod.get('bit_string', ''),
+                'symbol_rate': demod.get('symbol_rate'),
+                'deviation_hz': demod.get('deviation_hz'),
+                'offset_hz': demod.get('offset_hz'),
+                'bursts': demod['bursts'],
+                'waveform': self.generate_ascii_waveform(demod)
+            }
+
+        demodulator = OOKDemodulator(sample_rate=sample_rate)
+        demod = demodulator.demodulate(capture_file)
+        if demod['status'] == 'error':
+            return {'error': demod['message']}
 
-        # For now, return info about the signal
-        # Full demodulation requires URH Python API or GUI
         return {
             'capture': capture_name,
             'modulation': modulation,
-            'status': 'ready for GUI analysis',
-            'instructions': f'Open URH and load: {capture_file}'
+            'classification_confidence': classification['confidence'] if classification else None,
+            'status': 'demodulated' if demod['timings'] else 'no_signal',
+            'timings': demod['timings'],
+            'pulse_count': demod['pulse_count'],
+            'shortest_pulse_us': demod['shortest_pulse_us'],
+            'longest_pulse_us': demod['longest_pulse_us'],
+            'waveform': self.generate_ascii_waveform(demod)
         }
 
     def extract_protocol(self, capture_name):
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Virtual SDR for PiFlip
+Replay .cu8 captures (or synthesized IQ) in place of the RTL-SDR
+
+A VirtualSDR is an IQMultiplexer source: the multiplexer calls it with
+the tuned frequency, sample rate and gain and streams the byte chunks it
+yields, exactly as it streams rtl_sdr's output. Everything downstream -
+spectrum scans, waterfalls, captures, the channelizer, the triggered
+recorder, rtl_tcp clients - runs unchanged, with no dongle attached.
+
+- realtime=True paces chunks at the sample rate (latency tests, UI work)
+- realtime=False yields as fast as consumers keep up (throughput tests)
+- a retune within the recorded band shifts the stream in frequency;
+  outside it only noise is left
+- synthesize() builds reproducible test signals (OOK, FSK, tones) over
+  a seeded noise floor
+
+Run `python3 virtual_sdr.py bench <capture.cu8>` to time the spectrum
+and demodulation stack on a capture.
+"""
+
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from iq_stream import IQStream, Mixer, to_complex
+from burst_store import BurstStore
+
+
+# =============================================================================
+# SYNTHESIS
+# =============================================================================
+
+def synthesize(duration=1.0, sample_rate=2048000, signals=(), noise_db=-40.0, seed=0):
+    """
+    Build uint8 I/Q with test signals over complex Gaussian noise
+
+    Args:
+        duration: Seconds of IQ
+        sample_rate: Sample rate in Hz
+        signals: Dicts with
+                 modulation: 'OOK', 'FSK' or 'tone'
+                 offset_hz: Carrier offset from the centre
+                 level_db: Carrier level (dB full scale, default -10)
+                 start: First transmission (s), repeat: period (s, 0 = once)
+                 bits: Bit string (OOK/FSK)
+                 short_us / long_us: OOK PWM pulse widths (bit period = their sum)
+                 baud / deviation_hz: FSK symbol rate and deviation
+                 length: Tone duration (s)
+        noise_db: Noise level (dB full scale)
+        seed: Noise seed (same seed, same samples)
+
+    Returns:
+        (samples x 2) uint8 array
+    """
+    rng = np.random.default_rng(seed)
+    n = int(duration * sample_rate)
+    sigma = 10 ** (noise_db / 20) / np.sqrt(2)
+    iq = (rng.normal(0, sigma, n) + 1j * rng.normal(0, sigma, n)).astype(np.complex64)
+
+    for signal in signals:
+        burst = _burst(signal, sample_rate)
+        amplitude = 10 ** (signal.get('level_db', -10) / 20)
+        mixer_phase = 2 * np.pi * signal.get('offset_hz', 0) / sample_rate
+        period = int(signal.get('repeat', 0) * sample_rate)
+        position = int(signal.get('start', 0) * sample_rate)
+        while position < n:
+            end = min(n, position + len(burst))
+            t = np.arange(position, end)
+            iq[position:end] += amplitude * burst[:end - position] * np.exp(1j * mixer_phase * t)
+            if period <= 0:
+                break
+            position += period
+
+    return np.clip(np.round(np.column_stack([iq.real, iq.imag]) * 127.5 + 127.5), 0, 255).astype(np.uint8)
+
+
+def _burst(signal, sample_rate):
+    """Complex baseband of one transmission"""
+    modulation = signal.get('modulation', 'tone').upper()
+    bits = signal.get('bits', '1011001110001011')
+
+    if modulation == 'OOK':
+        short = int(signal.get('short_us', 300) * sample_rate / 1e6)
+        long = int(signal.get('long_us', 900) * sample_rate / 1e6)
+        parts = []
+        for bit in bits:
+            high = long if bit == '1' else short
+            parts += [np.ones(high), np.zeros(short + long - high)]
+        return np.concatenate(parts).astype(np.complex64)
+
+    if modulation == 'FSK':
+        samples_per_symbol = int(sample_rate / signal.get('baud', 10000))
+        deviation = signal.get('deviation_hz', 20000)
+        freqs = np.repeat(np.where(np.array(list(bits)) == '1', deviation, -deviation), samples_per_symbol)
+        return np.exp(1j * 2 * np.pi * np.cumsum(freqs) / sample_rate).astype(np.complex64)
+
+    return np.ones(int(signal.get('length', 0.1) * sample_rate), dtype=np.complex64)
+
+
+# =============================================================================
+# SOURCE
+# =============================================================================
+
+class VirtualSDR:
+    """Replay IQ through the IQMultiplexer source interface"""
+
+    def __init__(self, capture_file=None, iq=None, sample_rate=2048000, frequency=433920000,
+                 realtime=True, loop=True, chunk_samples=1 << 16):
+        """
+        Args:
+            capture_file: .cu8 file to replay (or an IQStream, e.g. a packed capture)
+            iq: (samples x 2) uint8 array to replay instead of a file
+            sample_rate: Sample rate of the recording
+            frequency: Centre frequency of the recording
+            realtime: Pace output at the sample rate (False = as fast as possible)
+            loop: Start over at the end (False = end of stream)
+            chunk_samples: Samples per yielded chunk
+        """
+        if capture_file is None and iq is None:
+            raise ValueError('capture_file or iq required')
+        if isinstance(capture_file, IQStream):
+            self.stream = capture_file
+            capture_file = capture_file.capture_file
+        else:
+            self.stream = IQStream(capture_file if capture_file is not None else iq, sample_rate, chunk_samples)
+        self.capture_file = capture_file
+        self.sample_rate = sample_rate
+        self.frequency = frequency
+        self.realtime = realtime
+        self.loop = loop
+        self.chunk_samples = chunk_samples
+
+        self.samples_sent = 0
+        self.sent = 0
+        self.passes = 0
+        self.started = None
+
+    @classmethod
+    def from_capture(cls, name, capture_dir="~/piflip/captures", **options):
+        """Replay a saved capture with the frequency and rate from its metadata"""
+        capture_dir = os.path.expanduser(capture_dir)
+        capture_file = os.path.join(capture_dir, f"{name}.cu8")
+        if not os.path.exists(capture_file):
+            # Packed (burst-only) capture: replay it with the gaps filled in
+            store = BurstStore(capture_dir)
+            if not store.is_sparse(name):
+                raise FileNotFoundError(f"Capture not found: {name}")
+            capture_file = store.stream(name, block_samples=options.get('chunk_samples', 1 << 16))
+        metadata = {}
+        metadata_file = os.path.join(capture_dir, f"{name}.json")
+        if os.path.exists(metadata_file):
+            with open(metadata_file, 'r') as f:
+                metadata = json.load(f)
+        options.setdefault('sample_rate', metadata.get('sample_rate', 2048000))
+        options.setdefault('frequency', metadata.get('frequency', 433920000))
+        return cls(capture_file, **options)
+
+    @classmethod
+    def synthesized(cls, duration=1.0, sample_rate=2048000, frequency=433920000, signals=(),
+                    noise_db=-40.0, seed=0, **options):
+        """Replay synthesize() output"""
+        iq = synthesize(duration, sample_rate, signals, noise_db, seed)
+        return cls(iq=iq, sample_rate=sample_rate, frequency=frequency, **options)
+
+    def __call__(self, frequency, sample_rate, gain, stop_event):
+        """
+        IQMultiplexer source: yield raw I/Q byte chunks for the given tuning
+        until the recording ends (loop=False) or stop_event is set
+        """
+        offset = self.frequency - frequency
+        in_band = abs(offset) < self.sample_rate / 2
+        mixer = Mixer(-offset, self.sample_rate) if in_band and offset else None
+        resample = sample_rate / self.sample_rate
+        noise = np.random.default_rng(1)
+
+        self.started = time.monotonic()
+        self.sent = 0
+        while not stop_event.is_set():
+            for _, block in self.stream.blocks():
+                if stop_event.is_set():
+                    return
+                if not in_band:
+                    block = np.clip(np.round(noise.normal(127.5, 1.5, block.shape)), 0, 255).astype(np.uint8)
+                elif mixer is not None or resample != 1:
+                    block = self.retuned(block, mixer, resample)
+
+                yield block.tobytes()
+                self.sent += len(block)
+                self.samples_sent += len(block)
+                if self.realtime:
+                    lead = self.sent / sample_rate - (time.monotonic() - self.started)
+                    if lead > 0:
+                        stop_event.wait(lead)
+
+            self.passes += 1
+            if not self.loop:
+                return
+
+    @staticmethod
+    def retuned(block, mixer, resample):
+        """Frequency-shift and/or linearly resample a block, back to uint8"""
+        samples = to_complex(block)
+        if mixer is not None:
+            samples = mixer.process(samples)
+        if resample != 1:
+            positions = np.arange(0, len(samples) - 1, 1 / resample)
+            samples = (np.interp(positions, np.arange(len(samples)), samples.real)
+                       + 1j * np.interp(positions, np.arange(len(samples)), samples.imag))
+        return np.clip(np.round(np.column_stack([samples.real, samples.imag]) * 127.5 + 127.5),
+                       0, 255).astype(np.uint8)
+
+    def status(self):
+        elapsed = time.monotonic() - self.started if self.started else 0
+        return {
+            'source': os.path.basename(self.capture_file) if self.capture_file else 'synthesized',
+            'frequency': self.frequency,
+            'sample_rate': self.sample_rate,
+            'duration': round(self.stream.duration, 3),
+            'realtime': self.realtime,
+            'loop': self.loop,
+            'passes': self.passes,
+            'samples_sent': self.samples_sent,
+            'rate': round(self.sent / elapsed) if elapsed else 0
+        }
+
+
+# =============================================================================
+# BENCHMARK
+# =============================================================================
+
+def benchmark(capture_file, sample_rate=2048000, frequency=433920000, seconds=2.0):
+    """
+    Time the spectrum and demodulation stack on a capture with no hardware
+
+    Returns:
+        Dict of stage -> {seconds, realtime factor}; the multiplexer stages
+        also report latency from chunk yield to subscriber read
+    """
+    from iq_multiplexer import IQMultiplexer
+    from ook_demodulator import OOKDemodulator
+    from fsk_demodulator import FSKDemodulator
+    from modulation_classifier import ModulationClassifier
+    from envelope_pyramid import EnvelopePyramid
+    from channelizer import MultiChannelDecoder
+    from spectrum_analyzer import SpectrumAnalyzer
+
+    stream = IQStream(capture_file, sample_rate)
+    duration = stream.duration
+    results = {}
+
+    def timed(name, function):
+        started = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - started
+        results[name] = {'seconds': round(elapsed, 4), 'realtime_factor': round(duration / elapsed, 1)}
+
+    timed('spectrum', lambda: stream.spectrum(1024))
+    timed('classify', lambda: ModulationClassifier(sample_rate).classify(capture_file))
+    timed('ook_demodulate', lambda: OOKDemodulator(sample_rate).demodulate(capture_file))
+    timed('fsk_demodulate', lambda: FSKDemodulator(sample_rate).demodulate(capture_file))
+    timed('envelope_pyramid', lambda: EnvelopePyramid.build(capture_file, sample_rate))
+    timed('channelizer_3ch', lambda: MultiChannelDecoder(
+        [frequency - 500000, frequency, frequency + 500000], frequency, sample_rate).decode_capture(capture_file))
+
+    # Whole live path: virtual SDR -> multiplexer ring -> subscriber
+    source = VirtualSDR(capture_file, sample_rate=sample_rate, frequency=frequency, realtime=False)
+    mux = IQMultiplexer(frequency, sample_rate, rtl_tcp_port=None, source=source)
+    mux.start()
+    try:
+        started = time.perf_counter()
+        with mux.subscribe('benchmark') as subscription:
+            received = sum(len(block) for block in subscription.blocks(int(seconds * sample_rate)))
+        elapsed = time.perf_counter() - started
+        results['multiplexer_stream'] = {
+            'seconds': round(elapsed, 4),
+            'realtime_factor': round(received / sample_rate / elapsed, 1),
+            'overruns': subscription.overruns
+        }
+
+        started = time.perf_counter()
+        scan = SpectrumAnalyzer(multiplexer=mux).quick_scan(frequency / 1e6, 1.0)
+        results['quick_scan_latency'] = {'seconds': round(time.perf_counter() - started, 4),
+                                         'status': scan['status']}
+    finally:
+        mux.stop(close=True)
+
+    return {'capture': str(capture_file), 'duration': round(duration, 3), 'stages': results}
+
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] != 'bench':
+        print("Usage: virtual_sdr.py bench <capture.cu8> [sample_rate] [frequency]")
+        sys.exit(1)
+    sample_rate = int(sys.argv[3]) if len(sys.argv) > 3 else 2048000
+    frequency = int(sys.argv[4]) if len(sys.argv) > 4 else 433920000
+    report = benchmark(sys.argv[2], sample_rate, frequency)
+    print(f"[*] {report['capture']} ({report['duration']}s)")
+    for stage, result in report['stages'].items():
+        details = ', '.join(f"{key}={value}" for key, value in result.items())
+        print(f"    {stage:20s} {details}")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,36 @@ Waveform Generator for PiFlip
 Creates ASCII waveform visualizations from signal timings
 """
 
+import numpy as np
+
+
+def timing_columns(timings, width):
+    """
+    High/low level of each of `width` equal columns of a timing list
+
+    A column is high if any high timing overlaps it, so no pulse is lost
+    however short. Column edges are found in the cumulative durations by
+    binary search - O(width log N), independent of the signal's length.
+
+    Args:
+        timings: List of {state, duration_us} dicts (non-zero total duration)
+        width: Number of columns
+
+    Returns:
+        Boolean array of `width` levels
+    """
+    durations = np.array([t['duration_us'] for t in timings], dtype=np.float64)
+    highs = np.concatenate([[0], np.cumsum([t['state'] == 1 for t in timings])])
+    ends = np.cumsum(durations)
+    starts = ends - durations
+    edges = np.arange(width + 1) * ends[-1] / width
+
+    # Timings [first, last) overlap each column
+    first = np.searchsorted(ends, edges[:-1], side='right')
+    last = np.searchsorted(starts, edges[1:], side='left')
+    return highs[last] > highs[first]
+
+
 class WaveformGenerator:
     """Generate ASCII waveforms from signal data"""
 
@@ -23,43 +53,11 @@ class WaveformGenerator:
         if not timings or len(timings) == 0:
             return '▁' * width
 
-        # Calculate total duration
-        total_duration = sum(t['duration_us'] for t in timings)
-
-        if total_duration == 0:
+        if sum(t['duration_us'] for t in timings) == 0:
             return '▁' * width
 
-        # Build waveform
-        waveform = []
-        current_pos = 0
-
-        for timing in timings:
-            # Calculate how many characters this pulse should take
-            pulse_width = int((timing['duration_us'] / total_duration) * width)
-
-            if pulse_width < 1:
-                pulse_width = 1
-
-            # Add pulse representation
-            if timing['state'] == 1:  # High
-                waveform.extend(['█'] * pulse_width)
-            else:  # Low
-                waveform.extend(['▁'] * pulse_width)
-
-            current_pos += pulse_width
-
-            # Stop if we've filled the width
-            if current_pos >= width:
-                break
-
-        # Pad if needed
-        while len(waveform) < width:
-            waveform.append('▁')
-
-        # Trim if too long
-        waveform = waveform[:width]
-
-        return ''.join(waveform)
+        # One column per slice of the signal, high if any pulse falls in it
+        return ''.join('█' if level else '▁' for level in timing_columns(timings, width))
 
     @staticmethod
     def generate_detailed_waveform(timings, width=50, height=3):
@@ -84,36 +82,26 @@ class WaveformGenerator:
 
         # Build waveform for each line
         lines = [[] for _ in range(height)]
-        current_pos = 0
-
-        for timing in timings:
-            pulse_width = max(1, int((timing['duration_us'] / total_duration) * width))
-
-            if timing['state'] == 1:  # High
+        for level in timing_columns(timings, width):
+            if level:  # High
                 # Top line
-                lines[0].extend(['▀'] * pulse_width)
+                lines[0].append('▀')
                 # Middle line
-                lines[1].extend(['█'] * pulse_width)
+                lines[1].append('█')
                 # Bottom line
-                lines[2].extend(['▀'] * pulse_width)
+                lines[2].append('▀')
             else:  # Low
                 # Top line
-                lines[0].extend([' '] * pulse_width)
+                lines[0].append(' ')
                 # Middle line
-                lines[1].extend(['▁'] * pulse_width)
+                lines[1].append('▁')
                 # Bottom line
-                lines[2].extend([' '] * pulse_width)
-
-            current_pos += pulse_width
-
-            if current_pos >= width:
-                break
+                lines[2].append(' ')
 
-        # Pad and trim all lines
+        # Pad all lines
         for i in range(height):
             while len(lines[i]) < width:
                 lines[i].append(' ')
-            lines[i] = lines[i][:width]
 
         return '\n'.join([''.join(line) for line in lines])
 
@@ -2,42 +2,85 @@
 from flask import Flask, render_template, jsonify, request, Response
 import subprocess
 import json
+import functools
 import os
+import threading
 import time
-import requests
-import spidev
-import RPi.GPIO as GPIO
+from collections import OrderedDict
+from contextlib import ExitStack, closing, nullcontext
 from datetime import datetime
 from pathlib import Path
 
-# Imports for PN532
-import board
-import busio
-from adafruit_pn532.i2c import PN532_I2C
-
-# Import URH analyzer and auto analyzer
 import sys
 sys.path.insert(0, os.path.expanduser('~/piflip'))
-from urh_analyzer import URHAnalyzer
-from auto_analyzer import AutoAnalyzer
-from nfc_enhanced import NFCEnhanced
-from nfc_cloner import NFCCloner
-from cc1101_enhanced import CC1101Enhanced
-from signal_decoder import SignalDecoder
-from nfc_emulator import NFCEmulator, MagicCardHelper
-from favorites_manager import FavoritesManager
-from waveform_generator import WaveformGenerator
-from bluetooth_scanner import BluetoothScanner
-from wifi_manager import WiFiManager, WiFiScanner
-from spectrum_analyzer import SpectrumAnalyzer
-from rf_advanced_tx import RFAdvancedTX
-from nfc_guardian import NFCGuardian
-from card_catalog import CardCatalog
-from rfid_wallet_tester import RFIDWalletTester
-from rf_power_tools import RFPowerTools
+from subsystems import subsystems
+import metrics
+
+# Subsystems are imported on first use (and by the warm-up thread once the
+# server is up), so a missing library only breaks the routes that need it
+np = subsystems.lazy('numpy', group='dsp')
+requests = subsystems.lazy('requests', group='network')
+
+# Hardware libraries (SPI/GPIO for the CC1101, I2C for the PN532)
+spidev = subsystems.lazy('spidev', group='hardware')
+GPIO = subsystems.lazy('RPi.GPIO', group='hardware')
+board = subsystems.lazy('board', group='hardware')
+busio = subsystems.lazy('busio', group='hardware')
+PN532_I2C = subsystems.lazy('adafruit_pn532.i2c', 'PN532_I2C', group='hardware')
+
+# Capture analysis and background work
+URHAnalyzer = subsystems.lazy('urh_analyzer', 'URHAnalyzer', group='analysis')
+AutoAnalyzer = subsystems.lazy('auto_analyzer', 'AutoAnalyzer', group='analysis')
+JobManager = subsystems.lazy('job_manager', 'JobManager', group='core')
+DeviceManager = subsystems.lazy('device_manager', 'DeviceManager', group='core')
+rtl_sdr_devices = subsystems.lazy('device_manager', 'rtl_sdr_devices', group='core')
+DashboardStats = subsystems.lazy('dashboard_stats', 'DashboardStats', group='core')
+UIAssets = subsystems.lazy('ui_assets', 'UIAssets', group='core')
+BurstStore = subsystems.lazy('burst_store', 'BurstStore', group='analysis')
+CaptureConverter = subsystems.lazy('capture_converter', 'CaptureConverter', group='analysis')
+EnvelopePyramid = subsystems.lazy('envelope_pyramid', 'EnvelopePyramid', group='analysis')
+SignalDecoder = subsystems.lazy('signal_decoder', 'SignalDecoder', group='analysis')
+WaveformGenerator = subsystems.lazy('waveform_generator', 'WaveformGenerator', group='analysis')
+
+# RTL-SDR stream, decoders and spectrum
+MultiChannelDecoder = subsystems.lazy('channelizer', 'MultiChannelDecoder', group='rtl-sdr')
+TriggeredRecorder = subsystems.lazy('triggered_recorder', 'TriggeredRecorder', group='rtl-sdr')
+IQMultiplexer = subsystems.lazy('iq_multiplexer', 'IQMultiplexer', group='rtl-sdr')
+VirtualSDR = subsystems.lazy('virtual_sdr', 'VirtualSDR', group='rtl-sdr')
+Rtl433Daemon = subsystems.lazy('rtl433_daemon', 'Rtl433Daemon', group='rtl-sdr')
+SensorTimeSeries = subsystems.lazy('sensor_timeseries', 'SensorTimeSeries', group='rtl-sdr')
+SpectrumAnalyzer = subsystems.lazy('spectrum_analyzer', 'SpectrumAnalyzer', group='spectrum')
+SignalDetector = subsystems.lazy('signal_detector', 'SignalDetector', group='spectrum')
+SweepScheduler = subsystems.lazy('sweep_scheduler', 'SweepScheduler', group='spectrum')
+SpectrumAccumulator = subsystems.lazy('spectrum_accumulator', 'SpectrumAccumulator', group='spectrum')
+
+# NFC / RFID
+NFCEnhanced = subsystems.lazy('nfc_enhanced', 'NFCEnhanced', group='nfc')
+NFCCloner = subsystems.lazy('nfc_cloner', 'NFCCloner', group='nfc')
+NFCEmulator = subsystems.lazy('nfc_emulator', 'NFCEmulator', group='nfc')
+MagicCardHelper = subsystems.lazy('nfc_emulator', 'MagicCardHelper', group='nfc')
+NFCGuardian = subsystems.lazy('nfc_guardian', 'NFCGuardian', group='nfc')
+CardCatalog = subsystems.lazy('card_catalog', 'CardCatalog', group='nfc')
+RFIDWalletTester = subsystems.lazy('rfid_wallet_tester', 'RFIDWalletTester', group='nfc')
+
+# CC1101 transmit tools
+CC1101Enhanced = subsystems.lazy('cc1101_enhanced', 'CC1101Enhanced', group='cc1101')
+RFAdvancedTX = subsystems.lazy('rf_advanced_tx', 'RFAdvancedTX', group='cc1101')
+RFPowerTools = subsystems.lazy('rf_power_tools', 'RFPowerTools', group='cc1101')
+FavoritesManager = subsystems.lazy('favorites_manager', 'FavoritesManager', group='cc1101')
+
+# Bluetooth / WiFi
+BluetoothScanner = subsystems.lazy('bluetooth_scanner', 'BluetoothScanner', group='wireless')
+WiFiManager = subsystems.lazy('wifi_manager', 'WiFiManager', group='wireless')
+WiFiScanner = subsystems.lazy('wifi_manager', 'WiFiScanner', group='wireless')
 
 app = Flask(__name__)
 
+# Route latency, subprocess and library I/O metrics; SPI/I2C hooks attach
+# when spidev/adafruit_pn532 are first loaded (PIFLIP_METRICS=0 disables)
+if metrics.install(app):
+    subsystems.on_load(metrics.install_hardware)
+
 # --- Global Controllers ---
 pn532_controller = None
 nfc_enhanced = None
@@ -145,7 +188,8 @@ def initialize_cc1101_enhanced():
     if cc1101_enhanced is None:
         print("[+] Initializing Enhanced CC1101 Controller for Web App...")
         try:
-            cc1101_enhanced = CC1101Enhanced()
+            with metrics.stage('cc1101_init'):
+                cc1101_enhanced = CC1101Enhanced()
             status = cc1101_enhanced.get_status()
             print(f"[+] Enhanced CC1101 initialized: {status}")
         except Exception as e:
@@ -155,12 +199,46 @@ def initialize_cc1101_enhanced():
 
 # --- Web App Routes ---
 
+# Precompressed, fingerprinted build of flipper_ui.html (see ui_assets.py)
+ui_assets = None
+
+def get_ui_assets():
+    """Get the UI build, building it on first use if the template changed"""
+    global ui_assets
+    if ui_assets is None:
+        ui_assets = UIAssets()
+        ui_assets.load()
+    return ui_assets
+
+def ui_response(name):
+    """Serve a built UI file with ETag/304 handling, or None without a build"""
+    try:
+        served = get_ui_assets().serve(name, request.headers.get('Accept-Encoding', ''),
+                                       request.headers.get('If-None-Match', ''))
+    except Exception as e:
+        print(f"[!] UI assets unavailable: {e}")
+        return None
+    if served is None:
+        return None
+    status, body, headers = served
+    return Response(body, status=status, headers=headers)
+
 @app.route('/')
 def index():
-    initialize_pn532()
-    import time
+    response = ui_response('index.html')
+    if response is not None:
+        return response
+    # No build (e.g. read-only install) - render the template directly
     return render_template('flipper_ui.html', cache_bust=int(time.time()))
 
+@app.route('/assets/<name>')
+def ui_asset(name):
+    """Fingerprinted UI assets (cached for a year)"""
+    response = ui_response(name)
+    if response is None or name == 'index.html':
+        return jsonify({'error': 'Asset not found'}), 404
+    return response
+
 @app.route('/old')
 def old_interface():
     # Add timestamp to bust cache
@@ -175,83 +253,499 @@ def test_suite():
 def nfc_test():
     return render_template('nfc_test.html')
 
-@app.route('/api/status')
-def status():
-    """Get status of all hardware components"""
-    status_info = {
-        'nfc': False,
-        'rtl_sdr': False,
-        'cc1101': False
-    }
+# Device manager: owns the radios and caches their health
+device_manager = None
 
-    # Check PN532 NFC
-    try:
-        if pn532_controller is None:
-            initialize_pn532()
-        status_info['nfc'] = pn532_controller is not None
-    except:
-        status_info['nfc'] = False
-
-    # Check RTL-SDR (check if device is present)
-    try:
-        result = subprocess.run(['rtl_test', '-t'], capture_output=True,
-                              text=True, timeout=2)
-        status_info['rtl_sdr'] = 'Found' in result.stdout
-    except:
-        status_info['rtl_sdr'] = False
+def probe_cc1101():
+    """Open the CC1101 once, then read PARTNUM/VERSION"""
+    global cc1101_enhanced
+    controller = initialize_cc1101_enhanced()
+    if controller is None:
+        return False, {}
+    status = controller.get_status()
+    if not status['detected']:
+        # Unplugged or wedged - reopen (and reset) on the next probe
+        cc1101_enhanced = None
+    return status['detected'], status
+
+def probe_pn532():
+    """Open the PN532 once, then read its firmware version"""
+    global pn532_controller
+    controller = initialize_pn532()
+    if controller is None:
+        return False, {}
+    try:
+        ic, ver, rev, support = controller.firmware_version
+    except Exception:
+        pn532_controller = None
+        raise
+    return True, {'ic': f"0x{ic:02X}", 'firmware': f"{ver}.{rev}"}
+
+def probe_rtl_sdr():
+    """RTL-SDR presence from sysfs - never opens the dongle"""
+    devices = rtl_sdr_devices()
+    users = []
+    if iq_streaming():
+        users.append('iq_multiplexer')
+    if rtl433_daemon is not None and rtl433_daemon.status()['running']:
+        users.append('rtl_433')
+    return bool(devices), {'devices': devices, 'count': len(devices), 'users': users}
+
+def job_on(device):
+    """Callback for the device manager: the job using a device, if any"""
+    return lambda: job_manager.device_busy(device) if job_manager is not None else None
+
+def pn532_in_use():
+    """Job or Guardian monitoring currently polling the PN532, if any"""
+    if guardian is not None and guardian.monitoring:
+        return 'guardian monitoring'
+    return job_on('pn532')()
+
+def holds(device):
+    """Route decorator: hold a device for the request so health checks skip it"""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            with get_device_manager().use(device):
+                return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def get_device_manager():
+    """Get or create the device manager and start its health checks"""
+    global device_manager
+    if device_manager is None:
+        device_manager = DeviceManager(interval=float(os.environ.get('PIFLIP_HEALTH_INTERVAL', 30)))
+        device_manager.register('cc1101', probe_cc1101, in_use=job_on('cc1101'))
+        device_manager.register('pn532', probe_pn532, in_use=pn532_in_use)
+        device_manager.register('rtl_sdr', probe_rtl_sdr, hotplug=True)
+        device_manager.start()
+    return device_manager
 
-    # Check CC1101 (try to initialize and read chip version)
-    try:
-        if cc1101_enhanced is None:
-            initialize_cc1101_enhanced()
-        status_info['cc1101'] = cc1101_enhanced is not None
-    except:
-        status_info['cc1101'] = False
+@app.route('/api/status')
+def status():
+    """Get status of all hardware components (cached by the device manager)"""
+    devices = get_device_manager().status()
+    return jsonify({
+        'nfc': devices['pn532']['status'] == 'ok',
+        'rtl_sdr': devices['rtl_sdr']['status'] == 'ok',
+        'cc1101': devices['cc1101']['status'] == 'ok',
+        'devices': devices
+    })
 
-    return jsonify(status_info)
+@app.route('/api/subsystems')
+def subsystem_report():
+    """Import cost and load state of every subsystem, plus warm-up probes"""
+    return jsonify(subsystems.report())
+
+@app.route('/api/metrics')
+def metrics_export():
+    """Route latency histograms and hardware-operation counters (Prometheus text)"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# rtl_433 daemon (one long-running process, queried from its cache)
+rtl433_daemon = None
+sensor_store = None
+# rtl_433's own device settings, restored when the IQ multiplexer lets go
+rtl433_direct = {}
+
+# IQ multiplexer (owns the RTL-SDR while running; consumers share its stream)
+iq_multiplexer = None
+channel_decoder = None
+triggered_recorder = None
+
+def get_sensor_store():
+    """Get or create the sensor telemetry time-series store"""
+    global sensor_store
+    if sensor_store is None:
+        sensor_store = SensorTimeSeries()
+    return sensor_store
+
+def get_rtl433_daemon():
+    """Get or create the rtl_433 daemon and make sure it is listening"""
+    global rtl433_daemon
+    if rtl433_daemon is None:
+        rtl433_daemon = Rtl433Daemon()
+        rtl433_daemon.subscribe(get_sensor_store().record)
+        remember_rtl433_direct()
+    if rtl433_daemon.state == 'stopped':
+        rtl433_daemon.start(**rtl433_source())
+    return rtl433_daemon
+
+def iq_streaming():
+    """The IQ multiplexer if it currently owns the RTL-SDR"""
+    if iq_multiplexer is not None and iq_multiplexer.status()['running']:
+        return iq_multiplexer
+    return None
+
+def iq_retune(mux, frequency, sample_rate, force=False):
+    """Retune the multiplexer for a request; an error response if others need the current tuning"""
+    if (mux.frequency, mux.sample_rate) == (frequency, sample_rate):
+        return None
+    busy = mux.busy()
+    if busy and not force:
+        return jsonify({
+            'error': 'RTL-SDR is shared',
+            'message': f'IQ multiplexer is tuned to {mux.frequency/1e6:.3f} MHz for: {", ".join(busy)}',
+            'consumers': busy
+        }), 409
+    mux.tune(frequency=frequency, sample_rate=sample_rate)
+    return None
+
+def spectrum_analyzer():
+    """Spectrum analyzer that shares the IQ stream and pauses rtl_433 for rtl_power"""
+    return SpectrumAnalyzer(multiplexer=iq_streaming(), rtl433=rtl433_daemon)
+
+def rtl_power_released():
+    """Free the RTL-SDR for an rtl_power sweep (pauses rtl_433 and the IQ stream)"""
+    stack = ExitStack()
+    if rtl433_daemon is not None:
+        stack.enter_context(rtl433_daemon.released())
+    mux = iq_streaming()
+    if mux is not None:
+        stack.enter_context(mux.released())
+    return stack
+
+def remember_rtl433_direct():
+    """Save rtl_433's settings before the multiplexer moves it onto rtl_tcp"""
+    rtl433_direct.update({'device': rtl433_daemon.device, 'sample_rate': rtl433_daemon.sample_rate,
+                          'frequencies': list(rtl433_daemon.frequencies)})
+
+def rtl433_source():
+    """rtl_433 device settings: the multiplexer's rtl_tcp stream if it is running, else its own"""
+    mux = iq_streaming()
+    if mux is None or not mux.rtl_tcp_address:
+        return dict(rtl433_direct)
+    return {'device': mux.rtl_tcp_address, 'frequencies': [str(mux.frequency)],
+            'sample_rate': mux.sample_rate}
+
+def rtl433_query(daemon, default_window, category=None):
+    """
+    Events for a request: ?cursor=<seq> (optionally &wait=<s>) for events
+    after the last one seen, ?since=<epoch>, or the last ?window=<s> seconds
+    """
+    since = None
+    cursor = request.args.get('cursor', None, type=int)
+    if cursor is not None:
+        wait = min(request.args.get('wait', 0, type=float), 30)
+        if wait > 0:
+            daemon.wait(cursor, timeout=wait)
+    elif 'since' in request.args:
+        since = request.args.get('since', type=float)
+    else:
+        window = request.args.get('window', default_window, type=float)
+        since = time.time() - window
+        # A daemon that has only just started has not heard the whole window
+        # yet: listen briefly (up to ?wait, default 10 s) rather than answer empty
+        if daemon.started and daemon.started > since and daemon.state in ('starting', 'running') \
+                and not daemon.query(since=since, limit=1):
+            remaining = daemon.started + window - time.time()
+            daemon.wait(daemon.status()['cursor'],
+                        timeout=max(0.0, min(request.args.get('wait', 10, type=float), remaining, 30)))
+
+    events = daemon.query(since=since, cursor=cursor, category=category,
+                          limit=request.args.get('limit', 500, type=int))
+    return events, since
 
 @app.route('/api/scan433')
 def scan433():
-    """Scan for 433MHz devices using rtl_433 - wider scan with hop"""
-    # Use frequency hopping to scan 433-434MHz range
-    # This catches more devices: doorbells, remotes, sensors, weather stations, etc.
-    # Use higher gain for better reception
-    result = subprocess.run(
-        ['timeout', '30', 'rtl_433', '-f', '433.92M', '-g', '40', '-H', '15', '-F', 'json'],
-        capture_output=True, text=True
-    )
+    """433MHz devices heard by the rtl_433 daemon (answers from its cache)"""
+    if request.args.get('async', '').lower() in ('1', 'true'):
+        # Timed listen as a job: ?async=1&duration=<s> (add &sync=1 to wait for it)
+        return job_response('scan433', {'duration': request.args.get('duration', 30, type=float)})
+
+    daemon = get_rtl433_daemon()
+    devices, since = rtl433_query(daemon, 30)
+    status = daemon.status()
 
     # Check if RTL-SDR is busy
-    if 'usb_claim_interface error -6' in result.stderr or 'usb_claim_interface error -6' in result.stdout:
+    if status['state'] == 'busy':
         return jsonify({
             'error': 'RTL-SDR is in use',
             'message': 'RTL-SDR is currently being used by another program. Please close the other program first.',
-            'devices': [],
-            'count': 0,
-            'raw_output': result.stderr
+            'devices': devices,
+            'count': len(devices),
+            'daemon': status,
+            'raw_output': '\n'.join(status['log'])
         })
 
-    devices = []
-    for line in result.stdout.split('\n'):
-        if line.strip():
-            try:
-                data = json.loads(line)
-                devices.append(data)
-            except:
-                pass
-
-    # Also capture any error/info messages
-    info_lines = [line for line in result.stderr.split('\n') if line.strip() and not line.startswith('rtl_433')]
-
     return jsonify({
         'devices': devices,
         'count': len(devices),
-        'scan_duration': '30 seconds',
-        'frequency': '433.92MHz with hopping',
-        'info': info_lines[:5] if info_lines else [],
-        'raw_output': result.stderr if len(devices) == 0 else ''
+        'sensors': daemon.latest(since=since),
+        'cursor': status['cursor'],
+        'scan_duration': f"{request.args.get('window', 30)} seconds" if since else 'since cursor',
+        'frequency': ', '.join(daemon.frequencies) + (' with hopping' if len(daemon.frequencies) > 1 else ''),
+        'daemon': status,
+        'info': status['log'],
+        'raw_output': ''
     })
 
+@app.route('/api/sensors')
+def sensor_catalog():
+    """Every sensor with stored telemetry and its chartable fields"""
+    try:
+        sensors = get_sensor_store().sensors(category=request.args.get('category'))
+        return jsonify({'sensors': sensors, 'count': len(sensors)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/sensors/<key>/history')
+def sensor_history(key):
+    """Telemetry of one sensor field over a time range (for charts)"""
+    field = request.args.get('field')
+    if not field:
+        return jsonify({'error': 'field required'}), 400
+
+    try:
+        end = request.args.get('end', None, type=float)
+        start = request.args.get('start', None, type=float)
+        if start is None and 'hours' in request.args:
+            start = (end or time.time()) - request.args.get('hours', type=float) * 3600
+
+        result = get_sensor_store().query(
+            key, field, start, end,
+            resolution=request.args.get('resolution', 'auto'),
+            max_points=min(request.args.get('max_points', 1000, type=int), 10000)
+        )
+        return jsonify(result), (200 if result['status'] == 'success' else 404)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/rtl433/status')
+def rtl433_status():
+    """rtl_433 daemon state and cache size"""
+    if rtl433_daemon is None:
+        return jsonify({'state': 'stopped', 'running': False})
+    return jsonify(rtl433_daemon.status())
+
+@app.route('/api/rtl433/start', methods=['POST'])
+def rtl433_start():
+    """Start the rtl_433 daemon, optionally with new settings"""
+    global rtl433_daemon
+    data = request.get_json() or {}
+    config = {key: data[key] for key in ('frequencies', 'hop_interval', 'gain', 'protocols') if key in data}
+
+    try:
+        if rtl433_daemon is None:
+            rtl433_daemon = Rtl433Daemon()
+            rtl433_daemon.subscribe(get_sensor_store().record)
+            remember_rtl433_direct()
+        if iq_streaming():
+            # The stream decides the device; the frequencies apply again after /api/iq/stop
+            if 'frequencies' in config:
+                rtl433_direct['frequencies'] = list(config['frequencies'])
+            config.update(rtl433_source())
+        elif rtl433_daemon.state == 'stopped':
+            # May still point at the rtl_tcp stream it listened to before /api/iq/stop
+            config = {**rtl433_source(), **config}
+        return jsonify(rtl433_daemon.start(**config))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/rtl433/stop', methods=['POST'])
+def rtl433_stop():
+    """Stop the rtl_433 daemon (frees the RTL-SDR; the cache is kept)"""
+    if rtl433_daemon is not None:
+        rtl433_daemon.stop()
+    return jsonify({'state': 'stopped'})
+
+@app.route('/api/iq/status')
+def iq_status():
+    """IQ multiplexer state, tuning and per-consumer lag/overruns"""
+    if iq_multiplexer is None:
+        return jsonify({'state': 'stopped', 'running': False})
+    return jsonify(iq_multiplexer.status())
+
+def iq_source(spec):
+    """
+    IQ multiplexer source for /api/iq/start: None for the RTL-SDR, or a
+    VirtualSDR replaying {"capture": name} / {"synthesize": {...}}
+    """
+    if not spec or spec == 'rtl_sdr':
+        return None
+    options = {'realtime': spec.get('realtime', True), 'loop': spec.get('loop', True)}
+    if 'capture' in spec:
+        return VirtualSDR.from_capture(spec['capture'], **options)
+    synth = spec.get('synthesize', {})
+    return VirtualSDR.synthesized(
+        duration=synth.get('duration', 2.0),
+        sample_rate=synth.get('sample_rate', 2048000),
+        frequency=synth.get('frequency', 433920000),
+        signals=synth.get('signals', [{'modulation': 'OOK', 'repeat': 0.5, 'start': 0.1}]),
+        noise_db=synth.get('noise_db', -40.0),
+        seed=synth.get('seed', 0),
+        **options
+    )
+
+@app.route('/api/iq/start', methods=['POST'])
+def iq_start():
+    """Give the RTL-SDR to the IQ multiplexer (rtl_433 moves onto its rtl_tcp stream)"""
+    global iq_multiplexer
+    data = request.get_json() or {}
+
+    try:
+        # "source" switches between the dongle ("rtl_sdr") and a virtual SDR
+        source = iq_source(data['source']) if 'source' in data else None
+        if rtl433_daemon is not None and not iq_streaming():
+            remember_rtl433_direct()
+        if iq_multiplexer is not None and 'source' in data:
+            # Subscribers read the ring that closing frees - stop them first
+            for consumer in (channel_decoder, triggered_recorder):
+                if consumer is not None:
+                    consumer.stop()
+            iq_multiplexer.stop(close=True)
+            iq_multiplexer = None
+
+        if iq_multiplexer is None:
+            iq_multiplexer = IQMultiplexer(
+                frequency=data.get('frequency', source.frequency if source else 433920000),
+                sample_rate=data.get('sample_rate', source.sample_rate if source else 2048000),
+                gain=data.get('gain', 40),
+                rtl_tcp_port=data.get('rtl_tcp_port', 1234),
+                rtl_tcp_host=data.get('rtl_tcp_host', '127.0.0.1'),
+                allow_control=data.get('allow_control', False),
+                source=source
+            )
+        else:
+            iq_multiplexer.tune(data.get('frequency'), data.get('sample_rate'), data.get('gain'))
+            iq_multiplexer.allow_control = data.get('allow_control', iq_multiplexer.allow_control)
+
+        # rtl_433 has to let go of the device before the multiplexer can claim it
+        listening = rtl433_daemon is not None and rtl433_daemon.state != 'stopped'
+        if listening and not iq_streaming():
+            rtl433_daemon.stop()
+        status = iq_multiplexer.start()
+        if listening:
+            rtl433_daemon.start(**rtl433_source())
+        return jsonify(status)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/iq/channels/start', methods=['POST'])
+def iq_channels_start():
+    """Decode several frequencies of the live IQ stream at once (polyphase channelizer)"""
+    global channel_decoder
+    mux = iq_streaming()
+    if mux is None:
+        return jsonify({'error': 'IQ multiplexer is not running', 'message': 'POST /api/iq/start first'}), 409
+
+    data = request.get_json() or {}
+    frequencies = data.get('frequencies') or [433420000, 433920000, 434420000]
+
+    try:
+        if channel_decoder is not None:
+            channel_decoder.stop()
+        channel_decoder = MultiChannelDecoder(
+            [int(f) for f in frequencies],
+            center_freq=mux.frequency,
+            sample_rate=mux.sample_rate,
+            num_channels=data.get('num_channels', 16),
+            modulation=data.get('modulation', 'auto')
+        )
+        return jsonify(channel_decoder.start(mux))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/iq/channels')
+def iq_channels():
+    """Bursts decoded on the live channels (?cursor=<seq> for only new ones)"""
+    if channel_decoder is None:
+        return jsonify({'running': False, 'events': [], 'count': 0})
+
+    events = channel_decoder.query(
+        cursor=request.args.get('cursor', None, type=int),
+        frequency=request.args.get('frequency', None, type=int),
+        limit=request.args.get('limit', 200, type=int)
+    )
+    status = channel_decoder.status()
+    status.update({'events': events, 'count': len(events)})
+    return jsonify(status)
+
+@app.route('/api/iq/channels/stop', methods=['POST'])
+def iq_channels_stop():
+    """Stop live multi-channel decoding (decoded bursts are kept)"""
+    if channel_decoder is not None:
+        channel_decoder.stop()
+    return jsonify({'running': False})
+
+@app.route('/api/iq/trigger/start', methods=['POST'])
+def iq_trigger_start():
+    """Record a capture automatically whenever channel power rises above the noise"""
+    global triggered_recorder
+    mux = iq_streaming()
+    if mux is None:
+        return jsonify({'error': 'IQ multiplexer is not running', 'message': 'POST /api/iq/start first'}), 409
+
+    data = request.get_json() or {}
+    try:
+        refused = iq_retune(mux, data.get('frequency', mux.frequency),
+                            data.get('sample_rate', mux.sample_rate), data.get('force'))
+        if refused:
+            return refused
+
+        if triggered_recorder is not None:
+            triggered_recorder.stop()
+        triggered_recorder = TriggeredRecorder(
+            frequency=mux.frequency,
+            sample_rate=mux.sample_rate,
+            threshold_db=data.get('threshold_db', 10.0),
+            pre_roll=data.get('pre_roll', 0.25),
+            hang_time=data.get('hang_time', 0.5),
+            max_duration=data.get('max_duration', 30.0),
+            offset_hz=data.get('offset_hz', 0),
+            bandwidth_hz=data.get('bandwidth_hz'),
+            prefix=data.get('prefix', 'trigger'),
+            on_capture=lambda metadata: get_job_manager().submit('analysis', {'capture_name': metadata['name']})
+        )
+        return jsonify(triggered_recorder.start(mux))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/iq/trigger')
+def iq_trigger_status():
+    """Triggered recorder state and the captures it saved"""
+    if triggered_recorder is None:
+        return jsonify({'running': False, 'captures': [], 'capture_count': 0})
+    return jsonify(triggered_recorder.status())
+
+@app.route('/api/iq/trigger/stop', methods=['POST'])
+def iq_trigger_stop():
+    """Stop watching (an event being recorded is saved)"""
+    if triggered_recorder is not None:
+        triggered_recorder.stop()
+    return jsonify({'running': False})
+
+@app.route('/api/iq/stop', methods=['POST'])
+def iq_stop():
+    """Release the RTL-SDR (rtl_433 goes back to opening it directly)"""
+    if iq_multiplexer is None:
+        return jsonify({'state': 'stopped'})
+
+    try:
+        listening = rtl433_daemon is not None and rtl433_daemon.state != 'stopped'
+        if listening:
+            rtl433_daemon.stop()
+        iq_multiplexer.stop()
+        if listening:
+            rtl433_daemon.start(**rtl433_source())
+        return jsonify(iq_multiplexer.status())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Dashboard counters, kept current by inotify instead of rescanning per request
+dashboard_stats = None
+
+def get_dashboard_stats():
+    """Get or create the dashboard index and start its watcher"""
+    global dashboard_stats
+    if dashboard_stats is None:
+        dashboard_stats = DashboardStats()
+        dashboard_stats.start()
+    return dashboard_stats
+
 @app.route('/api/capture', methods=['POST'])
 def capture():
     """Capture raw RF signal with rtl_sdr"""
@@ -260,6 +754,8 @@ def capture():
     sample_rate = data.get('sample_rate', 2048000)  # 2.048 MS/s
     duration = data.get('duration', 5)  # seconds
     name = data.get('name', f'capture_{int(time.time())}')
+    sparse = data.get('sparse', False)  # Keep only the bursts
+    compression = data.get('compression')
 
     # Calculate number of samples
     num_samples = int(sample_rate * duration)
@@ -271,18 +767,32 @@ def capture():
     filename = f"{name}.cu8"
     filepath = os.path.join(capture_dir, filename)
 
-    # Capture using rtl_sdr with high gain for better signal strength
-    result = subprocess.run(
-        ['rtl_sdr', '-f', str(frequency), '-s', str(sample_rate),
-         '-g', '40', '-n', str(num_samples), filepath],
-        capture_output=True, text=True, timeout=duration + 5
-    )
-
-    if 'usb_claim_interface error -6' in result.stderr:
-        return jsonify({
-            'error': 'RTL-SDR is in use',
-            'message': 'Close other programs using RTL-SDR first'
-        }), 500
+    mux = iq_streaming()
+    if mux is not None:
+        # Record from the shared stream - spectrum and decoders keep running
+        refused = iq_retune(mux, frequency, sample_rate, data.get('force'))
+        if refused:
+            return refused
+        recorded = mux.record(filepath, num_samples)
+        if recorded['status'] != 'success':
+            return jsonify({'error': 'Capture failed', 'message': recorded.get('message'),
+                            'recording': recorded}), 500
+    else:
+        # Capture using rtl_sdr with high gain for better signal strength
+        # (the rtl_433 daemon lets go of the RTL-SDR meanwhile)
+        with (rtl433_daemon.released() if rtl433_daemon else nullcontext()):
+            result = subprocess.run(
+                ['rtl_sdr', '-f', str(frequency), '-s', str(sample_rate),
+                 '-g', '40', '-n', str(num_samples), filepath],
+                capture_output=True, text=True, timeout=duration + 5
+            )
+        metrics.library_io(filepath, 'written')
+
+        if 'usb_claim_interface error -6' in result.stderr:
+            return jsonify({
+                'error': 'RTL-SDR is in use',
+                'message': 'Close other programs using RTL-SDR first'
+            }), 500
 
     # Save metadata
     metadata = {
@@ -299,22 +809,208 @@ def capture():
     metadata_file = os.path.join(capture_dir, f"{name}.json")
     with open(metadata_file, 'w') as f:
         json.dump(metadata, f, indent=2)
+    stats = get_dashboard_stats()
+    stats.file_changed(filepath)
+    stats.file_changed(metadata_file)
+
+    # Burst-only storage: drop the noise between transmissions
+    if sparse:
+        try:
+            packed = BurstStore().pack(name, compression=compression, keep_original=False)
+            metadata['sparse'] = packed
+        except Exception as e:
+            metadata['sparse'] = {'status': 'error', 'message': str(e)}
 
     # Automatically analyze the capture in background
     try:
-        analyzer = AutoAnalyzer()
-        analysis_result = analyzer.analyze_capture_auto(name)
-        metadata['auto_analysis'] = analysis_result
+        job = get_job_manager().submit('analysis', {'capture_name': name})
+        analysis = {
+            'job_id': job['id'],
+            'status': job['status'],
+            'status_url': f"/api/jobs/{job['id']}",
+            'stream_url': f"/api/jobs/{job['id']}/stream"
+        }
     except Exception as e:
-        metadata['auto_analysis'] = {'error': str(e), 'status': 'analysis_failed'}
+        analysis = {'error': str(e), 'status': 'analysis_failed'}
 
     return jsonify({
         'status': 'success',
         'message': f'Captured {duration} seconds at {frequency/1e6:.2f} MHz',
         'metadata': metadata,
-        'auto_analyzed': True
+        'analysis': analysis
     })
 
+# Background jobs: long-running hardware routes (one per device at a time)
+# and capture analysis (persistent queue, resumed on startup)
+job_manager = None
+
+def job_analysis(params, ctx):
+    """Auto-analyze a capture: classify, demodulate, decode, convert, preview"""
+    return AutoAnalyzer().analyze_capture_auto(params['capture_name'], progress=ctx.progress)
+
+def job_scan433(params, ctx):
+    """Listen to the rtl_433 daemon for a while, collecting what it hears"""
+    daemon = get_rtl433_daemon()
+    duration = float(params.get('duration', 30))
+    started = time.time()
+    first = daemon.status()['cursor']
+    cursor = first
+    while time.time() - started < duration:
+        cursor = daemon.wait(cursor, timeout=min(1.0, max(0.0, duration - (time.time() - started))))
+        heard = len(daemon.query(cursor=first))
+        ctx.progress(f"{heard} transmissions heard", (time.time() - started) * 100 // duration, count=heard)
+
+    devices = daemon.query(cursor=first)
+    return {
+        'devices': devices,
+        'count': len(devices),
+        'sensors': daemon.latest(since=started),
+        'cursor': daemon.status()['cursor'],
+        'scan_duration': f"{duration:g} seconds",
+        'frequency': ', '.join(daemon.frequencies) + (' with hopping' if len(daemon.frequencies) > 1 else ''),
+        'daemon': daemon.status()
+    }
+
+def job_bluetooth_scan(params, ctx):
+    scanner = BluetoothScanner()
+    scan_type = params.get('type', 'comprehensive')
+    duration = params.get('duration', 15)
+    if scan_type == 'ble':
+        return scanner.scan_ble_devices(duration)
+    if scan_type == 'classic':
+        return scanner.scan_classic_devices(duration)
+    return scanner.scan_comprehensive(duration, progress=ctx.progress)
+
+def job_wallet_test(params, ctx):
+    return get_wallet_tester().test_blocking_effectiveness(duration=params.get('duration', 10),
+                                                           progress=ctx.progress)
+
+def job_spectrum_waterfall(params, ctx):
+    analyzer = spectrum_analyzer()
+    return analyzer.waterfall_scan(params.get('center_freq', 433.92), params.get('span', 2.0),
+                                   params.get('duration', 10), params.get('interval', 0.2),
+                                   progress=ctx.progress)
+
+def job_rf_frequency_sweep(params, ctx):
+    return get_rf_power_tools().frequency_sweep(
+        params.get('signal'), params.get('start_freq', 433.0), params.get('end_freq', 434.0),
+        params.get('step', 0.05), params.get('delay_ms', 500), params.get('repeats', 3),
+        progress=ctx.progress
+    )
+
+def job_rf_playlist(params, ctx):
+    return get_rf_power_tools().execute_playlist(params.get('playlist', []), progress=ctx.progress)
+
+def hold_device(device):
+    """Device manager hold for a job, so jobs and @holds routes share one lock per device"""
+    manager = get_device_manager()
+    return manager.use(device) if device in manager.devices else nullcontext()
+
+def get_job_manager():
+    """Get or create the job manager with the long-running routes registered"""
+    global job_manager
+    if job_manager is None:
+        job_manager = JobManager(hold=hold_device)
+        job_manager.register('scan433', job_scan433, description='Listen to rtl_433 for `duration` seconds')
+        job_manager.register('bluetooth_scan', job_bluetooth_scan, 'bluetooth', 'Bluetooth device scan')
+        job_manager.register('wallet_test', job_wallet_test, 'pn532', 'RFID wallet blocking test')
+        job_manager.register('spectrum_waterfall', job_spectrum_waterfall, 'rtl-sdr', 'Waterfall scan')
+        job_manager.register('rf_frequency_sweep', job_rf_frequency_sweep, 'cc1101', 'Transmit across a frequency range')
+        job_manager.register('rf_playlist', job_rf_playlist, 'cc1101', 'Transmit a signal playlist')
+        job_manager.register('analysis', job_analysis, 'cpu', 'Analyze a capture', resume=True)
+    return job_manager
+
+def job_response(kind, params):
+    """
+    Run a job for a route: 202 with the job ID at once, or - if the request
+    asked for "sync" (body or query string) - wait and return its result
+    """
+    manager = get_job_manager()
+    wants_sync = request.args.get('sync', '').lower() in ('1', 'true') or \
+        bool((request.get_json(silent=True) or {}).get('sync'))
+
+    if not wants_sync:
+        job = manager.submit(kind, params)
+        return jsonify({
+            'job_id': job['id'],
+            'status': job['status'],
+            'queue_position': manager.queue_position(job['id']),
+            'status_url': f"/api/jobs/{job['id']}",
+            'stream_url': f"/api/jobs/{job['id']}/stream",
+            'cancel_url': f"/api/jobs/{job['id']}/cancel"
+        }), 202
+
+    job = manager.run(kind, params)
+    if job['result'] is not None:
+        return jsonify(job['result'])
+    return jsonify({'error': job['error'] or job['stage'], 'job_id': job['id'], 'status': job['status']}), \
+        409 if job['status'] == 'cancelled' else 500
+
+@app.route('/api/jobs', methods=['GET', 'POST'])
+def jobs():
+    """List jobs (?kind=, ?status=, ?capture=, ?limit=) or submit one: {"kind": ..., "params": {...}}"""
+    try:
+        manager = get_job_manager()
+        if request.method == 'POST':
+            data = request.get_json() or {}
+            kind = data.get('kind')
+            if kind not in manager.kinds:
+                return jsonify({'error': f'Unknown job kind: {kind}', 'kinds': manager.list_kinds()}), 400
+            job = manager.submit(kind, data.get('params', {}))
+            job['status_url'] = f"/api/jobs/{job['id']}"
+            job['stream_url'] = f"/api/jobs/{job['id']}/stream"
+            return jsonify(job), 202
+
+        capture_name = request.args.get('capture')
+        jobs = manager.list_jobs(request.args.get('limit', 50, type=int),
+                                 request.args.get('kind'), request.args.get('status'),
+                                 {'capture_name': capture_name} if capture_name else None)
+        return jsonify({'jobs': jobs, 'count': len(jobs), 'kinds': manager.list_kinds(),
+                        'limits': manager.limits})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    """Get status, progress and result of one job"""
+    manager = get_job_manager()
+    job = manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    job['queue_position'] = manager.queue_position(job_id)
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/stream')
+def job_stream(job_id):
+    """Server-sent events: one event per job change until it finishes"""
+    manager = get_job_manager()
+    if manager.get(job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    def generate():
+        last = None
+        while True:
+            job = manager.wait(job_id, last)
+            if job is None:
+                break
+            if job != last:
+                yield f"data: {json.dumps(job, default=str)}\n\n"
+            else:
+                yield ": waiting\n\n"
+            last = job
+            if job['status'] not in JobManager.ACTIVE:
+                break
+
+    return Response(generate(), mimetype='text/event-stream')
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def job_cancel(job_id):
+    """Cancel a queued or running job"""
+    job = get_job_manager().cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
 @app.route('/api/captures')
 def list_captures():
     """List all saved signal captures"""
@@ -353,13 +1049,122 @@ def delete_capture(name):
     if os.path.exists(json_file):
         os.remove(json_file)
         deleted.append(f"{name}.json")
+    deleted += BurstStore().delete(name)
+    deleted += EnvelopePyramid.delete(name)
+    stats = get_dashboard_stats()
+    for file in deleted:
+        stats.file_removed(os.path.join(capture_dir, os.path.basename(file)))
 
     return jsonify({
         'status': 'deleted',
         'files': deleted
     })
 
+@app.route('/api/capture/<name>/sparse', methods=['POST'])
+def sparse_capture(name):
+    """Convert a capture to burst-only storage"""
+    data = request.get_json() or {}
+
+    try:
+        result = BurstStore().pack(
+            name,
+            padding_ms=data.get('padding_ms', 5.0),
+            snr_db=data.get('snr_db', 10.0),
+            compression=data.get('compression'),
+            keep_original=data.get('keep_original', False)
+        )
+        return jsonify(result), (200 if result['status'] == 'success' else 400)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/capture/<name>/convert', methods=['POST'])
+def convert_capture(name):
+    """Convert a capture into a CC1101 timing signal (rf_library)"""
+    data = request.get_json() or {}
+
+    try:
+        result = CaptureConverter().convert(
+            name,
+            name=data.get('name'),
+            overwrite=data.get('overwrite', False),
+            force=data.get('force', False)
+        )
+        if result['status'] == 'success':
+            return jsonify(result)
+        return jsonify(result), (404 if 'not found' in result['message'] else 400)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/capture/<name>/channels', methods=['POST'])
+def capture_channels(name):
+    """Decode several frequencies of one wideband capture at once"""
+    data = request.get_json() or {}
+    frequencies = data.get('frequencies')
+    if not frequencies:
+        return jsonify({'error': 'frequencies required'}), 400
+
+    capture_dir = os.path.expanduser("~/piflip/captures")
+    capture_file = os.path.join(capture_dir, f"{name}.cu8")
+    if not os.path.exists(capture_file):
+        # Packed capture: decode its bursts on the original timeline
+        store = BurstStore(capture_dir)
+        if not store.is_sparse(name):
+            return jsonify({'error': f'Capture not found: {name}'}), 404
+        capture_file = store.stream(name)
+
+    try:
+        metadata = {}
+        metadata_file = os.path.join(capture_dir, f"{name}.json")
+        if os.path.exists(metadata_file):
+            with open(metadata_file, 'r') as f:
+                metadata = json.load(f)
+
+        decoder = MultiChannelDecoder(
+            [int(f) for f in frequencies],
+            center_freq=metadata.get('frequency', 433920000),
+            sample_rate=metadata.get('sample_rate', 2048000),
+            num_channels=data.get('num_channels', 16),
+            modulation=data.get('modulation', 'auto')
+        )
+        return jsonify(decoder.decode_capture(capture_file))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/capture/<name>/envelope')
+def capture_envelope(name):
+    """Min/max envelope of a capture window, for zoomable previews"""
+    try:
+        pyramid = EnvelopePyramid.for_capture(name)
+        start = request.args.get('start', 0.0, type=float)
+        end = request.args.get('end', None, type=float)
+        width = min(request.args.get('width', 600, type=int), 4096)
+
+        result = pyramid.window_dict(start, end, width)
+        if request.args.get('format') == 'ascii':
+            result['ascii'] = pyramid.render_ascii(
+                int(start * pyramid.sample_rate),
+                int(end * pyramid.sample_rate) if end is not None else None,
+                width=min(width, 120),
+                height=request.args.get('height', 8, type=int)
+            )
+        return jsonify(result)
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/capture/<name>/bursts')
+def capture_bursts(name):
+    """Get the burst index of a sparse capture"""
+    index = BurstStore().load_index(name)
+    if index is None:
+        return jsonify({'error': 'Capture is not stored sparse'}), 404
+    return jsonify(index)
+
 @app.route('/api/nfc')
+@holds('pn532')
 def nfc():
     """Scan for NFC card with detailed information"""
     controller = initialize_nfc_enhanced()
@@ -374,6 +1179,7 @@ def nfc():
         return jsonify({'status': 'Error', 'message': str(e)}), 500
 
 @app.route('/api/nfc/save', methods=['POST'])
+@holds('pn532')
 def nfc_save():
     """Save NFC card to library"""
     data = request.get_json()
@@ -424,6 +1230,7 @@ def nfc_delete(name):
         return jsonify({'status': 'Error', 'message': str(e)}), 500
 
 @app.route('/api/nfc/read_full', methods=['POST'])
+@holds('pn532')
 def nfc_read_full():
     """Read full card dump (all sectors)"""
     try:
@@ -434,6 +1241,7 @@ def nfc_read_full():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/nfc/clone', methods=['POST'])
+@holds('pn532')
 def nfc_clone():
     """Clone a card to magic card"""
     data = request.get_json()
@@ -450,6 +1258,7 @@ def nfc_clone():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/nfc/verify', methods=['POST'])
+@holds('pn532')
 def nfc_verify():
     """Verify cloned card matches original"""
     data = request.get_json()
@@ -467,83 +1276,64 @@ def nfc_verify():
 
 @app.route('/api/tpms')
 def tpms():
-    """Scan for TPMS tire pressure sensors - comprehensive scan"""
-    # Scan both 315MHz and 433MHz (some TPMS use 433MHz)
-    # Extended time for better detection
-    # Use higher gain for better TPMS detection
-    result = subprocess.run(
-        ['timeout', '45', 'rtl_433', '-f', '315M', '-g', '40', '-H', '10', '-F', 'json', '-R', '59', '-R', '60', '-R', '88', '-R', '89'],
-        capture_output=True, text=True
-    )
+    """TPMS tire pressure sensors heard by the rtl_433 daemon"""
+    daemon = get_rtl433_daemon()
+    sensors, since = rtl433_query(daemon, 45, category='tpms')
+    status = daemon.status()
 
     # Check if RTL-SDR is busy
-    if 'usb_claim_interface error -6' in result.stderr:
+    if status['state'] == 'busy':
         return jsonify({
             'error': 'RTL-SDR is in use',
             'message': 'RTL-SDR is being used by another program. Close it first or click "Switch Mode".',
-            'sensors': [],
-            'count': 0
+            'sensors': sensors,
+            'count': len(sensors)
         })
 
-    sensors = []
-    for line in result.stdout.split('\n'):
-        if line.strip():
-            try:
-                sensors.append(json.loads(line))
-            except:
-                pass
-
     return jsonify({
         'sensors': sensors,
         'count': len(sensors),
-        'scan_duration': '45 seconds',
-        'frequency': '315MHz (TPMS)',
+        'latest': daemon.latest(category='tpms'),
+        'cursor': status['cursor'],
+        'scan_duration': f"{request.args.get('window', 45)} seconds" if since else 'since cursor',
+        'frequency': ', '.join(daemon.frequencies),
         'protocols': 'TPMS sensors: Toyota, Ford, Schrader, etc.',
         'note': 'Drive near the Pi or roll your car to activate TPMS sensors',
-        'raw_output': result.stderr if len(sensors) == 0 else ''
+        'daemon': status,
+        'raw_output': ''
     })
 
 @app.route('/api/weather')
 def weather():
-    """Scan for weather stations - comprehensive scan"""
-    # Scan multiple common weather station protocols
-    # Many weather stations transmit every 30-60 seconds
-    # Use higher gain for better weather station detection
-    result = subprocess.run(
-        ['timeout', '60', 'rtl_433', '-f', '433.92M', '-g', '40', '-H', '15', '-F', 'json',
-         '-R', '40', '-R', '41', '-R', '44', '-R', '73', '-R', '74', '-R', '113'],
-        capture_output=True, text=True
-    )
+    """Weather stations heard by the rtl_433 daemon"""
+    daemon = get_rtl433_daemon()
+    stations, since = rtl433_query(daemon, 60, category='weather')
+    status = daemon.status()
 
     # Check if RTL-SDR is busy
-    if 'usb_claim_interface error -6' in result.stderr:
+    if status['state'] == 'busy':
         return jsonify({
             'error': 'RTL-SDR is in use',
             'message': 'RTL-SDR is being used by another program. Close it first or click "Switch Mode".',
-            'stations': [],
-            'count': 0
+            'stations': stations,
+            'count': len(stations)
         })
 
-    stations = []
-    for line in result.stdout.split('\n'):
-        if line.strip():
-            try:
-                data = json.loads(line)
-                stations.append(data)
-            except:
-                pass
-
     return jsonify({
         'stations': stations,
         'count': len(stations),
-        'scan_duration': '60 seconds',
-        'frequency': '433.92MHz',
+        'latest': daemon.latest(category='weather'),
+        'cursor': status['cursor'],
+        'scan_duration': f"{request.args.get('window', 60)} seconds" if since else 'since cursor',
+        'frequency': ', '.join(daemon.frequencies),
         'protocols': 'Acurite, Ambient Weather, LaCrosse, Oregon Scientific, etc.',
         'note': 'Weather stations typically transmit every 30-60 seconds',
-        'raw_output': result.stderr if len(stations) == 0 else ''
+        'daemon': status,
+        'raw_output': ''
     })
 
 @app.route('/api/nfc/backup', methods=['POST'])
+@holds('pn532')
 def backup_nfc():
     data = request.get_json()
     name = data.get('name')
@@ -574,6 +1364,7 @@ def backup_nfc():
         return jsonify({'status': 'Error', 'message': str(e)}), 500
 
 @app.route('/api/cc1101/status')
+@holds('cc1101')
 def cc1101_status():
     """Get CC1101 status"""
     controller = initialize_cc1101()
@@ -621,6 +1412,7 @@ def analyze_signal(capture_name):
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/replay/<capture_name>', methods=['POST'])
+@holds('cc1101')
 def replay_signal(capture_name):
     """Replay a captured signal using CC1101"""
     try:
@@ -679,6 +1471,7 @@ print("Transmitted test burst on {freq/1e6:.2f} MHz")
 # --- CC1101 Enhanced API Routes ---
 
 @app.route('/api/cc1101/capture', methods=['POST'])
+@holds('cc1101')
 def cc1101_capture():
     """Capture signal with CC1101"""
     data = request.get_json()
@@ -692,26 +1485,31 @@ def cc1101_capture():
 
     try:
         # Capture signal
-        capture_data = controller.capture_signal(duration=duration, freq_mhz=frequency)
+        with metrics.stage('cc1101_capture'):
+            capture_data = controller.capture_signal(duration=duration, freq_mhz=frequency)
 
         # Auto-save if name provided
         if name:
-            save_result = controller.save_signal(capture_data, name)
+            with metrics.stage('cc1101_capture_save'):
+                save_result = controller.save_signal(capture_data, name)
+            with metrics.stage('cc1101_capture_serialize'):
+                return jsonify({
+                    'status': 'captured_and_saved',
+                    'capture': capture_data,
+                    'save': save_result
+                })
+
+        with metrics.stage('cc1101_capture_serialize'):
             return jsonify({
-                'status': 'captured_and_saved',
-                'capture': capture_data,
-                'save': save_result
+                'status': 'captured',
+                'capture': capture_data
             })
 
-        return jsonify({
-            'status': 'captured',
-            'capture': capture_data
-        })
-
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/cc1101/scan', methods=['POST'])
+@holds('cc1101')
 def cc1101_scan():
     """Scan frequency range for signals"""
     data = request.get_json()
@@ -757,6 +1555,7 @@ def cc1101_library():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/cc1101/transmit/<name>', methods=['POST'])
+@holds('cc1101')
 def cc1101_transmit(name):
     """Transmit saved signal with enhanced power and repeats"""
     controller = initialize_cc1101_enhanced()
@@ -795,6 +1594,7 @@ def cc1101_delete(name):
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/cc1101/status')
+@holds('cc1101')
 def cc1101_enhanced_status():
     """Get CC1101 enhanced status"""
     controller = initialize_cc1101_enhanced()
@@ -823,6 +1623,7 @@ def cc1101_decode_signal(name):
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/nfc/emulate/<name>', methods=['POST'])
+@holds('pn532')
 def nfc_emulate_card(name):
     """Attempt to emulate card (shows magic card recommendation)"""
     try:
@@ -927,101 +1728,163 @@ def waterfall_spectrum():
     bins = request.args.get('bins', '256')                # FFT bins
 
     try:
-        # Use rtl_power for quick spectrum scan
-        # -f start:end:step -i interval -1 (single scan)
-        result = subprocess.run(
-            ['rtl_power', '-f', f'{start_freq}:{end_freq}:1M', '-i', '0.1', '-1', '-'],
-            capture_output=True,
-            text=True,
-            timeout=2
-        )
+        analyzer = spectrum_analyzer()
+        if analyzer._streaming() and analyzer.multiplexer.covers(float(start_freq), float(end_freq)):
+            # Already streaming this band - read it without taking the device away
+            sweep = analyzer._stream_spectrum(float(start_freq), float(end_freq), int(bins))
+        else:
+            # Tiled rtl_power sweep - every hop is kept and stitched
+            scheduler = SweepScheduler()
+            bin_size = scheduler.bin_size(float(start_freq), float(end_freq), int(bins))
+            with rtl_power_released():
+                sweep = scheduler.sweep(float(start_freq), float(end_freq), bin_size, interval=0.1)
 
-        if result.returncode != 0 or 'usb_claim_interface' in result.stderr:
+        if sweep['status'] != 'success':
             return jsonify({
-                'error': 'RTL-SDR busy or not available',
+                'error': sweep['message'],
                 'spectrum': []
             })
 
-        # Parse rtl_power output
-        # Format: date, time, Hz low, Hz high, Hz step, samples, dB, dB, dB...
-        lines = [l for l in result.stdout.strip().split('\n') if l]
-
-        if not lines:
-            return jsonify({'error': 'No data', 'spectrum': []})
-
-        # Parse last line (most recent scan)
-        parts = lines[-1].split(',')
-        if len(parts) < 7:
-            return jsonify({'error': 'Invalid data', 'spectrum': []})
-
-        # Extract dB values (skip first 6 metadata fields)
-        db_values = [float(x) for x in parts[6:]]
-
-        # Calculate frequencies for each bin
-        freq_low = float(parts[2])
-        freq_high = float(parts[3])
-        freq_step = (freq_high - freq_low) / len(db_values)
-
-        spectrum = []
-        for i, db in enumerate(db_values):
-            freq = freq_low + (i * freq_step)
-            spectrum.append({
-                'frequency': freq / 1e6,  # Convert to MHz
-                'power': db
-            })
+        freqs = sweep['frequencies']
+        spectrum = [
+            {'frequency': freq / 1e6, 'power': db}  # Convert to MHz
+            for freq, db in zip(freqs.tolist(), sweep['powers'].tolist())
+        ]
 
         return jsonify({
             'spectrum': spectrum,
-            'freq_range': [freq_low / 1e6, freq_high / 1e6],
+            'freq_range': [float(freqs[0]) / 1e6, float(freqs[-1]) / 1e6],
+            'hops': sweep['hops'],
+            'sweep_rate_mhz_s': sweep['sweep_rate_mhz_s'],
             'timestamp': time.time()
         })
 
-    except subprocess.TimeoutExpired:
-        return jsonify({'error': 'Timeout', 'spectrum': []})
     except Exception as e:
         return jsonify({'error': str(e), 'spectrum': []})
 
+# Spectrum accumulators (max/min/avg/persistence), one per range a waterfall
+# stream has fed, keyed by integer Hz; least recently used dropped beyond the cap
+spectrum_accumulators = OrderedDict()
+spectrum_accumulators_lock = threading.Lock()
+MAX_SPECTRUM_ACCUMULATORS = 8
+
+def get_spectrum_accumulator(start_freq, end_freq, create=False):
+    """
+    Accumulator for a frequency range, or None if no stream has fed it
+
+    Raises:
+        ValueError: If a frequency is not a number
+    """
+    key = (int(float(start_freq)), int(float(end_freq)))
+    with spectrum_accumulators_lock:
+        accumulator = spectrum_accumulators.get(key)
+        if accumulator is None and create:
+            accumulator = spectrum_accumulators[key] = SpectrumAccumulator()
+            while len(spectrum_accumulators) > MAX_SPECTRUM_ACCUMULATORS:
+                spectrum_accumulators.popitem(last=False)
+        if accumulator is not None:
+            spectrum_accumulators.move_to_end(key)
+        return accumulator
+
+@app.route('/api/waterfall/view')
+def waterfall_view():
+    """Get an accumulated spectrum view (live, max, min, avg, persistence)"""
+    start_freq = request.args.get('start', '433000000')
+    end_freq = request.args.get('end', '434000000')
+    view = request.args.get('view', 'max')
+    width = request.args.get('width', None, type=int)
+
+    try:
+        accumulator = get_spectrum_accumulator(start_freq, end_freq)
+        if accumulator is None:
+            return jsonify({'error': 'No waterfall stream has covered this range',
+                            'message': 'Open /api/waterfall/stream for it first'}), 404
+        return jsonify(accumulator.view(view, width))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/waterfall/view/reset', methods=['POST'])
+def waterfall_view_reset():
+    """Clear accumulated spectrum history for a frequency range"""
+    data = request.get_json() or {}
+    start_freq = data.get('start', '433000000')
+    end_freq = data.get('end', '434000000')
+
+    try:
+        accumulator = get_spectrum_accumulator(start_freq, end_freq)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if accumulator is None:
+        return jsonify({'error': 'No waterfall stream has covered this range'}), 404
+    accumulator.reset()
+    return jsonify({'status': 'reset'})
+
 @app.route('/api/waterfall/stream')
 def waterfall_stream():
     """Server-sent events stream for continuous waterfall updates"""
-    def generate():
-        import time
-        start_freq = request.args.get('start', '433000000')
-        end_freq = request.args.get('end', '434000000')
+    start_arg = request.args.get('start', '433000000')
+    end_arg = request.args.get('end', '434000000')
+    bins = request.args.get('bins', 256, type=int)
 
-        while True:
-            try:
-                # Quick spectrum scan
-                result = subprocess.run(
-                    ['rtl_power', '-f', f'{start_freq}:{end_freq}:1M', '-i', '0.05', '-1', '-'],
-                    capture_output=True,
-                    text=True,
-                    timeout=1
-                )
-
-                if result.returncode == 0:
-                    lines = [l for l in result.stdout.strip().split('\n') if l]
-                    if lines:
-                        parts = lines[-1].split(',')
-                        if len(parts) >= 7:
-                            db_values = [float(x) for x in parts[6:]]
-                            freq_low = float(parts[2])
-                            freq_high = float(parts[3])
-                            freq_step = (freq_high - freq_low) / len(db_values)
-
-                            spectrum = []
-                            for i, db in enumerate(db_values):
-                                freq = freq_low + (i * freq_step)
-                                spectrum.append([freq / 1e6, db])
-
-                            data = json.dumps({'spectrum': spectrum, 'timestamp': time.time()})
+    def generate():
+        start_freq, end_freq = float(start_arg), float(end_arg)
+        scheduler = SweepScheduler()
+        detector = SignalDetector()
+        last_sent = 0
+
+        # rtl_433 (and the IQ stream) resume when the client goes away
+        holding = False
+        with ExitStack() as paused:
+            while True:
+                try:
+                    analyzer = spectrum_analyzer()
+                    if analyzer._streaming() and analyzer.multiplexer.covers(start_freq, end_freq):
+                        # Already streaming this band - share it, rtl_433 keeps listening
+                        paused.close()
+                        holding = False
+                        sweeps = analyzer._stream_sweeps(start_freq, end_freq, bins, interval=0.05)
+                    else:
+                        # One long-running rtl_power; sweeps arrive as they complete
+                        if not holding:
+                            paused.enter_context(rtl_power_released())
+                            holding = True
+                        sweeps = scheduler.stream(start_freq, end_freq,
+                                                  scheduler.bin_size(start_freq, end_freq, bins),
+                                                  interval=0.05)
+
+                    # Closing stops rtl_power (or unsubscribes) when the client goes away
+                    with closing(sweeps):
+                        for sweep in sweeps:
+                            frequencies = sweep.frequencies / 1e6
+                            # Looked up per sweep: a range evicted meanwhile starts afresh
+                            get_spectrum_accumulator(start_freq, end_freq, create=True).update(
+                                sweep.powers, frequencies)
+
+                            # Every sweep feeds the accumulators, clients get 5 updates per second
+                            if time.time() - last_sent < 0.2:
+                                continue
+                            last_sent = time.time()
+
+                            # CFAR detection on every frame
+                            detected = detector.detect(sweep.powers, frequencies)
+                            spectrum = np.round(np.column_stack((frequencies, sweep.powers)), 4).tolist()
+
+                            data = json.dumps({
+                                'spectrum': spectrum,
+                                'signals': detected['signals'],
+                                'noise_floor': detected['noise_floor'],
+                                'timestamp': sweep.received
+                            })
                             yield f"data: {data}\n\n"
 
-                time.sleep(0.2)  # 5 updates per second
+                    # rtl_power exited or the stream stalled (device busy, unplugged, retuned) - retry shortly
+                    time.sleep(0.5)
 
-            except:
-                time.sleep(0.5)
-                continue
+                except Exception:
+                    time.sleep(0.5)
+                    continue
 
     return Response(generate(), mimetype='text/event-stream')
 
@@ -1031,59 +1894,7 @@ def waterfall_stream():
 def get_stats():
     """Get dashboard statistics"""
     try:
-        captures_dir = Path.home() / 'piflip' / 'captures'
-        nfc_dir = Path.home() / 'piflip' / 'nfc_library'
-
-        # Count RF captures
-        rf_captures = list(captures_dir.glob('*.json')) if captures_dir.exists() else []
-
-        # Count NFC cards
-        nfc_cards = list(nfc_dir.glob('*.json')) if nfc_dir.exists() else []
-
-        # Calculate storage used
-        total_size = 0
-        if captures_dir.exists():
-            for file in captures_dir.iterdir():
-                if file.is_file():
-                    total_size += file.stat().st_size
-
-        # Load activity log if exists
-        activity_file = Path.home() / 'piflip' / 'activity.json'
-        total_replays = 0
-        total_scans = 0
-
-        if activity_file.exists():
-            try:
-                with open(activity_file, 'r') as f:
-                    activities = json.load(f)
-                    total_replays = sum(1 for a in activities if a.get('action') == 'replay')
-                    total_scans = sum(1 for a in activities if a.get('action') == 'scan')
-            except:
-                pass
-
-        # Frequency breakdown
-        freq_count = {}
-        for capture in rf_captures:
-            try:
-                with open(capture, 'r') as f:
-                    data = json.load(f)
-                    freq = data.get('frequency', 'unknown')
-                    if freq != 'unknown':
-                        freq_mhz = f"{float(freq)/1e6:.2f}" if freq > 1000 else f"{freq:.2f}"
-                        freq_count[freq_mhz] = freq_count.get(freq_mhz, 0) + 1
-            except:
-                continue
-
-        return jsonify({
-            'total_rf_captures': len(rf_captures),
-            'total_nfc_reads': len(nfc_cards),
-            'total_replays': total_replays,
-            'total_scans': total_scans,
-            'storage_used_mb': round(total_size / (1024 * 1024), 2),
-            'success_rate': 95,  # Placeholder - could track actual success/failure
-            'top_frequencies': dict(sorted(freq_count.items(), key=lambda x: x[1], reverse=True)[:5])
-        })
-
+        return jsonify(get_dashboard_stats().stats())
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1091,49 +1902,7 @@ def get_stats():
 def get_recent():
     """Get recent activity"""
     try:
-        captures_dir = Path.home() / 'piflip' / 'captures'
-        nfc_dir = Path.home() / 'piflip' / 'nfc_library'
-
-        recent = []
-
-        # Get recent RF captures
-        if captures_dir.exists():
-            for json_file in sorted(captures_dir.glob('*.json'), key=lambda x: x.stat().st_mtime, reverse=True)[:10]:
-                try:
-                    with open(json_file, 'r') as f:
-                        data = json.load(f)
-                        recent.append({
-                            'type': 'rf_capture',
-                            'name': json_file.stem,
-                            'frequency': data.get('frequency', 'unknown'),
-                            'duration': data.get('duration', 'unknown'),
-                            'timestamp': data.get('timestamp', json_file.stat().st_mtime),
-                            'size_kb': round(json_file.stat().st_size / 1024, 2)
-                        })
-                except:
-                    continue
-
-        # Get recent NFC reads
-        if nfc_dir.exists():
-            for json_file in sorted(nfc_dir.glob('*.json'), key=lambda x: x.stat().st_mtime, reverse=True)[:5]:
-                try:
-                    with open(json_file, 'r') as f:
-                        data = json.load(f)
-                        recent.append({
-                            'type': 'nfc_read',
-                            'name': json_file.stem,
-                            'uid': data.get('uid', 'unknown'),
-                            'card_type': data.get('card_type', 'unknown'),
-                            'timestamp': data.get('timestamp', json_file.stat().st_mtime)
-                        })
-                except:
-                    continue
-
-        # Sort all by timestamp
-        recent.sort(key=lambda x: x.get('timestamp', 0), reverse=True)
-
-        return jsonify(recent[:15])
-
+        return jsonify(get_dashboard_stats().recent(15))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1141,35 +1910,16 @@ def get_recent():
 def log_activity():
     """Log user activity for dashboard"""
     try:
-        activity_file = Path.home() / 'piflip' / 'activity.json'
-
-        # Load existing activities
-        activities = []
-        if activity_file.exists():
-            try:
-                with open(activity_file, 'r') as f:
-                    activities = json.load(f)
-            except:
-                activities = []
-
-        # Add new activity
         new_activity = request.get_json()
         new_activity['timestamp'] = datetime.now().isoformat()
-        activities.append(new_activity)
-
-        # Keep only last 100 activities
-        activities = activities[-100:]
-
-        # Save
-        with open(activity_file, 'w') as f:
-            json.dump(activities, f, indent=2)
-
+        get_dashboard_stats().log_activity(new_activity)
         return jsonify({'status': 'logged'})
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/rssi')
+@holds('cc1101')
 def get_rssi():
     """Get current RSSI (signal strength) from CC1101"""
     try:
@@ -1195,19 +1945,11 @@ def get_rssi():
 def bluetooth_scan():
     """Scan for Bluetooth devices"""
     try:
-        scanner = BluetoothScanner()
         data = request.get_json() or {}
-        scan_type = data.get('type', 'comprehensive')  # ble, classic, comprehensive
-        duration = data.get('duration', 15)
-
-        if scan_type == 'ble':
-            result = scanner.scan_ble_devices(duration)
-        elif scan_type == 'classic':
-            result = scanner.scan_classic_devices(duration)
-        else:
-            result = scanner.scan_comprehensive(duration)
-
-        return jsonify(result)
+        return job_response('bluetooth_scan', {
+            'type': data.get('type', 'comprehensive'),  # ble, classic, comprehensive
+            'duration': data.get('duration', 15)
+        })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1358,7 +2100,7 @@ def wifi_connect():
 def spectrum_scan():
     """Quick spectrum scan"""
     try:
-        analyzer = SpectrumAnalyzer()
+        analyzer = spectrum_analyzer()
         data = request.get_json() or {}
         center_freq = data.get('center_freq', 433.92)
         span = data.get('span', 2.0)
@@ -1372,14 +2114,13 @@ def spectrum_scan():
 def spectrum_waterfall():
     """Waterfall scan"""
     try:
-        analyzer = SpectrumAnalyzer()
         data = request.get_json() or {}
-        center_freq = data.get('center_freq', 433.92)
-        span = data.get('span', 2.0)
-        duration = data.get('duration', 10)
-        interval = data.get('interval', 0.2)
-        result = analyzer.waterfall_scan(center_freq, span, duration, interval)
-        return jsonify(result)
+        return job_response('spectrum_waterfall', {
+            'center_freq': data.get('center_freq', 433.92),
+            'span': data.get('span', 2.0),
+            'duration': data.get('duration', 10),
+            'interval': data.get('interval', 0.2)
+        })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1387,12 +2128,28 @@ def spectrum_waterfall():
 def spectrum_detect():
     """Detect signals in spectrum"""
     try:
-        analyzer = SpectrumAnalyzer()
+        analyzer = spectrum_analyzer()
         data = request.get_json()
         spectrum_data = data.get('spectrum_data')
         threshold = data.get('threshold', -80)
         min_width = data.get('min_width', 0.05)
-        result = analyzer.detect_signals(spectrum_data, threshold, min_width)
+        snr_db = data.get('snr_db', 6.0)
+        result = analyzer.detect_signals(spectrum_data, threshold, min_width, snr_db)
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/spectrum/hopping', methods=['POST'])
+def spectrum_hopping():
+    """Detect frequency hopping signals from rapid sweeps"""
+    try:
+        analyzer = spectrum_analyzer()
+        data = request.get_json() or {}
+        duration = data.get('duration', 30)
+        center_freq = data.get('center_freq', 433.92)
+        span = data.get('span', 2.0)
+        interval = data.get('interval', 0.05)
+        result = analyzer.frequency_hopper_detect(duration, center_freq, span, interval)
         return jsonify(result)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1401,7 +2158,7 @@ def spectrum_detect():
 def spectrum_save():
     """Save spectrum scan"""
     try:
-        analyzer = SpectrumAnalyzer()
+        analyzer = spectrum_analyzer()
         data = request.get_json()
         scan_data = data.get('scan_data')
         name = data.get('name')
@@ -1414,7 +2171,7 @@ def spectrum_save():
 def spectrum_reset():
     """Reset RTL-SDR device"""
     try:
-        analyzer = SpectrumAnalyzer()
+        analyzer = spectrum_analyzer()
         result = analyzer.reset_rtlsdr()
         return jsonify(result)
     except Exception as e:
@@ -1422,47 +2179,30 @@ def spectrum_reset():
 
 @app.route('/api/hardware/status')
 def hardware_status():
-    """Check hardware status (CC1101, PN532, RTL-SDR)"""
-    status = {
-        'cc1101': False,
-        'pn532': False,
-        'rtl_sdr': False
-    }
-
-    try:
-        # Check CC1101
-        from cc1101_enhanced import CC1101Enhanced
-        cc = CC1101Enhanced()
-        status['cc1101'] = True
-    except:
-        pass
-
-    try:
-        # Check PN532
-        from nfc_emulator import NFCEmulator
-        nfc = NFCEmulator()
-        status['pn532'] = True
-    except:
-        pass
+    """Check hardware status (CC1101, PN532, RTL-SDR) from the cached health state"""
+    manager = get_device_manager()
+    devices = manager.status()
+    return jsonify({
+        'cc1101': devices['cc1101']['status'] == 'ok',
+        'pn532': devices['pn532']['status'] == 'ok',
+        'rtl_sdr': devices['rtl_sdr']['status'] == 'ok',
+        'devices': devices,
+        'manager': manager.summary()
+    })
 
+@app.route('/api/hardware/refresh', methods=['POST'])
+def hardware_refresh():
+    """Re-probe devices now (busy devices keep their last state)"""
     try:
-        # Check RTL-SDR with quick timeout
-        result = subprocess.run(
-            ['rtl_test', '-t'],
-            capture_output=True,
-            text=True,
-            timeout=2
-        )
-        if 'Found 1 device' in result.stdout or 'Found 1 device' in result.stderr:
-            status['rtl_sdr'] = True
-    except:
-        pass
-
-    return jsonify(status)
+        data = request.get_json(silent=True) or {}
+        return jsonify(get_device_manager().refresh(data.get('devices')))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
 # --- Enhanced NFC Emulation Route ---
 
 @app.route('/api/nfc/emulate_real/<name>', methods=['POST'])
+@holds('pn532')
 def nfc_emulate_real(name):
     """Actually emulate NFC card (experimental)"""
     try:
@@ -1485,6 +2225,7 @@ def nfc_emulate_real(name):
 # ═══════════════════════════════════════════════════════════════
 
 @app.route('/api/tx/replay_variations/<signal_name>', methods=['POST'])
+@holds('cc1101')
 def tx_replay_variations(signal_name):
     """Replay signal with frequency and timing variations"""
     try:
@@ -1504,6 +2245,7 @@ def tx_replay_variations(signal_name):
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/tx/brute_force', methods=['POST'])
+@holds('cc1101')
 def tx_brute_force():
     """Brute force simple fixed codes (educational only!)"""
     try:
@@ -1522,6 +2264,7 @@ def tx_brute_force():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/tx/fuzz/<signal_name>', methods=['POST'])
+@holds('cc1101')
 def tx_fuzz_signal(signal_name):
     """Fuzz signal by varying timings"""
     try:
@@ -1537,6 +2280,7 @@ def tx_fuzz_signal(signal_name):
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/tx/jam', methods=['POST'])
+@holds('cc1101')
 def tx_jam_frequency():
     """Continuous transmission for jamming/testing (educational only!)"""
     try:
@@ -1553,6 +2297,7 @@ def tx_jam_frequency():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/tx/rolling_code', methods=['POST'])
+@holds('cc1101')
 def tx_rolling_code():
     """Capture and immediately replay for rolling codes"""
     try:
@@ -1568,6 +2313,7 @@ def tx_rolling_code():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/tx/custom_signal', methods=['POST'])
+@holds('cc1101')
 def tx_custom_signal():
     """Generate and transmit custom signal from binary pattern"""
     try:
@@ -1761,6 +2507,7 @@ def catalog_delete_card(uid):
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/catalog/identify', methods=['POST'])
+@holds('pn532')
 def catalog_identify():
     """Scan and identify card"""
     try:
@@ -1785,6 +2532,7 @@ def catalog_stats():
 # ═══════════════════════════════════════════════════════════════
 
 @app.route('/api/wallet/quick_test', methods=['POST'])
+@holds('pn532')
 def wallet_quick_test():
     """Quick wallet blocking test"""
     try:
@@ -1800,11 +2548,8 @@ def wallet_quick_test():
 def wallet_full_test():
     """Full wallet effectiveness test"""
     try:
-        tester = get_wallet_tester()
         data = request.get_json() or {}
-        duration = data.get('duration', 10)
-        result = tester.test_blocking_effectiveness(duration=duration)
-        return jsonify(result)
+        return job_response('wallet_test', {'duration': data.get('duration', 10)})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1847,6 +2592,7 @@ def system_reboot():
 # =============================================================================
 
 @app.route('/api/rf/fuzz', methods=['POST'])
+@holds('cc1101')
 def rf_fuzz_signal():
     """Fuzz a signal with mutations"""
     try:
@@ -1863,6 +2609,7 @@ def rf_fuzz_signal():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/rf/encode', methods=['POST'])
+@holds('cc1101')
 def rf_encode_protocol():
     """Encode and transmit signal using protocol"""
     try:
@@ -1882,16 +2629,14 @@ def rf_frequency_sweep():
     """Sweep frequency range while transmitting"""
     try:
         data = request.get_json()
-        signal_name = data.get('signal')
-        start_freq = data.get('start_freq', 433.0)
-        end_freq = data.get('end_freq', 434.0)
-        step_mhz = data.get('step', 0.05)
-        delay_ms = data.get('delay_ms', 500)
-        repeats = data.get('repeats', 3)
-
-        tools = get_rf_power_tools()
-        result = tools.frequency_sweep(signal_name, start_freq, end_freq, step_mhz, delay_ms, repeats)
-        return jsonify(result)
+        return job_response('rf_frequency_sweep', {
+            'signal': data.get('signal'),
+            'start_freq': data.get('start_freq', 433.0),
+            'end_freq': data.get('end_freq', 434.0),
+            'step': data.get('step', 0.05),
+            'delay_ms': data.get('delay_ms', 500),
+            'repeats': data.get('repeats', 3)
+        })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1900,11 +2645,7 @@ def rf_execute_playlist():
     """Execute signal playlist"""
     try:
         data = request.get_json()
-        playlist = data.get('playlist', [])
-
-        tools = get_rf_power_tools()
-        result = tools.execute_playlist(playlist)
-        return jsonify(result)
+        return job_response('rf_playlist', {'playlist': data.get('playlist', [])})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1958,6 +2699,7 @@ def rf_list_playlists():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/rf/jam', methods=['POST'])
+@holds('cc1101')
 def rf_jam_frequency():
     """Jam frequency (security testing only)"""
     try:
@@ -1976,8 +2718,15 @@ def rf_jam_frequency():
 
 if __name__ == '__main__':
     print("[*] Starting PiFlip Web Interface...")
-    print("[*] Initializing hardware...")
-    initialize_pn532()
+    # Serving process only, not the reloader: import subsystems and probe
+    # hardware in the background while Flask starts answering
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        subsystems.probe('devices', get_device_manager)
+        subsystems.probe('ui_assets', get_ui_assets)
+        subsystems.probe('job_manager', get_job_manager)  # resumes queued analysis jobs
+        subsystems.probe('dashboard_stats', get_dashboard_stats)
+        subsystems.warm_up()
+    subsystems.mark_ready()
     # Note: CC1101 initialization postponed until needed (requires SPI wiring)
     print("[*] Web interface available at http://0.0.0.0:5000")
     app.run(host='0.0.0.0', port=5000, debug=True)